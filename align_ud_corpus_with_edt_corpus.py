@@ -19,19 +19,12 @@ from timeit import default_timer as timer
 
 from pprint import pprint 
 
-from estnltk.names import *
-from estnltk import Text
-from estnltk.core import PACKAGE_PATH, as_unicode
-
-from estnltk.syntax.parsers import MaltParser
-from estnltk.syntax.maltparser_support import CONLLFeatGenerator
-#from estnltk.syntax.maltparser_support import convert_text_w_syntax_to_CONLL
-from estnltk.syntax.utils import read_text_from_cg3_file
-
-from adhoc_fixes import repair_cycles
-from feature_generators import add_feature_generator_arguments_to_argparser
-from feature_generators import convert_text_w_syntax_to_CONLL
-from feature_generators import get_feature_generator
+from conll_utils import load_sentences_from_ud_corpus, format_time, is_edt_file
+from compressed_io import open_corpus, plain_input_file, strip_compression_suffix, get_compression_suffix, is_compressed
+from corpus_index import build_corpus_index
+from feature_generator_options import add_feature_generator_arguments_to_argparser
+from feature_cache import FeatureCache, DEFAULT_FEATURE_CACHE
+from model_store import parse_size
 
 
 # Whether aligned sentences will be checked for identity
@@ -42,49 +35,6 @@ exception_on_mismatch   = False
 log_sent_ids = True
 
 
-def format_time( sec ):
-    # Idea from:   http://stackoverflow.com/a/1384565
-    if sec > 864000:
-       raise Exception(' Unexpectedly, the value of seconds ',sec,' amounts more than a day! ')
-    import time
-    return time.strftime('%H:%M:%S', time.gmtime(sec))
-
-
-def load_sentences_from_ud_corpus( file_name ):
-    sentences = []
-    comment_sent_id = re.compile('^#\s*sent_id\s(\S+)\s*$')
-    sent_id        = None
-    sentence_count = 0
-    word_count     = 0
-    tokens = []
-    in_f = codecs.open(file_name, mode='r', encoding='utf-8')
-    for line in in_f:
-        # A comment line
-        if line.startswith('#'):
-            m = comment_sent_id.match(line)
-            if m:
-                sent_id = m.group(1)
-            continue
-        # Next sentence
-        line = line.rstrip()
-        if len(line) == 0 or re.match('^\s+$', line):
-            if word_count != 0 and tokens:
-                sentences.append( [sent_id, tokens])
-                sentence_count += 1
-            word_count = 0
-            tokens     = []
-            continue
-        # Next token
-        features = line.split('\t')
-        if len(features) != 10:
-            raise Exception(' In file '+in_file+', line with unexpected format: "'+line+'" ')
-        selfLabel = features[0]
-        token     = features[1]
-        word_count += 1
-        tokens.append( token )
-    in_f.close()
-    return sentences
-
 arg_parser = argparse.ArgumentParser(description='''
   This script aligns CONLLU and CG3 format texts, and outputs sentences from the CONLLU input with the syntactic 
   annotations from the CG3 input.
@@ -99,16 +49,42 @@ epilog='''
   extensions. The first file has extension .cg3-conll and contains all the extracted sentences in CONLL format, and the 
   second file has extension .sent_ids and it contains all indices of the extracted sentences, exactly in the same order 
   as sentences in the file with the extension .cg3-conll.
+  The input files (<CONLL_file> and the *.inforem files) can be compressed (*.gz or *.xz); by default, the .cg3-conll
+  file is compressed in the same way as <CONLL_file> (this can be changed with the argument -z / --compress).
 '''
 )
 arg_parser.add_argument("in_file", help="the .conllu format input file;", metavar='<CONLL_file>')
 arg_parser.add_argument("in_dir",  help="the input directory containing EstCG *.inforem files",  metavar='<EDT_corpus_dir>')
 add_feature_generator_arguments_to_argparser( arg_parser )
 arg_parser.add_argument('--no-replace-root', help="do not replace syntactic label of the root node with ROOT; (useful for generating test data for VislCG3 parser which does not use the ROOT label);", dest='replace_root', action='store_false')
-arg_parser.set_defaults( replace_root=True )
+arg_parser.add_argument("-fc", "--feature_cache", default=DEFAULT_FEATURE_CACHE, \
+                                          help="SQLite database caching the CONLL rows of the converted sentences: a sentence "+\
+                                               "is not re-converted if it is unchanged and the feature generator is unchanged "+\
+                                               "(default: '"+DEFAULT_FEATURE_CACHE+"');", \
+                                          metavar='<cache_db>')
+arg_parser.add_argument("-cs", "--cache_size", default='2G', \
+                                               help="maximum size of the feature cache (e.g. '500M', '2G'): least recently used "+\
+                                                    "sentences are evicted if the size is exceeded (default: '2G');", \
+                                               metavar='<cache_size>')
+arg_parser.add_argument("-z", "--compress", default=None, choices=['none', 'gz', 'xz'], \
+                                            help="compression of the output .cg3-conll file (default: the compression of "+\
+                                                 "the input <CONLL_file>);", \
+                                            metavar='<none|gz|xz>')
+arg_parser.add_argument('--no-feature-cache', help="do not use the feature cache: always convert the sentences;", dest='use_feature_cache', action='store_false')
+arg_parser.set_defaults( replace_root=True, use_feature_cache=True )
 args = arg_parser.parse_args()
+# EstNLTK and the feature generators are imported only after the arguments
+# have been parsed, so that --help and argument errors are reported at once
+from estnltk.names import *
+from estnltk.syntax.utils import read_text_from_cg3_file
+
+from adhoc_fixes import repair_cycles
+from feature_generators import convert_text_w_syntax_to_CONLL
+from feature_generators import get_feature_generator
+
 feat_generator = get_feature_generator( args, verbose=True )
 replace_root = args.replace_root
+feature_cache = FeatureCache( args.feature_cache, max_size=parse_size(args.cache_size) ) if args.use_feature_cache else None
 
 aligned_sentences  = 0
 aligned_tokens     = 0
@@ -124,10 +100,10 @@ if args.in_file and os.path.isfile(args.in_file) and args.in_dir and os.path.isd
     start_time = timer()
     args_given = True
     sents = load_sentences_from_ud_corpus( args.in_file )
-    out_file_name = re.sub('^(.+)\.([^.]+)$', '\\1.cg3-conll', args.in_file)
-    # empty input file
-    o_f = codecs.open( out_file_name, mode='w', encoding='utf-8' )
-    o_f.close()
+    out_compression = get_compression_suffix( args.in_file ) if args.compress is None else \
+                      ('.'+args.compress if args.compress != 'none' else '')
+    out_file_name = re.sub('^(.+)\.([^.]+)$', '\\1.cg3-conll', strip_compression_suffix(args.in_file)) + out_compression
+    o_f = open_corpus( out_file_name, mode='w' )
     edt_files = os.listdir( args.in_dir )
     # sort  sent_id-s  alphabetically
     sents = sorted( sents, key = lambda x : x[0] )
@@ -144,7 +120,7 @@ if args.in_file and os.path.isfile(args.in_file) and args.in_dir and os.path.isd
         edt_file   = None
         # check for existence of the file of the sentence
         for edt_in_file in sorted( edt_files ):
-            if edt_in_file.endswith('.inforem'):
+            if is_edt_file( edt_in_file ):
                 edt_in_file_copy = (edt_in_file.replace('_', '')).lower()
                 edt_in_file_copy = re.sub('^(aja|ilu|tea)(.+)$', '\\1_\\2', edt_in_file_copy)
                 if edt_in_file_copy.startswith(ud_sent_id):
@@ -159,8 +135,9 @@ if args.in_file and os.path.isfile(args.in_file) and args.in_dir and os.path.isd
             if opened_file_name != edt_file:
                 opened_file_name = edt_file
                 in_file_path = os.path.join( args.in_dir, opened_file_name )
-                opened_file_text = read_text_from_cg3_file( \
-                    in_file_path, fix_sent_tags=True, clean_up=True, fix_out_of_sent=True )
+                with plain_input_file( in_file_path ) as plain_file_path:
+                    opened_file_text = read_text_from_cg3_file( \
+                        plain_file_path, fix_sent_tags=True, clean_up=True, fix_out_of_sent=True )
                 opened_file_text_sents = list( opened_file_text.split_by( SENTENCES ) )
                 #print(opened_file_name,len(opened_file_text_sents))
             if opened_file_text_sents:
@@ -186,34 +163,49 @@ if args.in_file and os.path.isfile(args.in_file) and args.in_dir and os.path.isd
                 # Convert the sentence to CONLL format
                 edt_sent_text.tag_analysis()
                 repair_cycles( edt_sent_text, ud_sent, layer=LAYER_VISLCG3 )
-                try:
-                    conll_str = convert_text_w_syntax_to_CONLL( edt_sent_text, feat_generator, layer=LAYER_VISLCG3, replace_root=replace_root )
-                except TypeError:
-                    conll_str = convert_text_w_syntax_to_CONLL( edt_sent_text, feat_generator, layer=LAYER_VISLCG3 )
+                if feature_cache:
+                    conll_str = feature_cache.convert( edt_sent_text, feat_generator, LAYER_VISLCG3, replace_root=replace_root )
+                else:
+                    try:
+                        conll_str = convert_text_w_syntax_to_CONLL( edt_sent_text, feat_generator, layer=LAYER_VISLCG3, replace_root=replace_root )
+                    except TypeError:
+                        conll_str = convert_text_w_syntax_to_CONLL( edt_sent_text, feat_generator, layer=LAYER_VISLCG3 )
                 # Write results into the file
-                o_f = codecs.open( out_file_name, mode='a', encoding='utf-8' )
                 o_f.write(conll_str)
                 o_f.write('\n')
-                o_f.close()
                 # Remember that the sentence was successfully written to file 
                 if granularity == SENTENCES:
                     written_sent_ids.append( ud_sent[0] )
                 elif granularity == CLAUSES:
-                    for cid, cl_text in enumerate(edt_sent_text.split_by( granularity )):
+                    # each clause was converted into a separate chunk of CONLL rows
+                    clauses = [ chunk for chunk in conll_str.split('\n\n') if chunk.strip() ]
+                    for cid in range( len(clauses) ):
                         written_sent_ids.append( ud_sent[0]+'_clause_'+str(cid) )
+    o_f.close()
 
     if log_sent_ids and written_sent_ids:
         # Log sent ids
-        log_file_name = re.sub('^(.+)\.([^.]+)$', '\\1.sent_ids', args.in_file)
+        log_file_name = re.sub('^(.+)\.([^.]+)$', '\\1.sent_ids', strip_compression_suffix(args.in_file))
         o_f = codecs.open( log_file_name, mode='w', encoding='utf-8' )
         for line in written_sent_ids:
             o_f.write( '#'+line+'\n' )
         o_f.close()
+
+    if not is_compressed( out_file_name ):
+        # Offset index of the sentences, for random access (see corpus_index.py)
+        try:
+            print( ' Index: ', build_corpus_index( out_file_name ) )
+        except Exception as error:
+            print( error, file = sys.stderr )
         
     print( ' Aligned sentences: ', aligned_sentences, '   missing sentences: ',missing_sentences, '   mismatch sentences: ',mismatch_sentences )
     print( ' Aligned tokens:    ', aligned_tokens, '   missing tokens: ', missing_tokens)
+    if feature_cache:
+        print( feature_cache.format_stats() )
     end_time = timer()
     print( ' Processing time: ', format_time(end_time-start_time))
 else:
     print('(!) Invalid input arguments!')
     arg_parser.print_help()
+if feature_cache:
+    feature_cache.close()
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+#
+#    Microbenchmarks of the hot paths of feature generation and conversion
+#    (feature_generators.py), for each feature generator, on a fixed fixture
+#    corpus: reports the throughput (tokens/s) and the memory allocations of
+#    each function, and saves / compares against a baseline JSON file;
+#
+from __future__ import unicode_literals, print_function
+
+import sys, os, re, os.path
+import codecs, json
+import argparse
+import copy
+import tracemalloc
+
+from timeit import default_timer as timer
+
+import numpy as np
+
+from conll_utils import iter_conll_sentence_lines
+from model_store import file_fingerprint
+from feature_generator_options import feature_generator_options
+
+BENCHMARKS = [ 'generate_features', 'generate_verb_chain_features', 'detect_sentence_ending_saying_verbs', \
+               '_create_clause_based_dep_links', 'convert_text_w_syntax_to_CONLL', 'align_CONLL_with_Text' ]
+
+# Relative drop of the throughput (compared to the baseline) reported as a regression
+DEFAULT_TOLERANCE = 0.1
+
+
+# =============================================================================
+#    Fixture
+# =============================================================================
+
+def load_fixture( corpus_file, n_sentences ):
+    ''' Loads the first *n_sentences* sentences of the given CONLL file as a
+        Text with the CONLL layer, and with morphological analysis, clauses
+        and verb chains tagged (so that these are not included in the timings);
+    '''
+    sentences = []
+    for sentence in iter_conll_sentence_lines( corpus_file ):
+        sentences.append( sentence )
+        if len(sentences) >= n_sentences:
+            break
+    text = conll_sentences_to_text( sentences )
+    text.tag_analysis()
+    text.tag_clauses()
+    text.tag_verb_chains()
+    return text
+
+
+# =============================================================================
+#    Benchmarked functions
+# =============================================================================
+
+def _make_benchmark( name, text, generator ):
+    ''' Returns a pair (setup, run) for the benchmark *name*, or None if the
+        function is not used by the given generator; setup() prepares the
+        input of a single repetition (untimed), and run(input) calls the
+        benchmarked function;
+    '''
+    sentences = None
+    if name in ['generate_features', 'generate_verb_chain_features', 'detect_sentence_ending_saying_verbs']:
+        sentences = text.split_by( SENTENCES )
+        for sentence_text in sentences:
+            sentence_text.tag_verb_chains()
+    if name == 'generate_features':
+        def run( sentences ):
+            for sentence_text in sentences:
+                for wid in range( len(sentence_text[WORDS]) ):
+                    generator.generate_features( sentence_text, wid )
+        return (lambda: sentences), run
+    if name == 'generate_verb_chain_features':
+        if not (generator.addVerbcGramm or generator.addNomAdvVinf):
+            return None
+        def run( sentences ):
+            for sentence_text in sentences:
+                generate_verb_chain_features( sentence_text, addGrammPred=generator.addVerbcGramm, \
+                                              addNomAdvVinf=generator.addNomAdvVinf )
+        return (lambda: sentences), run
+    if name == 'detect_sentence_ending_saying_verbs':
+        if not generator.addSeSayingVerbs:
+            return None
+        def run( sentences ):
+            for sentence_text in sentences:
+                detect_sentence_ending_saying_verbs( sentence_text )
+        return (lambda: sentences), run
+    if name == '_create_clause_based_dep_links':
+        if generator.parseScope != CLAUSES:
+            return None
+        # the function rewrites the links in place, so each repetition gets a copy
+        return (lambda: copy.deepcopy(text)), (lambda text_copy: _create_clause_based_dep_links( text_copy ))
+    if name == 'convert_text_w_syntax_to_CONLL':
+        def setup():
+            return copy.deepcopy(text) if generator.parseScope == CLAUSES else text
+        return setup, (lambda text_copy: convert_text_w_syntax_to_CONLL( text_copy, generator ))
+    if name == 'align_CONLL_with_Text':
+        lines = convert_text_w_syntax_to_CONLL( copy.deepcopy(text), generator ).split('\n')
+        return (lambda: lines), (lambda lines: align_CONLL_with_Text( lines, text, generator ))
+    raise Exception('(!) Unknown benchmark: '+str(name))
+
+
+def measure( setup, run, repeats ):
+    ''' Runs the benchmark (after an untimed warm-up repetition) *repeats*
+        times, and once more under tracemalloc; Returns a dict with keys
+        'times' (a list of durations in seconds), 'peak_alloc' (the peak
+        size of the memory allocated during a repetition, in bytes) and
+        'alloc_blocks' (the number of memory blocks allocated by a
+        repetition and still alive at its end);
+    '''
+    run( setup() )
+    times = []
+    for i in range( repeats ):
+        data = setup()
+        start_time = timer()
+        run( data )
+        times.append( timer() - start_time )
+    data = setup()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        if hasattr(tracemalloc, 'reset_peak'):
+            # do not count the snapshot into the peak (Python >= 3.9)
+            tracemalloc.reset_peak()
+        base_size = tracemalloc.get_traced_memory()[0]
+        result = run( data )
+        peak = tracemalloc.get_traced_memory()[1] - base_size
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    blocks = sum( [stat.count_diff for stat in after.compare_to( before, 'filename' )] )
+    del result
+    return { 'times': times, 'peak_alloc': peak, 'alloc_blocks': blocks }
+
+
+# =============================================================================
+#    Reporting
+# =============================================================================
+
+def format_benchmark_results( results, baseline=None ):
+    ''' Formats the results (and the change of the throughput compared to the
+        baseline, if given) as a table; Returns a list of strings; '''
+    lines = [ 'Generator'.ljust(10)+'Function'.ljust(38)+'Tokens/s'.ljust(12)+'Median(ms)'.ljust(12)+\
+              'PeakAlloc(KB)'.ljust(15)+'Blocks'.ljust(9)+('vs baseline' if baseline else '') ]
+    for key in sorted( results['benchmarks'].keys() ):
+        r = results['benchmarks'][key]
+        line = r['generator'].ljust(10)+r['function'].ljust(38)+'{:.0f}'.format(r['tokens_per_s']).ljust(12)+\
+               '{:.2f}'.format(r['median_time']*1000).ljust(12)+'{:.0f}'.format(r['peak_alloc']/1024.0).ljust(15)+\
+               str(r['alloc_blocks']).ljust(9)
+        if baseline and key in baseline['benchmarks']:
+            line += '{:+.1%}'.format( r['tokens_per_s'] / baseline['benchmarks'][key]['tokens_per_s'] - 1.0 )
+        lines.append( line )
+    return lines
+
+
+def find_regressions( results, baseline, tolerance=DEFAULT_TOLERANCE ):
+    ''' Returns keys of the benchmarks whose throughput dropped more than
+        *tolerance* (relative) compared to the baseline; '''
+    regressions = []
+    for key, r in results['benchmarks'].items():
+        if key in baseline['benchmarks']:
+            if r['tokens_per_s'] < baseline['benchmarks'][key]['tokens_per_s'] * (1.0 - tolerance):
+                regressions.append( key )
+    return sorted( regressions )
+
+
+if __name__ == '__main__':
+    # =============================================================================
+    #    Fetch command line arguments
+    # =============================================================================
+    fixture_corpus = os.path.join('UD_Estonian-master', 'et-ud-dev.cg3-conll')
+    n_sentences    = 200
+    repeats        = 5
+
+    generator_flags = [ option['flag'].lstrip('-') for option in feature_generator_options ]
+    arg_parser = argparse.ArgumentParser(description='''
+      Microbenchmarks of the hot paths of feature generation and conversion (feature_generators.py): measures each of
+      the functions in isolation, for each feature generator, on a fixed fixture corpus, and reports the throughput
+      (tokens/s) and the memory allocations.
+    ''',\
+    epilog='''
+      The fixture is the first <sentences> sentences of the given CONLL corpus; the morphological analysis, clauses
+      and verb chains are tagged before the timing. Functions that a generator does not use are skipped (e.g. the
+      verb chain features for --f01). Each benchmark is repeated <repeats> times (the median is reported), and once
+      more under tracemalloc for the allocations: the peak size of the allocated memory, and the number of memory
+      blocks still alive at the end of the call.
+      With --save, the results are saved as a baseline JSON file; with --baseline, the results are compared against
+      the given baseline, and the script exits with code 1 if the throughput of any benchmark dropped more than the
+      tolerance.
+    '''
+    )
+    arg_parser.add_argument("-g", "--fixture", default=fixture_corpus, \
+                                               help="CONLL corpus of the fixture (default: '"+fixture_corpus+"');", \
+                                               metavar='<fixture_corpus>')
+    arg_parser.add_argument("-s", "--sentences", default=n_sentences, type=int, \
+                                                 help="number of sentences in the fixture (default: "+str(n_sentences)+");", \
+                                                 metavar='<sentences>')
+    arg_parser.add_argument("-r", "--repeats", default=repeats, type=int, \
+                                               help="number of timed repetitions of each benchmark (default: "+str(repeats)+");", \
+                                               metavar='<repeats>')
+    arg_parser.add_argument("-f", "--generators", nargs='+', default=generator_flags, choices=generator_flags, \
+                                                  help="feature generators to be benchmarked (default: all);")
+    arg_parser.add_argument("-b", "--benchmarks", nargs='+', default=BENCHMARKS, choices=BENCHMARKS, \
+                                                  help="functions to be benchmarked (default: all);")
+    arg_parser.add_argument("-o", "--save", default=None, \
+                                            help="name of the JSON file where the results are saved as a baseline (default: None);", \
+                                            metavar='<baseline_json>')
+    arg_parser.add_argument("-bl", "--baseline", default=None, \
+                                                 help="baseline JSON file to compare the results against (default: None);", \
+                                                 metavar='<baseline_json>')
+    arg_parser.add_argument("-t", "--tolerance", default=DEFAULT_TOLERANCE, type=float, \
+                                                 help="tolerated relative drop of the throughput (default: "+str(DEFAULT_TOLERANCE)+");", \
+                                                 metavar='<tolerance>')
+    args = arg_parser.parse_args()
+    if not os.path.isfile(args.fixture):
+        raise Exception('Fixture corpus not found: '+args.fixture)
+    if args.baseline and not os.path.isfile(args.baseline):
+        raise Exception('Baseline not found: '+args.baseline)
+    if args.sentences < 1 or args.repeats < 1:
+        raise Exception('(!) Invalid number of sentences or repeats.')
+    # EstNLTK and the feature generators are imported only after the arguments
+    # have been parsed, so that --help and argument errors are reported at once
+    from estnltk.names import *
+    from conll_text_reader import conll_sentences_to_text
+    from feature_generators import feature_generators
+    from feature_generators import generate_verb_chain_features, detect_sentence_ending_saying_verbs
+    from feature_generators import _create_clause_based_dep_links
+    from feature_generators import convert_text_w_syntax_to_CONLL, align_CONLL_with_Text
+
+    # =============================================================================
+    #    Run the benchmarks
+    # =============================================================================
+    print(' Loading the fixture ...')
+    text = load_fixture( args.fixture, args.sentences )
+    n_tokens = len(text[WORDS])
+    results = { 'fixture': args.fixture, 'fixture_fingerprint': file_fingerprint( args.fixture ), \
+                'sentences': len(text.sentence_texts), 'tokens': n_tokens, 'repeats': args.repeats, \
+                'python': sys.version.split()[0], 'benchmarks': {} }
+    for gen in feature_generators:
+        flag = gen['flag'].lstrip('-')
+        if flag not in args.generators:
+            continue
+        for name in args.benchmarks:
+            benchmark = _make_benchmark( name, text, gen['generator'] )
+            if benchmark is None:
+                continue
+            print(' Benchmarking '+name+' with --'+flag+' ...')
+            measurement = measure( benchmark[0], benchmark[1], args.repeats )
+            median_time = float( np.median( measurement['times'] ) )
+            results['benchmarks'][flag+':'+name] = { 'generator': flag, 'function': name, \
+                'median_time': median_time, 'min_time': min( measurement['times'] ), \
+                'tokens_per_s': n_tokens / median_time, 'peak_alloc': measurement['peak_alloc'], \
+                'alloc_blocks': measurement['alloc_blocks'] }
+
+    # =============================================================================
+    #    Report the results
+    # =============================================================================
+    baseline = None
+    if args.baseline:
+        in_f = codecs.open( args.baseline, mode='r', encoding='utf-8' )
+        baseline = json.load( in_f )
+        in_f.close()
+        if baseline.get('fixture_fingerprint') != results['fixture_fingerprint'] or \
+           baseline.get('sentences') != results['sentences']:
+            print(' (!) Warning: the baseline was measured on a different fixture.')
+    print()
+    print( '\n'.join( format_benchmark_results( results, baseline ) ) )
+    print()
+    print('  Fixture: '+str(results['sentences'])+' sentences, '+str(n_tokens)+' tokens')
+    if args.save:
+        o_f = codecs.open( args.save, mode='w', encoding='utf-8' )
+        json.dump( results, o_f, indent=1, sort_keys=True )
+        o_f.close()
+        print('  --> ',args.save)
+    exit_code = 0
+    if baseline:
+        regressions = find_regressions( results, baseline, tolerance=args.tolerance )
+        for key in regressions:
+            print(' (!) Regression in '+key+': {:.0f} tokens/s (baseline: {:.0f} tokens/s)'.format( \
+                  results['benchmarks'][key]['tokens_per_s'], baseline['benchmarks'][key]['tokens_per_s'] ))
+        exit_code = 1 if regressions else 0
+    sys.exit( exit_code )
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+#
+#    Benchmarks how MaltParser's training scales with the size of the training data:
+#    trains models on nested subsamples of the training corpus, and records the
+#    training time, the peak memory usage of the Java process, the model size and
+#    the accuracy on the test corpus;
+#
+from __future__ import unicode_literals, print_function
+
+import sys, os, re, os.path
+import codecs, json
+import argparse
+
+from concurrent.futures import ThreadPoolExecutor
+
+from conll_evaluation import evaluate_conll_files, METRICS
+from conll_utils import write_nested_subsamples, count_conll_sentences, format_fraction
+from maltparser_utils import make_train_command, make_parse_command
+from process_runner import run_process, terminate_on_interrupt
+from resource_planner import plan_training, format_plan
+from compressed_io import plain_input_file
+from run_history import RunHistory, DEFAULT_HISTORY_DB
+
+# Columns of the CSV report and of the plot-ready table
+REPORT_COLUMNS = ['fraction', 'sentences', 'tokens', 'train_time', 'train_cpu_time', 'train_peak_rss_mb', \
+                  'model_size_mb', 'parse_time', 'LAS', 'UAS', 'LA']
+
+# =============================================================================
+#    Fetch command line arguments
+# =============================================================================
+malt_parser_jar   = 'maltparser-1.9.0.jar'
+train_corpus      = os.path.join('UD_Estonian-master', 'et-ud-train.cg3-conll')
+test_corpus       = os.path.join('UD_Estonian-master', 'et-ud-test.cg3-conll')
+model_name        = 'estnltkECG-lc'
+java_loc          = 'java'
+heap_size         = 'auto'
+fractions         = '0.1,0.25,0.5,1.0'
+n_workers         = 1
+seed              = 1
+report_name       = 'learning_curve'
+
+final_options_file = None
+feature_model_file = None
+
+arg_parser = argparse.ArgumentParser(description='''
+  Benchmarks how MaltParser's training scales with the size of the training data: trains models on nested subsamples
+  of the training corpus (e.g. 10%, 25%, 50% and 100% of the sentences), and records for each subsample the training
+  time, the peak memory usage (RSS) of the Java process, the size of the model file, and the accuracy (LAS, UAS, LA)
+  on the test corpus.
+''',\
+epilog='''
+  The results are written into <report_name>.json, <report_name>.csv, and a plot-ready whitespace-separated table
+  <report_name>.dat (e.g. for gnuplot). Subsamples, models and parsed files are written into <work_dir>.
+  Note that training the subsamples in parallel (--workers > 1) makes the jobs compete for CPU and memory, and this
+  can distort the measured training times.
+'''
+)
+arg_parser.add_argument("-m", "--maltparser_jar", default=malt_parser_jar, \
+                                        help="MaltParser's jar file to be used in training/evaluation (default: '"+malt_parser_jar+"');", \
+                                        metavar='<maltparser_jar>')
+arg_parser.add_argument("-n", "--name",  default=model_name, \
+                                         help="name prefix of the models (default: '"+model_name+"');", \
+                                         metavar='<model_name>')
+arg_parser.add_argument("-j", "--heap", default=heap_size, \
+                                        help="Java heap size argument used in executing Java commands, e.g. 'Xmx5048M'; if 'auto', "+\
+                                             "the heap size is planned for the largest subsample, calibrated against the run "+\
+                                             "history (default: '"+heap_size+"');", \
+                                        metavar='<heap_size>')
+arg_parser.add_argument("-i", "--train", default=train_corpus, \
+                                         help="training corpus CONLL file (default: '"+train_corpus+"');", \
+                                         metavar='<train_corpus>')
+arg_parser.add_argument("-g", "--test",  default=test_corpus, \
+                                         help="evaluation corpus CONLL file (default: '"+test_corpus+"');", \
+                                         metavar='<test_corpus>')
+arg_parser.add_argument("-p", "--fractions", default=fractions, \
+                                             help="comma-separated list of subsample sizes, as fractions of the training corpus (default: '"+fractions+"');", \
+                                             metavar='<fractions>')
+arg_parser.add_argument("-w", "--workers", default=n_workers, type=int, \
+                                           help="number of subsamples trained in parallel (default: "+str(n_workers)+");", \
+                                           metavar='<workers>')
+arg_parser.add_argument("-r", "--seed", default=seed, type=int, \
+                                        help="random seed used in sampling the sentences (default: "+str(seed)+");", \
+                                        metavar='<seed>')
+arg_parser.add_argument("-o", "--report", default=report_name, \
+                                          help="base name of the report files (default: '"+report_name+"');", \
+                                          metavar='<report_name>')
+arg_parser.add_argument("-d", "--work_dir", default=None, \
+                                            help="directory for subsamples, models and parsed files (default: <report_name>.work);", \
+                                            metavar='<work_dir>')
+arg_parser.add_argument("-F", "--final_options", default=final_options_file, \
+                              help="final configuration file (finalOptionsFile.xml) with path (default: "+str(final_options_file)+");", \
+                              metavar='<finalOptionsFile>')
+arg_parser.add_argument("-f", "--feature_model", default=feature_model_file, \
+                                                 help="feature model XML file with path (default: "+str(feature_model_file)+");", \
+                                                 metavar='<feature_model_file>')
+arg_parser.add_argument("-hd", "--history", default=DEFAULT_HISTORY_DB, \
+                                           help="run history used for calibrating the planned heap size, if it exists "+\
+                                                "(default: '"+DEFAULT_HISTORY_DB+"');", \
+                                           metavar='<history_db>')
+args = arg_parser.parse_args()
+if not args.maltparser_jar or not os.path.isfile(args.maltparser_jar):
+   raise Exception('MaltParser jar not found: '+args.maltparser_jar)
+if not args.train or not os.path.isfile(args.train):
+   raise Exception('Train corpus not found: '+args.train)
+if not args.test or not os.path.isfile(args.test):
+   raise Exception('Test corpus not found: '+args.test)
+if args.feature_model and not os.path.isfile(args.feature_model):
+    raise Exception('Feature model file not found: '+args.feature_model)
+if args.final_options and (not os.path.isfile(args.final_options) or \
+                           not 'finalOptionsFile.xml' in args.final_options):
+    raise Exception('Invalid final_options file: '+args.final_options)
+if bool(args.feature_model) != bool(args.final_options):
+    raise Exception('(!) Both final_options file and feature_model file should be given.')
+fractions = sorted( [float(f) for f in args.fractions.split(',') if f.strip()] )
+heap_size = args.heap
+if heap_size == 'auto':
+    # All subsamples use the same heap (planned for the largest one), so that
+    # the heap size does not affect the comparison of the training times
+    sentence_count, token_count = count_conll_sentences( args.train )
+    history = RunHistory( args.history ) if os.path.isfile(args.history) else None
+    plan = plan_training( int(token_count * max(fractions)), feature_model_file=args.feature_model, \
+                          max_jobs=args.workers, history=history )
+    if history:
+        history.close()
+    heap_size = plan['heap_size']
+    print(' Planned resources: '+format_plan( plan ))
+    if plan['jobs'] < args.workers:
+        print(' (!) Warning: '+str(args.workers)+' parallel workers may not fit into the available memory.')
+if not heap_size.startswith('-'):
+   heap_size = '-'+heap_size
+work_dir = os.path.abspath( args.work_dir if args.work_dir else args.report+'.work' )
+if not os.path.isdir(work_dir):
+    os.makedirs(work_dir)
+malt_parser_jar    = os.path.abspath( args.maltparser_jar )
+test_corpus        = os.path.abspath( args.test )
+final_options_file = os.path.abspath( args.final_options ) if args.final_options else None
+feature_model_file = os.path.abspath( args.feature_model ) if args.feature_model else None
+
+
+def benchmark_subsample( fraction, sample_file, sentences, tokens, test_file=None ):
+    ''' Trains a model on the given subsample, and evaluates it on the test corpus
+        (*test_file* is a plain copy of the test corpus, if it is compressed);
+        Returns a dict with the measurements;
+    '''
+    test_file = test_file or test_corpus
+    name = args.name+'-'+format_fraction( fraction )
+    log_file = os.path.join( work_dir, name+'.log' )
+    if os.path.exists( log_file ):
+        os.unlink( log_file )
+    command = make_train_command( java_loc, malt_parser_jar, name, sample_file, heap_size=heap_size, \
+                                  final_options_file=final_options_file, \
+                                  feature_model_file=feature_model_file, working_dir=work_dir )
+    print ("  Executing:  "+' '.join(command))
+    train_record = run_process( command, stage='learn', cwd=work_dir, log_file=log_file, echo=False )
+    model_file = os.path.join( work_dir, name+'.mco' )
+    if not os.path.exists( model_file ):
+        raise Exception('(!) Training failed on the subsample: '+sample_file)
+    out_file = os.path.join( work_dir, name+'.parsed' )
+    command = make_parse_command( java_loc, malt_parser_jar, name, test_file, out_file, \
+                                  working_dir=work_dir )
+    print ("  Executing:  "+' '.join(command))
+    parse_record = run_process( command, stage='parse', cwd=work_dir, log_file=log_file, echo=False )
+    results = evaluate_conll_files( test_file, out_file )
+    train_rss = train_record['peak_rss']
+    record = { 'fraction':fraction, 'sentences':sentences, 'tokens':tokens, \
+               'train_time':train_record['wall_time'], 'parse_time':parse_record['wall_time'], \
+               'train_cpu_time':train_record['cpu_time'], \
+               'train_peak_rss_mb': train_rss / 1024.0**2 if train_rss else None, \
+               'model_size_mb': os.path.getsize( model_file ) / 1024.0**2 }
+    for metric in METRICS:
+        record[metric] = results[metric]
+    return record
+
+
+print(' Sampling '+args.train+' ...')
+samples = write_nested_subsamples( args.train, fractions, work_dir, seed=args.seed )
+with plain_input_file( test_corpus, temp_dir=work_dir ) as test_file:
+    executor = ThreadPoolExecutor( max_workers=max(1, args.workers) )
+    futures  = [ executor.submit( benchmark_subsample, *sample, test_file=test_file ) for sample in samples ]
+    with terminate_on_interrupt():
+        executor.shutdown( wait=True )
+    records = [ future.result() for future in futures ]
+
+# =============================================================================
+#    Write the report
+# =============================================================================
+report = { 'train_corpus': args.train, 'test_corpus': args.test, 'seed': args.seed, \
+           'heap_size': heap_size, 'workers': args.workers, 'records': records }
+o_f = codecs.open( args.report+'.json', mode='w', encoding='utf-8' )
+json.dump( report, o_f, indent=1, sort_keys=True )
+o_f.close()
+o_f = codecs.open( args.report+'.csv', mode='w', encoding='utf-8' )
+o_f.write( ','.join(REPORT_COLUMNS)+'\n' )
+for record in records:
+    o_f.write( ','.join( [str(record[c]) for c in REPORT_COLUMNS] )+'\n' )
+o_f.close()
+table = [ '# '+' '.join(REPORT_COLUMNS) ]
+for record in records:
+    table.append( ' '.join( ['{:.4f}'.format(record[c]) if isinstance(record[c], float) else \
+                             ('NaN' if record[c] is None else str(record[c])) for c in REPORT_COLUMNS] ) )
+o_f = codecs.open( args.report+'.dat', mode='w', encoding='utf-8' )
+o_f.write( '\n'.join(table)+'\n' )
+o_f.close()
+print()
+print( '\n'.join(table) )
+print()
+print('  --> ',args.report+'.json')
+print('  --> ',args.report+'.csv')
+print('  --> ',args.report+'.dat')
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+#
+#    Benchmarks MaltParser and EstNLTK's VISLCG3 based parser side by side on
+#    the same input: throughput (sentences/s and tokens/s), startup latency,
+#    peak memory and accuracy (LAS/UAS/LA), for cold and warm runs, and by
+#    sentence length;
+#
+from __future__ import unicode_literals, print_function
+
+import sys, os, re, os.path
+import codecs, json
+import argparse
+
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer as timer
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from conll_evaluation import evaluate_conll_files, length_bucket_names, SENT_LENGTH_BUCKETS, METRICS
+from conll_utils import iter_conll_sentence_lines, count_conll_sentences, split_conll_by_sentence_length
+from maltparser_utils import make_parse_command
+from process_runner import run_process, terminate_on_interrupt, _rss_to_bytes
+from compressed_io import strip_compression_suffix
+
+# Names of the VISLCG3 pipelines (see estnltk.syntax.vislcg3_syntax)
+VISLCG3_PIPELINES = { '1_4': 'SYNTAX_PIPELINE_1_4', 'estcg': 'SYNTAX_PIPELINE_ESTCG' }
+
+
+def _benchmark_inputs( parse, inputs, n_runs ):
+    ''' Runs the benchmark with the function parse(in_file, out_file, cold),
+        which parses a CONLL file and returns its timing: a dict with keys
+        'wall_time' and 'peak_rss' (in bytes, or None);
+        *inputs* is a dict with keys 'all' (the whole corpus), 'startup' (a
+        single sentence) and 'by_length' (a list of bucket files or None-s);
+        The first run on the whole corpus is the cold run, followed by
+        *n_runs* runs on the single sentence (startup latency), *n_runs* warm
+        runs on the whole corpus, and *n_runs* runs on each length bucket;
+        Returns a dict mapping each of 'cold', 'startup', 'warm' and
+        'by_length' to lists of timings;
+    '''
+    def timed( in_file, cold=False ):
+        return parse( in_file, in_file+'.parsed', cold )
+    timings = { 'cold': [ timed( inputs['all'], cold=True ) ] }
+    timings['startup'] = [ timed( inputs['startup'] ) for i in range(n_runs) ]
+    timings['warm']    = [ timed( inputs['all'] ) for i in range(n_runs) ]
+    timings['by_length'] = []
+    for bucket_file in inputs['by_length']:
+        timings['by_length'].append( [ timed( bucket_file ) for i in range(n_runs) ] if bucket_file else [] )
+    return timings
+
+
+def benchmark_maltparser( config, inputs, n_runs ):
+    ''' Benchmarks MaltParser (each parse is a separate Java process, so every
+        run includes the startup of the JVM and the loading of the model); '''
+    def parse( in_file, out_file, cold ):
+        command = make_parse_command( config['java_loc'], config['malt_parser_jar'], config['model_name'], \
+                                      in_file, out_file, heap_size=config['heap_size'] )
+        record = run_process( command, stage='parse', log_file=config['log_file'], echo=False )
+        return { 'wall_time': record['wall_time'], 'peak_rss': record['peak_rss'] }
+    return _benchmark_inputs( parse, inputs, n_runs )
+
+
+def _parse_with_vislcg3( config, in_file, out_file, warm_up_file=None ):
+    ''' Parses *in_file* into *out_file* with EstNLTK's VISLCG3Parser, and
+        returns the timing of the parse (a dict with keys 'wall_time' and
+        'peak_rss'); Executed in a fresh worker process, so that the peak RSS
+        -- of the worker, plus the largest peak RSS of its vislcg3 processes
+        (an approximation, as the processes of the pipeline run concurrently)
+        -- covers this parse only; If *warm_up_file* is given, it is parsed
+        first, without measuring, so that the measured parse is a warm one;
+    '''
+    import estnltk.syntax.vislcg3_syntax as vislcg3_syntax
+    from conll_text_reader import iter_texts_from_conll_file
+    from test_estnltk_vislcg3 import parse_text_with_vislcg3, write_conll_str
+    parse_config = { 'vislcg3_cmd': config['vislcg3_cmd'], 'force_disamb': False, \
+                     'replace_root': True, \
+                     'pipeline': getattr( vislcg3_syntax, VISLCG3_PIPELINES[config['pipeline']] ) }
+    def parse( in_file, out_file ):
+        o_f = codecs.open( out_file, mode='w', encoding='utf-8' )
+        for text in iter_texts_from_conll_file( in_file, batch_size=config['batch_size'], conll_layer=False ):
+            write_conll_str( o_f, parse_text_with_vislcg3( text, parse_config ) )
+        o_f.close()
+    if warm_up_file:
+        parse( warm_up_file, warm_up_file+'.parsed' )
+    start_time = timer()
+    parse( in_file, out_file )
+    wall_time = timer() - start_time
+    peak_rss = None
+    if resource is not None:
+        peak_rss = _rss_to_bytes( resource.getrusage(resource.RUSAGE_SELF).ru_maxrss ) + \
+                   _rss_to_bytes( resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss )
+    return { 'wall_time': wall_time, 'peak_rss': peak_rss }
+
+
+def benchmark_vislcg3( config, inputs, n_runs ):
+    ''' Benchmarks EstNLTK's VISLCG3Parser; Each run is executed in a fresh
+        worker process (the peak RSS of a process is a lifetime high-water
+        mark, so it can only be measured per run in a new process): the cold
+        run parses right after loading the parser, and the other runs first
+        warm up the parser on the single sentence;
+    '''
+    def parse( in_file, out_file, cold ):
+        executor = ProcessPoolExecutor( max_workers=1 )
+        future = executor.submit( _parse_with_vislcg3, config, in_file, out_file, \
+                                  warm_up_file=None if cold else inputs['startup'] )
+        with terminate_on_interrupt():
+            executor.shutdown( wait=True )
+        return future.result()
+    return _benchmark_inputs( parse, inputs, n_runs )
+
+
+def summarize_timings( timings, counts ):
+    ''' Summarizes a list of timings of parsing a corpus with *counts*
+        (a pair (sentences, tokens)): the median wall time, the throughput
+        and the largest peak RSS; '''
+    wall_time = float( np.median( [t['wall_time'] for t in timings] ) )
+    peaks = [ t['peak_rss'] for t in timings if t['peak_rss'] is not None ]
+    return { 'wall_time': wall_time, 'sentences_per_s': counts[0] / wall_time, \
+             'tokens_per_s': counts[1] / wall_time, 'peak_rss': max(peaks) if peaks else None, \
+             'runs': len(timings) }
+
+
+def format_benchmark_table( summary ):
+    ''' Formats the main table of the benchmark; Returns a list of strings; '''
+    lines = [ 'Parser'.ljust(16)+'Run'.ljust(7)+'Sent/s'.ljust(10)+'Tokens/s'.ljust(10)+'Wall(s)'.ljust(10)+\
+              'Startup(s)'.ljust(12)+'PeakRSS(MB)'.ljust(13)+''.join([m.ljust(8) for m in METRICS]) ]
+    for name, parser in summary['parsers'].items():
+        for run in ['cold', 'warm']:
+            s = parser[run]
+            rss = '{:.0f}'.format( s['peak_rss']/1024.0**2 ) if s['peak_rss'] is not None else '-'
+            lines.append( name[:15].ljust(16)+run.ljust(7)+'{:.1f}'.format(s['sentences_per_s']).ljust(10)+\
+                          '{:.0f}'.format(s['tokens_per_s']).ljust(10)+'{:.2f}'.format(s['wall_time']).ljust(10)+\
+                          '{:.2f}'.format(parser['startup']['wall_time']).ljust(12)+rss.ljust(13)+\
+                          ''.join(['{:.4f}'.format(parser['accuracy'][m]).ljust(8) for m in METRICS]) )
+    return lines
+
+
+def format_length_table( summary ):
+    ''' Formats the table of the (warm) throughput and the accuracy by sentence
+        length; Returns a list of strings; '''
+    lines = [ 'Parser'.ljust(16)+'Length'.ljust(8)+'Sentences'.ljust(11)+'Tokens/s'.ljust(10)+\
+              ''.join([m.ljust(8) for m in METRICS]) ]
+    for name, parser in summary['parsers'].items():
+        for bucket, s in parser['by_length'].items():
+            accuracy = parser['accuracy']['by_length'].get( bucket, {} )
+            lines.append( name[:15].ljust(16)+bucket.ljust(8)+str(s['sentences']).ljust(11)+\
+                          '{:.0f}'.format(s['tokens_per_s']).ljust(10)+\
+                          ''.join([('{:.4f}'.format(accuracy[m]) if m in accuracy else '-').ljust(8) for m in METRICS]) )
+    return lines
+
+
+if __name__ == '__main__':
+    # =============================================================================
+    #    Fetch command line arguments
+    # =============================================================================
+    malt_parser_jar   = 'maltparser-1.9.0.jar'
+    test_corpus       = os.path.join('UD_Estonian-master', 'et-ud-test.cg3-conll')
+    test_empty_corpus = None
+    model_name        = None
+    java_loc          = 'java'
+    heap_size         = 'Xmx5048M'
+    vislcg3_cmd       = 'vislcg3'
+    pipelines         = []
+    n_runs            = 3
+    batch_size        = 500
+    work_dir          = 'benchmark_parsers'
+
+    arg_parser = argparse.ArgumentParser(description='''
+      Benchmarks MaltParser and EstNLTK's VISLCG3 based parser side by side on the same input, and reports the
+      throughput (sentences/s and tokens/s), startup latency, peak memory and accuracy (LAS, UAS and LA) in a single
+      table.
+    ''',\
+    epilog='''
+      Each parser is first run once on the whole corpus (the cold run), then repeatedly on a single sentence (the
+      startup latency), repeatedly on the whole corpus (the warm runs; the median is reported), and repeatedly on the
+      sentence length buckets of the corpus. Each MaltParser run is a separate JVM, so every MaltParser run includes
+      the startup of the JVM and the loading of the model; cold and warm runs of MaltParser differ only by the
+      state of the OS caches. Each VISLCG3 pipeline is benchmarked in a fresh Python process.
+      The parsed files and the summary (benchmark.json) are written into <work_dir>.
+    '''
+    )
+    arg_parser.add_argument("-g", "--test",  default=test_corpus, \
+                                             help="evaluation corpus CONLL file (default: '"+test_corpus+"');", \
+                                             metavar='<test_corpus>')
+    arg_parser.add_argument("-te", "--test_empty",  default=test_empty_corpus, \
+                                             help="evaluation corpus (CONLL file) without syntactic annotations (default: '"+str(test_empty_corpus)+"');", \
+                                             metavar='<test_empty_corpus>')
+    arg_parser.add_argument("-n", "--name",  default=model_name, \
+                                             help="name of the MaltParser's model; if not given, MaltParser is not benchmarked (default: None);", \
+                                             metavar='<model_name>')
+    arg_parser.add_argument("-m", "--maltparser_jar", default=malt_parser_jar, \
+                                            help="MaltParser's jar file (default: '"+malt_parser_jar+"');", \
+                                            metavar='<maltparser_jar>')
+    arg_parser.add_argument("-j", "--heap", default=heap_size, \
+                                            help="Java heap size argument used in executing Java commands (default: '"+heap_size+"');", \
+                                            metavar='<heap_size>')
+    arg_parser.add_argument("-v", "--vislcg",  default=vislcg3_cmd, \
+                                               help="name of the vislcg3 executable with full path (default: '"+vislcg3_cmd+"');", \
+                                               metavar='<vislcg3_cmd>')
+    arg_parser.add_argument("-p", "--pipelines", nargs='*', default=pipelines, choices=sorted(VISLCG3_PIPELINES.keys()), \
+                                                 help="VISLCG3 pipelines to be benchmarked: '1_4' (SYNTAX_PIPELINE_1_4) and/or "+\
+                                                      "'estcg' (SYNTAX_PIPELINE_ESTCG) (default: none);")
+    arg_parser.add_argument("-b", "--batch_size", default=batch_size, type=int, \
+                                                  help="number of sentences VISLCG3 parses in one batch (default: "+str(batch_size)+");", \
+                                                  metavar='<sentences>')
+    arg_parser.add_argument("-r", "--runs", default=n_runs, type=int, \
+                                            help="number of warm runs (and startup runs) of each parser (default: "+str(n_runs)+");", \
+                                            metavar='<runs>')
+    arg_parser.add_argument("-w", "--work_dir", default=work_dir, \
+                                                help="directory where the parsed files and the summary are written (default: '"+work_dir+"');", \
+                                                metavar='<work_dir>')
+    args = arg_parser.parse_args()
+    if not os.path.isfile(args.test):
+        raise Exception('Test corpus not found: '+args.test)
+    if args.test_empty and not os.path.isfile(args.test_empty):
+        raise Exception('Test corpus not found: '+args.test_empty)
+    if not args.name and not args.pipelines:
+        raise Exception('(!) Nothing to benchmark: give the MaltParser model (--name) and/or VISLCG3 pipelines (--pipelines).')
+    if args.name:
+        if not os.path.isfile(args.maltparser_jar):
+            raise Exception('MaltParser jar not found: '+args.maltparser_jar)
+        if not os.path.isfile(args.name+'.mco'):
+            raise Exception('MaltParser model not found: '+args.name+'.mco')
+    if args.runs < 1:
+        raise Exception('Invalid number of runs: '+str(args.runs))
+    heap_size = args.heap
+    if not heap_size.startswith('-'):
+        heap_size = '-'+heap_size
+    if not os.path.isdir(args.work_dir):
+        os.makedirs(args.work_dir)
+
+    # =============================================================================
+    #    Prepare the inputs: the whole corpus, a single sentence, length buckets
+    # =============================================================================
+    in_corpus  = args.test_empty if args.test_empty else args.test
+    bucket_names = length_bucket_names()
+    def prepare_inputs( parser_dir ):
+        ''' Each parser gets its own copy of the inputs, so that the outputs
+            of the parsers do not overwrite each other; '''
+        if not os.path.isdir(parser_dir):
+            os.makedirs(parser_dir)
+        all_file = os.path.join( parser_dir, os.path.basename( strip_compression_suffix(in_corpus) ) )
+        startup_file = all_file+'.startup'
+        o_a = codecs.open( all_file, mode='w', encoding='utf-8' )
+        o_s = codecs.open( startup_file, mode='w', encoding='utf-8' )
+        for sid, sentence in enumerate( iter_conll_sentence_lines( in_corpus ) ):
+            o_a.write( '\n'.join(sentence)+'\n\n' )
+            if sid == 0:
+                o_s.write( '\n'.join(sentence)+'\n\n' )
+        o_a.close()
+        o_s.close()
+        return { 'all': all_file, 'startup': startup_file, \
+                 'by_length': split_conll_by_sentence_length( all_file, SENT_LENGTH_BUCKETS, parser_dir ) }
+    parsers = []
+    if args.name:
+        config = { 'java_loc': java_loc, 'malt_parser_jar': args.maltparser_jar, 'model_name': args.name, \
+                   'heap_size': heap_size, 'log_file': os.path.join( args.work_dir, 'maltparser.parse.log' ) }
+        if os.path.exists( config['log_file'] ):
+            os.unlink( config['log_file'] )
+        parsers.append( ('maltparser', benchmark_maltparser, config) )
+    for pipeline in args.pipelines:
+        config = { 'vislcg3_cmd': args.vislcg, 'pipeline': pipeline, 'batch_size': args.batch_size }
+        parsers.append( ('vislcg3_'+pipeline, benchmark_vislcg3, config) )
+
+    # =============================================================================
+    #    Run the benchmarks (one parser at a time, so they do not compete for CPU)
+    # =============================================================================
+    summary = { 'corpus': args.test, 'runs': args.runs, 'parsers': {} }
+    for name, benchmark, config in parsers:
+        print(' Benchmarking '+name+' ...')
+        inputs = prepare_inputs( os.path.join( args.work_dir, name ) )
+        executor = ProcessPoolExecutor( max_workers=1 )
+        future = executor.submit( benchmark, config, inputs, args.runs )
+        with terminate_on_interrupt():
+            executor.shutdown( wait=True )
+        timings = future.result()
+        counts  = count_conll_sentences( inputs['all'] )
+        parser  = { 'cold': summarize_timings( timings['cold'], counts ), \
+                    'warm': summarize_timings( timings['warm'], counts ), \
+                    'startup': summarize_timings( timings['startup'], count_conll_sentences( inputs['startup'] ) ), \
+                    'by_length': {} }
+        for bucket, bucket_file, bucket_timings in zip( bucket_names, inputs['by_length'], timings['by_length'] ):
+            if bucket_file:
+                bucket_counts = count_conll_sentences( bucket_file )
+                parser['by_length'][bucket] = summarize_timings( bucket_timings, bucket_counts )
+                parser['by_length'][bucket]['sentences'] = bucket_counts[0]
+        parser['accuracy'] = evaluate_conll_files( args.test, inputs['all']+'.parsed' )
+        del parser['accuracy']['confusion']
+        summary['parsers'][name] = parser
+
+    # =============================================================================
+    #    Report the results
+    # =============================================================================
+    print()
+    print( '\n'.join( format_benchmark_table( summary ) ) )
+    print()
+    print( '\n'.join( format_length_table( summary ) ) )
+    summary_file = os.path.join( args.work_dir, 'benchmark.json' )
+    o_f = codecs.open( summary_file, mode='w', encoding='utf-8' )
+    json.dump( summary, o_f, indent=1, sort_keys=True )
+    o_f.close()
+    print('  --> ',summary_file)
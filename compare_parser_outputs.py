@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+#
+#    Tests whether the difference between two parsers' outputs (e.g. models
+#    trained on corpora from different feature generators) is statistically
+#    significant: paired bootstrap test and approximate randomization test;
+#
+from __future__ import unicode_literals, print_function
+
+import sys, os, os.path
+import codecs, json
+import argparse
+
+from timeit import default_timer as timer
+
+from conll_evaluation import METRICS
+from significance_tests import compare_system_outputs, DEFAULT_RESAMPLES
+
+significance_level = 0.05
+
+arg_parser = argparse.ArgumentParser(description='''
+  Compares two parser output CONLL files (A and B) against the same gold standard CONLL file, and tests whether the
+  differences in LAS, UAS and LA are statistically significant, using the paired bootstrap test and the approximate
+  randomization test (both resample the test set at the sentence level).
+''',\
+epilog='''
+  For each metric, the script reports the scores of A and B, the difference A - B, the 95% bootstrap confidence
+  interval of the difference, and the p-values of both tests; the difference is marked significant if both p-values
+  are below the significance level. With the argument --json, the results are also saved into a JSON file.
+'''
+)
+arg_parser.add_argument("gold", help="the gold standard CONLL file;", metavar='<gold_corpus>')
+arg_parser.add_argument("system_a", help="output CONLL file of the system A;", metavar='<system_a>')
+arg_parser.add_argument("system_b", help="output CONLL file of the system B;", metavar='<system_b>')
+arg_parser.add_argument("-r", "--resamples", default=DEFAULT_RESAMPLES, type=int, \
+                                             help="number of resamples in each test (default: "+str(DEFAULT_RESAMPLES)+");", \
+                                             metavar='<resamples>')
+arg_parser.add_argument("-s", "--seed", default=None, type=int, \
+                                        help="random seed (default: None);", \
+                                        metavar='<seed>')
+arg_parser.add_argument("-a", "--alpha", default=significance_level, type=float, \
+                                         help="significance level (default: "+str(significance_level)+");", \
+                                         metavar='<alpha>')
+arg_parser.add_argument("-js", "--json", default=None, \
+                                         help="name of the JSON file where the results will be saved (default: None);", \
+                                         metavar='<json_file>')
+args = arg_parser.parse_args()
+for file_name in [args.gold, args.system_a, args.system_b]:
+    if not os.path.isfile(file_name):
+        raise Exception('Corpus not found: '+file_name)
+if args.resamples < 1:
+    raise Exception('Invalid number of resamples: '+str(args.resamples))
+
+start_time = timer()
+results = compare_system_outputs( args.gold, args.system_a, args.system_b, \
+                                  n_resamples=args.resamples, seed=args.seed )
+print('  A: '+args.system_a)
+print('  B: '+args.system_b)
+print()
+print( 'Metric'.ljust(8)+'A'.ljust(9)+'B'.ljust(9)+'A - B'.ljust(10)+'95% CI'.ljust(22)+\
+       'p(bootstrap)'.ljust(14)+'p(randomization)'.ljust(18) )
+for metric in METRICS:
+    r = results[metric]
+    significant = r['bootstrap']['p_value'] < args.alpha and r['randomization']['p_value'] < args.alpha
+    ci = '[{:+.4f}, {:+.4f}]'.format( r['bootstrap']['ci_low'], r['bootstrap']['ci_high'] )
+    print( metric.ljust(8)+'{:.4f}'.format(r['A']).ljust(9)+'{:.4f}'.format(r['B']).ljust(9)+\
+           '{:+.4f}'.format(r['bootstrap']['delta']).ljust(10)+ci.ljust(22)+\
+           '{:.4f}'.format(r['bootstrap']['p_value']).ljust(14)+\
+           '{:.4f}'.format(r['randomization']['p_value']).ljust(18)+\
+           ('significant' if significant else 'not significant') )
+print()
+print('  '+str(args.resamples)+' resamples per test, total time: {:.2f}s'.format( timer() - start_time ))
+
+if args.json:
+    results['system_a'] = args.system_a
+    results['system_b'] = args.system_b
+    results['alpha']    = args.alpha
+    o_f = codecs.open( args.json, mode='w', encoding='utf-8' )
+    json.dump( results, o_f, indent=1, sort_keys=True )
+    o_f.close()
+    print('  --> ',args.json)
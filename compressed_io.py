@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#
+#     Transparent reading and writing of compressed corpus files: the
+#    compression is selected by the extension of the file name (.gz for gzip,
+#    .xz for lzma, anything else is a plain file), and compressed files are
+#    read and written as streams;
+#
+#     External tools that need plain files (MaltParser, MaltOptimizer, EstNLTK's
+#    readers of *.inforem files) get decompressed temporary copies of the
+#    compressed inputs (see plain_input_file()), and write their outputs into
+#    temporary plain files, which are compressed into the target file once the
+#    tool has finished (see plain_output_file());
+#
+from __future__ import unicode_literals, print_function
+
+import os, os.path
+import io
+import codecs
+import gzip
+import lzma
+import shutil
+import tempfile
+
+from contextlib import contextmanager
+
+# Compression suffixes and the modules handling them
+COMPRESSION_MODULES = { '.gz': gzip, '.xz': lzma }
+
+# Compression level of gzip: level 6 compresses nearly as well as the
+# default 9 on the (very repetitive) CONLL files, but is several times faster
+GZIP_LEVEL = 6
+
+BLOCK_SIZE = 1024*1024
+
+
+def get_compression_suffix( file_name ):
+    ''' Returns the compression suffix ('.gz' or '.xz') of the file name, or
+        '' if the file is not compressed; '''
+    suffix = os.path.splitext( file_name )[1].lower()
+    return suffix if suffix in COMPRESSION_MODULES else ''
+
+
+def is_compressed( file_name ):
+    return get_compression_suffix( file_name ) != ''
+
+
+def strip_compression_suffix( file_name ):
+    ''' Removes the compression suffix from the file name, e.g.
+           'et-ud-train.cg3-conll.gz'  -->  'et-ud-train.cg3-conll'
+    '''
+    suffix = get_compression_suffix( file_name )
+    return file_name[:-len(suffix)] if suffix else file_name
+
+
+def add_file_suffix( file_name, suffix ):
+    ''' Appends the *suffix* to the file name, keeping the compression suffix
+        at the end, e.g.
+           ('et-ud-test.cg3-conll.gz', '.parsed')  -->  'et-ud-test.cg3-conll.parsed.gz'
+    '''
+    return strip_compression_suffix( file_name ) + suffix + get_compression_suffix( file_name )
+
+
+def open_corpus( file_name, mode='r', encoding='utf-8' ):
+    ''' Opens the (possibly compressed) file as a stream; *mode* is one of 'r',
+        'w', 'a' (text streams in the given encoding), 'rb', 'wb' or 'ab'
+        (binary streams); As with codecs.open, line endings are not
+        translated;
+    '''
+    module = COMPRESSION_MODULES.get( get_compression_suffix( file_name ) )
+    binary = mode.endswith('b')
+    if module is None:
+        return open( file_name, mode ) if binary else codecs.open( file_name, mode=mode, encoding=encoding )
+    if module is gzip and not mode.startswith('r'):
+        stream = _open_gzip_for_writing( file_name, mode.rstrip('b') )
+        return stream if binary else io.TextIOWrapper( stream, encoding=encoding, newline='' )
+    if binary:
+        return module.open( file_name, mode )
+    return module.open( file_name, mode+'t', encoding=encoding, newline='' )
+
+
+def _open_gzip_for_writing( file_name, mode ):
+    ''' Opens a gzip stream for writing ('w') or appending ('a'), with a fixed
+        header: gzip.open() stores the modification time and the file name in
+        the header, so the same content written twice would give different
+        bytes (and different fingerprints, see model_store.file_fingerprint());
+    '''
+    raw_f = open( file_name, mode+'b' )
+    try:
+        stream = gzip.GzipFile( filename='', fileobj=raw_f, mode=mode+'b', compresslevel=GZIP_LEVEL, mtime=0 )
+    except:
+        raw_f.close()
+        raise
+    # let the gzip stream close the underlying file
+    stream.myfileobj = raw_f
+    return stream
+
+
+def copy_stream_file( in_file, out_file ):
+    ''' Copies the contents of *in_file* into *out_file*, decompressing and
+        compressing according to the extensions of the file names; '''
+    in_f = open_corpus( in_file, 'rb' )
+    try:
+        o_f = open_corpus( out_file, 'wb' )
+        try:
+            shutil.copyfileobj( in_f, o_f, BLOCK_SIZE )
+        finally:
+            o_f.close()
+    finally:
+        in_f.close()
+
+
+def _make_temp_file( file_name, temp_dir=None ):
+    base_name = os.path.basename( strip_compression_suffix( file_name ) )
+    fd, temp_file = tempfile.mkstemp( prefix='plain_', suffix='_'+base_name, dir=temp_dir )
+    os.close( fd )
+    return temp_file
+
+
+@contextmanager
+def plain_input_file( file_name, temp_dir=None ):
+    ''' Yields the name of a plain (uncompressed) file with the contents of
+        the given file: the file itself, if it is not compressed, and a
+        decompressed temporary copy otherwise (removed on exit); '''
+    if not is_compressed( file_name ):
+        yield file_name
+        return
+    temp_file = _make_temp_file( file_name, temp_dir=temp_dir )
+    try:
+        copy_stream_file( file_name, temp_file )
+        yield temp_file
+    finally:
+        os.remove( temp_file )
+
+
+@contextmanager
+def plain_output_file( file_name, temp_dir=None ):
+    ''' Yields the name of a plain file into which the output should be
+        written: the file itself, if it is not compressed, and a temporary
+        file otherwise; Once the enclosed block has completed without errors,
+        the temporary file is compressed into the given file; '''
+    if not is_compressed( file_name ):
+        yield file_name
+        return
+    temp_file = _make_temp_file( file_name, temp_dir=temp_dir )
+    try:
+        yield temp_file
+        partial_file = file_name+'.'+str(os.getpid())+'.tmp'+get_compression_suffix( file_name )
+        copy_stream_file( temp_file, partial_file )
+        os.replace( partial_file, file_name )
+    finally:
+        os.remove( temp_file )
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+#
+#     Native (in-process) evaluation of dependency parsing results;
+#
+#     Streams a gold standard CONLL file and a system output CONLL file together,
+#    and computes the attachment scores LAS, UAS and LA in the same way as
+#    MaltEval (with its default settings: all tokens, including punctuation,
+#    are counted) does. In addition to the overall scores, breakdowns by gold
+#    DEPREL, by gold CPOSTAG and by sentence length, and a confusion matrix of
+#    the dependency labels are provided.
+#
+from __future__ import unicode_literals, print_function
+
+from compressed_io import open_corpus
+
+import numpy as np
+
+# Upper bounds of the sentence length buckets (the last bucket is open ended)
+SENT_LENGTH_BUCKETS = [10, 20, 30, 40]
+
+# Metrics reported by default (the same order as in --Metric LAS;UAS;LA)
+METRICS = ['LAS', 'UAS', 'LA']
+
+
+# =============================================================================
+#    Reading CONLL files
+# =============================================================================
+
+def _iter_conll_tokens( in_f ):
+    ''' Yields lists of CONLL fields of a token from the given file handle;
+        Sentence boundaries are signalled by yielding None;
+        Comment lines (starting with #) are skipped;
+    '''
+    for line in in_f:
+        line = line.rstrip('\r\n')
+        if line.startswith('#'):
+            continue
+        if len(line) == 0 or line.isspace():
+            yield None
+            continue
+        yield line.split('\t')
+    yield None
+
+
+def _iter_conll_sentences( file_name ):
+    ''' Yields sentences (lists of lists of CONLL fields) from the given file; '''
+    in_f = open_corpus( file_name, mode='r' )
+    try:
+        sentence = []
+        for fields in _iter_conll_tokens( in_f ):
+            if fields is None:
+                if sentence:
+                    yield sentence
+                sentence = []
+            else:
+                if len(fields) < 8:
+                    raise Exception('(!) In file '+file_name+', line with unexpected format: "'+\
+                                    '\t'.join(fields)+'"')
+                sentence.append( fields )
+    finally:
+        in_f.close()
+
+
+def read_gold_and_system_columns( gold_file, system_file ):
+    ''' Streams *gold_file* and *system_file* together, sentence by sentence,
+        and collects the columns required for the evaluation;
+        Raises an exception if the files have different sentence or token
+        counts;
+
+        Returns a dict of NumPy arrays (one element per token):
+          'gold_head', 'sys_head'     -- HEAD values (int);
+          'gold_deprel', 'sys_deprel' -- DEPREL values (int codes of 'labels');
+          'postag'                    -- gold CPOSTAG values (int codes of 'postags');
+          'sent_id'                   -- index of the sentence of the token;
+          'sent_len'                  -- length of the sentence of the token;
+        and lists 'labels' and 'postags' for decoding the int codes;
+    '''
+    label_codes = {}
+    pos_codes   = {}
+    gold_head, sys_head     = [], []
+    gold_deprel, sys_deprel = [], []
+    postag, sent_id, sent_len = [], [], []
+    gold_sents = _iter_conll_sentences( gold_file )
+    sys_sents  = _iter_conll_sentences( system_file )
+    sid = 0
+    while True:
+        gold_sent = next(gold_sents, None)
+        sys_sent  = next(sys_sents, None)
+        if gold_sent is None and sys_sent is None:
+            break
+        if gold_sent is None or sys_sent is None:
+            raise Exception('(!) Different number of sentences in '+gold_file+' and '+system_file)
+        if len(gold_sent) != len(sys_sent):
+            raise Exception('(!) Different number of tokens in the sentence #'+str(sid+1)+\
+                            ' of '+gold_file+' and '+system_file+': '+\
+                            str(len(gold_sent))+' vs '+str(len(sys_sent)))
+        for gold_tok, sys_tok in zip(gold_sent, sys_sent):
+            gold_head.append( int(gold_tok[6]) )
+            sys_head.append( int(sys_tok[6]) if sys_tok[6] != '_' else -1 )
+            gold_deprel.append( label_codes.setdefault( gold_tok[7], len(label_codes) ) )
+            sys_deprel.append(  label_codes.setdefault( sys_tok[7],  len(label_codes) ) )
+            postag.append( pos_codes.setdefault( gold_tok[3], len(pos_codes) ) )
+        sent_id.extend( [sid] * len(gold_sent) )
+        sent_len.extend( [len(gold_sent)] * len(gold_sent) )
+        sid += 1
+    labels  = sorted( label_codes, key=label_codes.get )
+    postags = sorted( pos_codes, key=pos_codes.get )
+    return { 'gold_head':   np.array(gold_head, dtype=np.int32), \
+             'sys_head':    np.array(sys_head, dtype=np.int32), \
+             'gold_deprel': np.array(gold_deprel, dtype=np.int32), \
+             'sys_deprel':  np.array(sys_deprel, dtype=np.int32), \
+             'postag':      np.array(postag, dtype=np.int32), \
+             'sent_id':     np.array(sent_id, dtype=np.int32), \
+             'sent_len':    np.array(sent_len, dtype=np.int32), \
+             'labels':      labels, \
+             'postags':     postags }
+
+
+# =============================================================================
+#    Computing the scores
+# =============================================================================
+
+def _correctness_arrays( columns ):
+    ''' Returns a dict of boolean arrays marking tokens correct wrt each metric; '''
+    head_ok  = columns['gold_head'] == columns['sys_head']
+    label_ok = columns['gold_deprel'] == columns['sys_deprel']
+    return { 'LAS':head_ok & label_ok, 'UAS':head_ok, 'LA':label_ok }
+
+
+def _scores_by_group( correct, group_codes, group_names ):
+    ''' Computes accuracies of each metric for each group of tokens; '''
+    n_groups = len(group_names)
+    counts = np.bincount( group_codes, minlength=n_groups )
+    results = {}
+    for metric in METRICS:
+        hits = np.bincount( group_codes, weights=correct[metric], minlength=n_groups )
+        for gid, name in enumerate( group_names ):
+            if counts[gid] == 0:
+                continue
+            if name not in results:
+                results[name] = { 'count': int(counts[gid]) }
+            results[name][metric] = float(hits[gid]) / counts[gid]
+    return results
+
+
+def length_bucket_names():
+    ''' Returns names of the sentence length buckets (e.g. '1-10', '41+'); '''
+    names = []
+    lower = 1
+    for upper in SENT_LENGTH_BUCKETS:
+        names.append( str(lower)+'-'+str(upper) )
+        lower = upper + 1
+    names.append( str(lower)+'+' )
+    return names
+
+
+def evaluate_columns( columns ):
+    ''' Computes evaluation results from the columns obtained via
+        read_gold_and_system_columns(). See evaluate_conll_files() for
+        the description of the output;
+    '''
+    n_tokens = len(columns['gold_head'])
+    if n_tokens == 0:
+        raise Exception('(!) No tokens to evaluate.')
+    correct = _correctness_arrays( columns )
+    results = { 'tokens': n_tokens, \
+                'sentences': int(columns['sent_id'][-1]) + 1 }
+    for metric in METRICS:
+        results[metric] = float( np.count_nonzero(correct[metric]) ) / n_tokens
+    # Breakdowns by gold DEPREL and by gold CPOSTAG
+    results['by_deprel'] = \
+        _scores_by_group( correct, columns['gold_deprel'], columns['labels'] )
+    results['by_postag'] = \
+        _scores_by_group( correct, columns['postag'], columns['postags'] )
+    # Breakdown by sentence length
+    bucket_codes = np.searchsorted( SENT_LENGTH_BUCKETS, columns['sent_len'], side='left' )
+    results['by_length'] = \
+        _scores_by_group( correct, bucket_codes, length_bucket_names() )
+    # Confusion matrix of labels: rows are gold labels, columns system labels
+    n_labels = len(columns['labels'])
+    flat = columns['gold_deprel'].astype(np.int64) * n_labels + columns['sys_deprel']
+    matrix = np.bincount( flat, minlength=n_labels*n_labels ).reshape( (n_labels, n_labels) )
+    results['confusion'] = { 'labels': list(columns['labels']), \
+                             'matrix': matrix.tolist() }
+    return results
+
+
+def sentence_counts( columns ):
+    ''' Returns per-sentence counts from the columns obtained via
+        read_gold_and_system_columns(): a dict mapping
+        'tokens' to the array of token counts of the sentences, and each
+        metric to the array of counts of correct tokens in the sentences;
+    '''
+    n_sentences = int(columns['sent_id'][-1]) + 1
+    counts = { 'tokens': np.bincount( columns['sent_id'], minlength=n_sentences ).astype(np.float64) }
+    correct = _correctness_arrays( columns )
+    for metric in METRICS:
+        counts[metric] = np.bincount( columns['sent_id'], weights=correct[metric], minlength=n_sentences )
+    return counts
+
+
+def evaluate_conll_files( gold_file, system_file ):
+    ''' Evaluates the parsing results in *system_file* against the gold
+        standard annotations in *gold_file*;
+
+        Returns a dict with the following keys:
+          'tokens', 'sentences' -- counts of evaluated tokens and sentences;
+          'LAS', 'UAS', 'LA'    -- overall scores (floats in range 0..1);
+          'by_deprel'           -- scores grouped by the gold DEPREL;
+          'by_postag'           -- scores grouped by the gold CPOSTAG;
+          'by_length'           -- scores grouped by sentence length buckets;
+          'confusion'           -- dict with 'labels' and 'matrix', where
+                                   matrix[i][j] is the number of tokens having
+                                   gold label labels[i] and system label
+                                   labels[j];
+        Each group in 'by_*' is a dict with keys 'count', 'LAS', 'UAS', 'LA';
+    '''
+    columns = read_gold_and_system_columns( gold_file, system_file )
+    return evaluate_columns( columns )
+
+
+# =============================================================================
+#    Reporting
+# =============================================================================
+
+def format_results( results, pattern='{:.3f}' ):
+    ''' Formats overall scores in the same way as MaltEval's result table
+        (the lines that were earlier extracted with fetchResults());
+        Returns a list of strings;
+    '''
+    col_width = 24
+    header = ''.join( [('accuracy / Metric:'+m).ljust(col_width) for m in METRICS] )+'Token'
+    means  = ''.join( [pattern.format(results[m]).ljust(col_width) for m in METRICS] )+'Row mean'
+    counts = ''.join( [str(results['tokens']).ljust(col_width) for m in METRICS] )+'Row count'
+    return [header, means, counts]
+
+
+def format_breakdown( results, key, pattern='{:.3f}' ):
+    ''' Formats a breakdown table ('by_deprel', 'by_postag' or 'by_length')
+        of the results; Returns a list of strings;
+    '''
+    group_names = list( results[key].keys() )
+    if key == 'by_length':
+        order = length_bucket_names()
+        group_names = [ g for g in order if g in results[key] ]
+    else:
+        group_names = sorted( group_names )
+    lines = [ 'Group'.ljust(16)+'Count'.ljust(10)+''.join([m.ljust(10) for m in METRICS]) ]
+    for name in group_names:
+        group = results[key][name]
+        lines.append( name.ljust(16)+str(group['count']).ljust(10)+\
+                      ''.join([pattern.format(group[m]).ljust(10) for m in METRICS]) )
+    return lines
+
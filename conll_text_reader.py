@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#
+#     Streaming reader of CONLL format corpus files into EstNLTK's Text
+#    objects: yields one sentence, or a bounded batch of sentences, at a time
+#    (instead of a single Text of the whole corpus, as estnltk's
+#    read_text_from_conll_file() does), so that corpora larger than the
+#    memory can be processed;
+#
+#     Texts are constructed the same way as read_text_from_conll_file() does
+#    it: the tokenization of the CONLL file is preserved exactly, and the
+#    syntactic analyses are attached as a layer (LAYER_CONLL by default);
+#    Building the layer can be skipped, if the analyses will be discarded
+#    anyway (e.g. when the text is re-parsed);
+#
+from __future__ import unicode_literals, print_function
+
+from nltk.tokenize.regexp import RegexpTokenizer
+from nltk.tokenize.simple import LineTokenizer
+
+from estnltk.names import *
+from estnltk.text import Text
+from estnltk.syntax.utils import align_CONLL_with_Text, normalise_alignments, CONLL_DATA
+
+from conll_utils import iter_conll_sentence_batches
+
+
+def conll_sentences_to_text( sentences, conll_layer=True, layer_name=LAYER_CONLL, **kwargs ):
+    ''' Constructs a Text from the given sentences (lists of CONLL lines, as
+        yielded by conll_utils.iter_conll_sentence_lines()); If *conll_layer*
+        is True, syntactic analyses of the sentences are attached to the Text
+        as the layer *layer_name*; other keyword arguments are passed to
+        estnltk's align_CONLL_with_Text() and normalise_alignments();
+    '''
+    conll_lines = []
+    sentence_strs = []
+    for sentence in sentences:
+        tokens = []
+        for line in sentence:
+            # Skip comment lines
+            if line.startswith('#'):
+                continue
+            features = line.split('\t')
+            if len(features) != 10:
+                raise Exception('(!) Line with unexpected format: "'+line+'"')
+            tokens.append( features[1] )
+            conll_lines.append( line )
+        if tokens:
+            # (!) Use double space instead of single space in order to distinguish
+            #     word-tokenizing space from the single space in the multiwords
+            #     (e.g. 'Rio de Janeiro' as a single word);
+            sentence_strs.append( '  '.join(tokens) )
+            conll_lines.append( '' )
+    text = Text( '\n'.join(sentence_strs), word_tokenizer=RegexpTokenizer("  ", gaps=True), \
+                 sentence_tokenizer=LineTokenizer() )
+    text.tokenize_words()
+    if conll_layer:
+        alignments = align_CONLL_with_Text( conll_lines, text, None, **kwargs )
+        normalise_alignments( alignments, data_type=CONLL_DATA, **kwargs )
+        text[ layer_name ] = alignments
+    return text
+
+
+def iter_texts_from_conll_file( file_name, batch_size=1, conll_layer=True, layer_name=LAYER_CONLL, **kwargs ):
+    ''' Yields Texts of (at most) *batch_size* consecutive sentences from the
+        given CONLL file; Only one batch of sentences is held in the memory at
+        a time; See conll_sentences_to_text() for the other arguments;
+    '''
+    assert batch_size > 0, '(!) Invalid batch size: '+str(batch_size)
+    for batch in iter_conll_sentence_batches( file_name, batch_size ):
+        yield conll_sentences_to_text( batch, conll_layer=conll_layer, layer_name=layer_name, **kwargs )
+
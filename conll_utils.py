@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+#
+#     Utilities for handling CONLL format corpus files: iterating over
+#    sentences, splitting corpora into shards, and concatenating them back,
+#    loading UD_Estonian corpus files, and handling sentence indices
+#    (sent_id-s) of the corpora;
+#
+#     Corpus files can be compressed (*.gz or *.xz, see compressed_io.py):
+#    they are read as streams; files written for MaltParser (shards, folds,
+#    subsamples) are always plain;
+#
+from __future__ import unicode_literals, print_function
+
+import re
+import os, os.path
+import codecs
+import time
+
+from compressed_io import open_corpus, strip_compression_suffix
+
+
+def iter_conll_sentence_lines( file_name ):
+    ''' Yields sentences from the given CONLL file, one sentence at a time;
+        Each sentence is a list of lines (without line endings); Empty lines
+        are treated as sentence boundaries, and are not included;
+    '''
+    in_f = open_corpus( file_name, mode='r' )
+    try:
+        sentence = []
+        for line in in_f:
+            line = line.rstrip('\r\n')
+            if len(line) == 0 or line.isspace():
+                if sentence:
+                    yield sentence
+                sentence = []
+            else:
+                sentence.append( line )
+        if sentence:
+            yield sentence
+    finally:
+        in_f.close()
+
+
+def iter_conll_sentence_batches( file_name, batch_size ):
+    ''' Yields lists of (at most *batch_size*) consecutive sentences (lists
+        of lines, see iter_conll_sentence_lines()) from the given CONLL file; '''
+    batch = []
+    for sentence in iter_conll_sentence_lines( file_name ):
+        batch.append( sentence )
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def count_sentence_tokens( sentence ):
+    ''' Returns the number of tokens in the given sentence (a list of lines,
+        see iter_conll_sentence_lines()): comment lines are not counted; '''
+    return len([l for l in sentence if not l.startswith('#')])
+
+
+def count_conll_sentences( file_name ):
+    ''' Returns a pair (sentence_count, token_count) of the given CONLL file; '''
+    sentence_count = 0
+    token_count    = 0
+    for sentence in iter_conll_sentence_lines( file_name ):
+        sentence_count += 1
+        token_count    += count_sentence_tokens( sentence )
+    return sentence_count, token_count
+
+
+def split_conll_into_shards( file_name, n_shards, out_dir ):
+    ''' Splits the given CONLL file at sentence boundaries into (at most)
+        *n_shards* consecutive shards of roughly equal token counts, and
+        writes the shards into *out_dir*;
+        Returns a list of the shard file names, in the order of the original
+        file (so the original file can be restored by concatenating them);
+    '''
+    assert n_shards > 0, '(!) Invalid number of shards: '+str(n_shards)
+    sentence_count, token_count = count_conll_sentences( file_name )
+    n_shards = max(1, min(n_shards, sentence_count))
+    tokens_per_shard = float(token_count) / n_shards
+    base_name  = os.path.basename( strip_compression_suffix(file_name) )
+    shard_files = []
+    o_f = None
+    tokens_written = 0
+    for sentence in iter_conll_sentence_lines( file_name ):
+        # Start a new shard once the previous one has got its share of tokens
+        if o_f is None or (tokens_written >= tokens_per_shard * len(shard_files) and \
+                           len(shard_files) < n_shards):
+            if o_f is not None:
+                o_f.close()
+            shard_file = os.path.join( out_dir, base_name+'.shard'+str(len(shard_files)) )
+            shard_files.append( shard_file )
+            o_f = codecs.open( shard_file, mode='w', encoding='utf-8' )
+        o_f.write( '\n'.join(sentence) )
+        o_f.write( '\n\n' )
+        tokens_written += count_sentence_tokens( sentence )
+    if o_f is not None:
+        o_f.close()
+    return shard_files
+
+
+def split_conll_by_sentence_length( file_name, bounds, out_dir ):
+    ''' Splits the given CONLL file into sentence length buckets: a sentence of
+        n tokens goes into the first bucket i with n <= bounds[i], or into the
+        last (open ended) bucket, if n exceeds all the bounds; The buckets are
+        written into *out_dir*;
+        Returns a list of len(bounds)+1 file names (in the order of the buckets);
+        files of empty buckets are None;
+    '''
+    base_name = os.path.basename( strip_compression_suffix(file_name) )
+    bucket_files = [ os.path.join( out_dir, base_name+'.len'+str(i) ) for i in range(len(bounds)+1) ]
+    out_files = [ None ] * len(bucket_files)
+    try:
+        for sentence in iter_conll_sentence_lines( file_name ):
+            length = count_sentence_tokens( sentence )
+            bucket = len([b for b in bounds if b < length])
+            if out_files[bucket] is None:
+                out_files[bucket] = codecs.open( bucket_files[bucket], mode='w', encoding='utf-8' )
+            out_files[bucket].write( '\n'.join(sentence) )
+            out_files[bucket].write( '\n\n' )
+    finally:
+        for o_f in out_files:
+            if o_f is not None:
+                o_f.close()
+    return [ bucket_file if o_f is not None else None for bucket_file, o_f in zip(bucket_files, out_files) ]
+
+
+def concatenate_files( in_files, out_file, block_size=1024*1024 ):
+    ''' Concatenates given files (in the given order) into *out_file*; '''
+    o_f = open_corpus( out_file, 'wb' )
+    try:
+        for in_file in in_files:
+            in_f = open_corpus( in_file, 'rb' )
+            try:
+                block = in_f.read(block_size)
+                while block:
+                    o_f.write(block)
+                    block = in_f.read(block_size)
+            finally:
+                in_f.close()
+    finally:
+        o_f.close()
+
+
+# =============================================================================
+#    UD_Estonian corpus files
+# =============================================================================
+
+def load_sentences_from_ud_corpus( file_name ):
+    ''' Loads sentences from the given UD_Estonian CONLLU file; Returns a list
+        of [sent_id, tokens] pairs, where tokens is the list of word forms of
+        the sentence, and sent_id is taken from the preceding "# sent_id"
+        comment line;
+    '''
+    sentences = []
+    comment_sent_id = re.compile('^#\\s*sent_id\\s(\\S+)\\s*$')
+    sent_id        = None
+    sentence_count = 0
+    word_count     = 0
+    tokens = []
+    in_f = open_corpus( file_name, mode='r' )
+    for line in in_f:
+        # A comment line
+        if line.startswith('#'):
+            m = comment_sent_id.match(line)
+            if m:
+                sent_id = m.group(1)
+            continue
+        # Next sentence
+        line = line.rstrip()
+        if len(line) == 0 or re.match('^\\s+$', line):
+            if word_count != 0 and tokens:
+                sentences.append( [sent_id, tokens])
+                sentence_count += 1
+            word_count = 0
+            tokens     = []
+            continue
+        # Next token
+        features = line.split('\t')
+        if len(features) != 10:
+            raise Exception(' In file '+file_name+', line with unexpected format: "'+line+'" ')
+        token      = features[1]
+        word_count += 1
+        tokens.append( token )
+    in_f.close()
+    return sentences
+
+
+def format_time( sec ):
+    # Idea from:   http://stackoverflow.com/a/1384565
+    if sec > 864000:
+       raise Exception(' Unexpectedly, the value of seconds ',sec,' amounts more than a day! ')
+    return time.strftime('%H:%M:%S', time.gmtime(sec))
+
+
+# =============================================================================
+#    Sentence indices
+# =============================================================================
+
+def is_edt_file( file_name ):
+    ''' Whether the given file is an EDT *.inforem file (possibly compressed); '''
+    return strip_compression_suffix( file_name ).endswith('.inforem')
+
+
+def edt_file_to_doc_id( file_name ):
+    ''' Converts the name of an EDT *.inforem file into the document id used in
+        the sent_id-s of the UD_Estonian corpus, e.g.
+           'aja_ee_1999_20.tasak.inforem'  -->  'aja_ee199920'
+    '''
+    doc_id = os.path.basename( file_name ).replace('_', '').lower()
+    doc_id = re.sub('^(aja|ilu|tea)(.+)$', '\\1_\\2', doc_id)
+    return doc_id.split('.')[0]
+
+
+def sent_id_to_doc_id( sent_id ):
+    ''' Removes the sentence number (and the clause number, if present) from
+        the given sent_id, and returns the document id, e.g.
+           'aja_ee199920_12'           -->  'aja_ee199920'
+           'aja_ee199920_12_clause_0'  -->  'aja_ee199920'
+    '''
+    sent_id = re.sub('_clause_[0-9]+$', '', sent_id)
+    return re.sub('_[0-9]+$', '', sent_id)
+
+
+def read_sent_ids( file_name ):
+    ''' Reads sent_id-s from the given *.sent_ids file; Returns a list of
+        sent_id-s, in the same order as the sentences in the corresponding
+        *.cg3-conll file;
+    '''
+    sent_ids = []
+    in_f = open_corpus( file_name, mode='r' )
+    for line in in_f:
+        line = line.rstrip('\r\n')
+        if line.startswith('#'):
+            line = line[1:]
+        sent_ids.append( line )
+    in_f.close()
+    return sent_ids
+
+
+def get_sent_ids_file( corpus_file ):
+    ''' Returns the name of the *.sent_ids file accompanying the given corpus
+        file (which may be compressed: the sent_ids file is always plain); '''
+    return re.sub('^(.+)\\.([^.]+)$', '\\1.sent_ids', strip_compression_suffix(corpus_file))
+
+
+# =============================================================================
+#    Cross-validation folds
+# =============================================================================
+
+def assign_documents_to_folds( doc_token_counts, n_folds, seed=None ):
+    ''' Assigns documents into *n_folds* folds of roughly equal token counts;
+        *doc_token_counts* is a dict mapping document ids to token counts;
+        Documents are shuffled (with the given random *seed*), and then each
+        document is added to the fold having the smallest token count so far;
+        Returns a dict mapping document ids to fold indices;
+    '''
+    import random
+    if len(doc_token_counts) < n_folds:
+        raise Exception('(!) Cannot split '+str(len(doc_token_counts))+\
+                        ' documents into '+str(n_folds)+' folds.')
+    doc_ids = sorted( doc_token_counts.keys() )
+    random.Random( seed ).shuffle( doc_ids )
+    fold_sizes = [0] * n_folds
+    doc_folds  = {}
+    for doc_id in doc_ids:
+        fold = fold_sizes.index( min(fold_sizes) )
+        doc_folds[doc_id]  = fold
+        fold_sizes[fold] += doc_token_counts[doc_id]
+    return doc_folds
+
+
+def split_conll_into_folds( corpus_file, sent_ids, n_folds, out_dir, seed=None ):
+    ''' Splits the given CONLL corpus into *n_folds* cross-validation folds at
+        the document level: all sentences of a document belong to the same fold;
+        *sent_ids* is the list of sent_id-s of the sentences in the corpus (from
+        the *.sent_ids file);
+        For each fold k, writes files fold<k>.train.conll (sentences from all
+        the other folds) and fold<k>.test.conll (sentences of the fold) into
+        *out_dir*; If the corpus has an up-to-date offset index (written by the
+        data preparation scripts, see corpus_index.py), the token counts are
+        taken from the index, and the sentences are copied from the
+        memory-mapped corpus; otherwise, the corpus is streamed (no index is
+        built);
+        Returns a list of pairs (train_file, test_file), one pair per fold;
+    '''
+    from corpus_index import load_corpus_index
+    index = load_corpus_index( corpus_file, build=False )
+    if index is not None:
+        try:
+            return _split_indexed_corpus_into_folds( index, sent_ids, n_folds, out_dir, seed=seed )
+        finally:
+            index.close()
+    # 1) Collect token counts of the documents
+    doc_token_counts = {}
+    sentence_count   = 0
+    for sid, sentence in enumerate( iter_conll_sentence_lines( corpus_file ) ):
+        if sid >= len(sent_ids):
+            raise Exception('(!) Number of sent_ids is smaller than the number of sentences in '+corpus_file)
+        doc_id = sent_id_to_doc_id( sent_ids[sid] )
+        doc_token_counts[doc_id] = doc_token_counts.get(doc_id, 0) + count_sentence_tokens( sentence )
+        sentence_count += 1
+    if sentence_count != len(sent_ids):
+        raise Exception('(!) Number of sent_ids does not match the number of sentences in '+corpus_file)
+    doc_folds = assign_documents_to_folds( doc_token_counts, n_folds, seed=seed )
+    # 2) Write out the folds
+    fold_files = []
+    train_files = []
+    test_files  = []
+    for fold in range(n_folds):
+        train_file = os.path.join( out_dir, 'fold'+str(fold)+'.train.conll' )
+        test_file  = os.path.join( out_dir, 'fold'+str(fold)+'.test.conll' )
+        fold_files.append( (train_file, test_file) )
+        train_files.append( codecs.open(train_file, mode='w', encoding='utf-8') )
+        test_files.append(  codecs.open(test_file,  mode='w', encoding='utf-8') )
+    try:
+        for sid, sentence in enumerate( iter_conll_sentence_lines( corpus_file ) ):
+            sentence_str = '\n'.join(sentence)+'\n\n'
+            sentence_fold = doc_folds[ sent_id_to_doc_id( sent_ids[sid] ) ]
+            for fold in range(n_folds):
+                if fold == sentence_fold:
+                    test_files[fold].write( sentence_str )
+                else:
+                    train_files[fold].write( sentence_str )
+    finally:
+        for o_f in train_files + test_files:
+            o_f.close()
+    return fold_files
+
+
+def _split_indexed_corpus_into_folds( index, sent_ids, n_folds, out_dir, seed=None ):
+    ''' Same as split_conll_into_folds(), but reads the corpus via its offset
+        index (a corpus_index.CorpusIndex); '''
+    if len(index) != len(sent_ids):
+        raise Exception('(!) Number of sent_ids does not match the number of sentences in '+index.corpus_file)
+    doc_ids = [ sent_id_to_doc_id( sent_id ) for sent_id in sent_ids ]
+    doc_token_counts = {}
+    for sid, doc_id in enumerate( doc_ids ):
+        doc_token_counts[doc_id] = doc_token_counts.get(doc_id, 0) + index.token_count( sid )
+    doc_folds = assign_documents_to_folds( doc_token_counts, n_folds, seed=seed )
+    sentence_folds = [ doc_folds[doc_id] for doc_id in doc_ids ]
+    fold_files = []
+    for fold in range(n_folds):
+        train_file = os.path.join( out_dir, 'fold'+str(fold)+'.train.conll' )
+        test_file  = os.path.join( out_dir, 'fold'+str(fold)+'.test.conll' )
+        fold_files.append( (train_file, test_file) )
+        index.write_sentences( [sid for sid in range(len(index)) if sentence_folds[sid] != fold], train_file )
+        index.write_sentences( [sid for sid in range(len(index)) if sentence_folds[sid] == fold], test_file )
+    return fold_files
+
+
+# =============================================================================
+#    Subsamples
+# =============================================================================
+
+def format_fraction( fraction ):
+    ''' Formats the subsample fraction as a name part, e.g. 0.25 --> '25pct',
+        0.101 --> '10.1pct'; '''
+    return '{:g}'.format( fraction * 100 )+'pct'
+
+
+def write_nested_subsamples( corpus_file, fractions, out_dir, seed=None ):
+    ''' Writes nested random subsamples of the given CONLL corpus into *out_dir*:
+        the subsample of a smaller fraction is always a subset of the subsample
+        of a larger fraction; Sentences are sampled (with the given random
+        *seed*), and written in the same order as in the original corpus;
+        *fractions* is a list of floats in range (0, 1]; The subsamples are
+        written into files <corpus_base_name>.<fraction>pct (see
+        format_fraction()); Fractions with the same name are rejected;
+        If the corpus has an up-to-date offset index (written by the data
+        preparation scripts, see corpus_index.py), the sentence count is taken
+        from the index, and only the sampled sentences are read (from the
+        memory-mapped corpus); otherwise, the corpus is streamed (no index is
+        built);
+        Returns a list of tuples (fraction, file_name, sentence_count, token_count),
+        one tuple per fraction;
+    '''
+    import random
+    from corpus_index import load_corpus_index
+    index = load_corpus_index( corpus_file, build=False )
+    if index is not None:
+        sentence_count = len(index)
+    else:
+        sentence_count, token_count = count_conll_sentences( corpus_file )
+    # Rank of each sentence in a random order: a sentence belongs to the
+    # subsample of fraction f, if its rank is smaller than f * sentence_count
+    order = list(range(sentence_count))
+    random.Random( seed ).shuffle( order )
+    base_name = os.path.basename( strip_compression_suffix(corpus_file) )
+    samples = []
+    file_names = []
+    for fraction in fractions:
+        if not (0.0 < fraction <= 1.0):
+            raise Exception('(!) Invalid subsample fraction: '+str(fraction))
+        file_name = os.path.join( out_dir, base_name+'.'+format_fraction( fraction ) )
+        if file_name in file_names:
+            raise Exception('(!) Duplicate subsample fraction: '+str(fraction)+' ('+file_name+')')
+        file_names.append( file_name )
+    if index is not None:
+        try:
+            for fraction, file_name in zip( fractions, file_names ):
+                limit = max(1, int(round(fraction * sentence_count)))
+                tokens = index.write_sentences( sorted( order[:limit] ), file_name )
+                samples.append( (fraction, file_name, limit, tokens) )
+        finally:
+            index.close()
+        return samples
+    rank = [0] * sentence_count
+    for r, sid in enumerate( order ):
+        rank[sid] = r
+    for fraction, file_name in zip( fractions, file_names ):
+        limit = max(1, int(round(fraction * sentence_count)))
+        samples.append( [fraction, file_name, limit, 0, codecs.open(file_name, mode='w', encoding='utf-8')] )
+    try:
+        for sid, sentence in enumerate( iter_conll_sentence_lines( corpus_file ) ):
+            sentence_str = '\n'.join(sentence)+'\n\n'
+            for sample in samples:
+                if rank[sid] < sample[2]:
+                    sample[4].write( sentence_str )
+                    sample[3] += count_sentence_tokens( sentence )
+    finally:
+        for sample in samples:
+            sample[4].close()
+    return [ (fraction, file_name, limit, tokens) for (fraction, file_name, limit, tokens, o_f) in samples ]
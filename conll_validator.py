@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+#
+#     Validation of CONLL format corpus files (a native replacement for the
+#    MaltOptimizer's validateFormat.py, which requires Python 2);
+#
+#     Checks the number of columns, the sequencing of token IDs, ranges of
+#    HEAD values, cycles in the dependency trees, and empty fields (including
+#    empty FEATS). The file is read in large binary blocks, and the errors are
+#    reported by byte offsets (and line numbers) in the file. The "??" LEMMA-s
+#    that feature generators output for words without a root are reported as
+#    notices, but are valid, and are left unchanged.
+#
+#     Errors in the fields (empty fields, comment lines) can be fixed
+#    automatically: the cleaned file has these replaced with "_" (or removed).
+#    Errors in the tree structure (IDs, HEADs, cycles) and in the
+#    number of columns cannot be fixed automatically (see adhoc_fixes.py).
+#    After a successful validation, a marker file recording the fingerprint of
+#    the corpus can be written next to the corpus, so that the validation can
+#    be skipped until the corpus changes.
+#
+#     Compressed corpora (*.gz, *.xz) are read as streams, and the offsets are
+#    then reported in the decompressed contents; the cleaned file is
+#    compressed if its name has a compression suffix;
+#
+from __future__ import unicode_literals, print_function
+
+import os, os.path
+import codecs, json
+
+from model_store import file_fingerprint
+from compressed_io import open_corpus
+
+CONLL_COLUMNS = 10
+
+# Indexes of the columns
+ID, FORM, LEMMA, CPOSTAG, POSTAG, FEATS, HEAD, DEPREL = range(8)
+
+# The lemma that feature generators output, if the word has no root
+LEMMA_FALLBACK = '??'
+
+# Kinds of errors that can be fixed in the cleaned file
+FIXABLE_ERRORS = ['empty_field', 'empty_lemma', 'empty_feats', 'comment']
+
+# Kinds of findings that are only reported: the fields are valid, and are left
+# unchanged in the cleaned file, so that the cleaned file has the same
+# features as the corpora the models are trained and evaluated on
+NOTICES = ['lemma_fallback']
+
+VALIDATED_MARKER_SUFFIX = '.validated'
+
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+# =============================================================================
+#    Reading in blocks
+# =============================================================================
+
+def _iter_lines_with_offsets( in_f, block_size=BLOCK_SIZE ):
+    ''' Yields triples (line_number, byte_offset, line) from the given binary
+        file handle, reading it in blocks of *block_size* bytes; Lines are
+        bytes, without line endings;
+    '''
+    offset  = 0
+    line_nr = 0
+    rest    = b''
+    while True:
+        block = in_f.read( block_size )
+        if not block:
+            break
+        lines = (rest + block).split(b'\n')
+        rest  = lines.pop()
+        for line in lines:
+            line_nr += 1
+            yield line_nr, offset, line.rstrip(b'\r')
+            offset += len(line) + 1
+    if rest:
+        yield line_nr + 1, offset, rest.rstrip(b'\r')
+
+
+def _find_cycle( heads ):
+    ''' Returns the list of (1-based) token IDs forming a cycle in the given
+        list of HEAD values, or None if there are no cycles; '''
+    state = [0] * (len(heads) + 1)   # 0: unvisited, 1: on the current path, 2: done
+    for start in range(1, len(heads) + 1):
+        path = []
+        node = start
+        while 0 < node <= len(heads) and state[node] == 0:
+            state[node] = 1
+            path.append( node )
+            node = heads[node - 1]
+        if 0 < node <= len(heads) and state[node] == 1:
+            return path[ path.index(node): ]
+        for visited in path:
+            state[visited] = 2
+    return None
+
+
+# =============================================================================
+#    Validation
+# =============================================================================
+
+def _validate_sentence( tokens, report ):
+    ''' Validates the tree structure of a sentence; *tokens* is a list of
+        triples (line_number, byte_offset, fields); '''
+    heads = []
+    for expected_id, (line_nr, offset, fields) in enumerate(tokens, 1):
+        if fields[ID] != str(expected_id):
+            report( 'id', line_nr, offset, 'expected ID '+str(expected_id)+', found '+repr(fields[ID]) )
+        try:
+            head = int( fields[HEAD] )
+        except ValueError:
+            report( 'head', line_nr, offset, 'HEAD is not an integer: '+repr(fields[HEAD]) )
+            head = 0
+        if head < 0 or head > len(tokens):
+            report( 'head', line_nr, offset, 'HEAD '+str(head)+' out of range 0..'+str(len(tokens)) )
+            head = 0
+        elif head == expected_id:
+            report( 'cycle', line_nr, offset, 'token '+str(expected_id)+' is its own HEAD' )
+            head = 0
+        heads.append( head )
+    cycle = _find_cycle( heads )
+    if cycle:
+        line_nr, offset, fields = tokens[cycle[0] - 1]
+        report( 'cycle', line_nr, offset, 'cycle between tokens '+', '.join([str(t) for t in cycle]) )
+
+
+def validate_conll_file( file_name, cleaned_file=None, block_size=BLOCK_SIZE ):
+    ''' Validates the given CONLL file; If *cleaned_file* is given, writes a
+        copy of the corpus with fixable errors (see FIXABLE_ERRORS) fixed into
+        that file;
+        Returns a dict with keys 'errors' (a list of dicts with keys 'kind',
+        'line', 'offset' and 'message'), 'counts' (numbers of errors by kind),
+        'sentences', 'tokens' and 'valid' (whether the corpus has no errors
+        other than the fixable ones and the notices, see NOTICES);
+    '''
+    errors = []
+    counts = {}
+    def report( kind, line_nr, offset, message ):
+        errors.append( { 'kind': kind, 'line': line_nr, 'offset': offset, 'message': message } )
+        counts[kind] = counts.get(kind, 0) + 1
+    o_f = open_corpus( cleaned_file, mode='w' ) if cleaned_file else None
+    sentences = 0
+    token_count = 0
+    tokens = []
+    def end_sentence():
+        if tokens:
+            _validate_sentence( tokens, report )
+            if o_f:
+                for line_nr, offset, fields in tokens:
+                    o_f.write( '\t'.join(fields)+'\n' )
+                o_f.write( '\n' )
+        del tokens[:]
+    in_f = open_corpus( file_name, 'rb' )
+    try:
+        for line_nr, offset, raw_line in _iter_lines_with_offsets( in_f, block_size ):
+            try:
+                line = raw_line.decode('utf-8')
+            except UnicodeDecodeError as e:
+                report( 'encoding', line_nr, offset+e.start, 'invalid UTF-8: '+str(e.reason) )
+                line = raw_line.decode('utf-8', 'replace')
+            if len(line) == 0 or line.isspace():
+                if tokens:
+                    sentences += 1
+                end_sentence()
+                continue
+            if line.startswith('#'):
+                report( 'comment', line_nr, offset, 'comment lines are not allowed in CONLL-X' )
+                continue
+            fields = line.split('\t')
+            if len(fields) != CONLL_COLUMNS:
+                report( 'columns', line_nr, offset, 'expected '+str(CONLL_COLUMNS)+' columns, found '+str(len(fields)) )
+                fields = (fields + ['_'] * CONLL_COLUMNS)[:CONLL_COLUMNS]
+            for column, value in enumerate( fields ):
+                if len(value) == 0 or value.isspace():
+                    if column == LEMMA:
+                        report( 'empty_lemma', line_nr, offset, 'empty LEMMA' )
+                    elif column == FEATS:
+                        report( 'empty_feats', line_nr, offset, 'empty FEATS' )
+                    else:
+                        report( 'empty_field', line_nr, offset, 'empty field in the column '+str(column+1) )
+                    fields[column] = '_'
+            if fields[LEMMA] == LEMMA_FALLBACK:
+                report( 'lemma_fallback', line_nr, offset, 'LEMMA is "'+LEMMA_FALLBACK+'" (the word has no root)' )
+            tokens.append( (line_nr, offset, fields) )
+            token_count += 1
+        if tokens:
+            sentences += 1
+        end_sentence()
+    finally:
+        in_f.close()
+        if o_f:
+            o_f.close()
+    valid = all( [kind in FIXABLE_ERRORS or kind in NOTICES for kind in counts.keys()] )
+    return { 'errors': errors, 'counts': counts, 'sentences': sentences, 'tokens': token_count, 'valid': valid }
+
+
+def format_errors( results, max_errors=20 ):
+    ''' Formats (at most *max_errors*) errors and the error counts; Returns a
+        list of strings; '''
+    lines = []
+    for error in results['errors'][:max_errors]:
+        lines.append( '  line {} (byte {}): [{}] {}'.format( error['line'], error['offset'], \
+                                                           error['kind'], error['message'] ) )
+    if len(results['errors']) > max_errors:
+        lines.append( '  ... ('+str(len(results['errors']) - max_errors)+' more)' )
+    for kind in sorted( results['counts'].keys() ):
+        note = ' (fixable)' if kind in FIXABLE_ERRORS else (' (notice)' if kind in NOTICES else '')
+        lines.append( '  '+kind.ljust(16)+str(results['counts'][kind]).rjust(8)+note )
+    return lines
+
+
+# =============================================================================
+#    Marker of a validated corpus
+# =============================================================================
+
+def get_validated_marker( corpus_file ):
+    return corpus_file + VALIDATED_MARKER_SUFFIX
+
+
+def write_validated_marker( corpus_file, results ):
+    ''' Writes the marker file recording that the given corpus (with its
+        current contents) has been validated; Returns the marker file name; '''
+    marker_file = get_validated_marker( corpus_file )
+    o_f = codecs.open( marker_file, mode='w', encoding='utf-8' )
+    json.dump( { 'corpus': os.path.basename(corpus_file), 'fingerprint': file_fingerprint(corpus_file), \
+                 'sentences': results['sentences'], 'tokens': results['tokens'] }, o_f, indent=1, sort_keys=True )
+    o_f.close()
+    return marker_file
+
+
+def is_validated( corpus_file ):
+    ''' Checks whether the given corpus has a validated marker that matches
+        its current contents; '''
+    marker_file = get_validated_marker( corpus_file )
+    if not os.path.isfile( marker_file ):
+        return False
+    in_f = codecs.open( marker_file, mode='r', encoding='utf-8' )
+    try:
+        marker = json.load( in_f )
+    except ValueError:
+        return False
+    finally:
+        in_f.close()
+    return marker.get('fingerprint') == file_fingerprint( corpus_file )
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+#
+#     Offset index of a CONLL corpus file: maps the ordinal and the sent_id of
+#    each sentence to its byte offset and length in the corpus, so that any
+#    subset of sentences (a document, a fold, a sample, the sentences with
+#    errors) can be read without scanning the whole corpus;
+#
+#     The index is a binary file written next to the corpus (<corpus>.idx);
+#    sent_id-s are taken from the accompanying *.sent_ids file. Both the index
+#    and the corpus are memory-mapped read-only, sentences are sliced out of
+#    the mapped corpus, and sent_id-s are looked up via binary search. The
+#    index records the size and the modification time of the corpus and of
+#    the *.sent_ids file, and it is rebuilt once either of them changes.
+#    Compressed corpora (see compressed_io.py) cannot be indexed, as they
+#    cannot be read at random offsets;
+#
+#     The format of the index file:
+#       magic (8 bytes) | size and modification time (ns) of the corpus, and
+#       of the *.sent_ids file (int64 each) | number of sentences (uint32) |
+#       entries: for each sentence, in the order of the corpus: (offset,
+#       length, token count, sent_id offset, sent_id length) as uint64 and
+#       uint32-s | ordinals of the sentences in the order of the UTF-8 bytes of
+#       their sent_id-s (uint32) | data: sent_id-s (UTF-8);
+#
+from __future__ import unicode_literals, print_function
+
+import os, os.path
+import hashlib
+import mmap
+import struct
+import tempfile
+
+from compressed_io import open_corpus, is_compressed
+from conll_utils import get_sent_ids_file, read_sent_ids, sent_id_to_doc_id
+
+MAGIC = b'CONLLIX1'
+INDEX_SUFFIX = '.idx'
+
+_HEADER = struct.Struct( '<8sqqqqI' )
+_ENTRY  = struct.Struct( '<QIIII' )
+_ORDINAL = struct.Struct( '<I' )
+
+
+def _file_stamp( file_name ):
+    ''' Returns (size, modification time in ns) of the file, or (-1, -1) if the
+        file does not exist; '''
+    if not file_name or not os.path.isfile( file_name ):
+        return -1, -1
+    stat = os.stat( file_name )
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _scan_sentences( corpus_file ):
+    ''' Yields triples (offset, length, token_count) of the sentences of the
+        plain CONLL file; The length covers the lines of the sentence (along
+        with their line endings), but not the empty line following it; Comment
+        lines are not counted as tokens;
+    '''
+    offset = 0
+    start  = None
+    end    = 0
+    tokens = 0
+    with open( corpus_file, 'rb' ) as in_f:
+        for line in in_f:
+            if len(line.strip()) == 0:
+                if start is not None:
+                    yield start, end - start, tokens
+                start  = None
+                tokens = 0
+            else:
+                if start is None:
+                    start = offset
+                if not line.startswith(b'#'):
+                    tokens += 1
+                end = offset + len(line)
+            offset += len(line)
+    if start is not None:
+        yield start, end - start, tokens
+
+
+def get_index_file( corpus_file ):
+    ''' Returns the name of the index file of the corpus: the file next to the
+        corpus, if its directory is writable, and a file in the temporary
+        directory otherwise; '''
+    index_file = corpus_file+INDEX_SUFFIX
+    corpus_dir = os.path.dirname( os.path.abspath(corpus_file) )
+    if os.path.isfile( index_file ) or os.access( corpus_dir, os.W_OK ):
+        return index_file
+    path_hash = hashlib.sha1( os.path.abspath(corpus_file).encode('utf-8') ).hexdigest()
+    return os.path.join( tempfile.gettempdir(), 'conll_'+path_hash[:16]+INDEX_SUFFIX )
+
+
+def build_corpus_index( corpus_file, index_file=None ):
+    ''' Scans the plain CONLL corpus, and writes its offset index into
+        *index_file* (by default: see get_index_file()) atomically; sent_id-s
+        are read from the *.sent_ids file of the corpus, if it exists (the
+        number of sent_id-s must match the number of sentences);
+        Returns the name of the index file;
+    '''
+    if is_compressed( corpus_file ):
+        raise Exception('(!) Compressed corpora cannot be indexed: '+corpus_file)
+    index_file = index_file or get_index_file( corpus_file )
+    sent_ids_file = get_sent_ids_file( corpus_file )
+    # Take the stamps before reading: if a file changes meanwhile, the index
+    # is considered out of date, and rebuilt on the next use
+    corpus_stamp   = _file_stamp( corpus_file )
+    sent_ids_stamp = _file_stamp( sent_ids_file )
+    sentences = list( _scan_sentences( corpus_file ) )
+    if sent_ids_stamp[0] > -1:
+        sent_ids = [ sent_id.encode('utf-8') for sent_id in read_sent_ids( sent_ids_file ) ]
+        if len(sent_ids) != len(sentences):
+            raise Exception('(!) Number of sent_ids in '+sent_ids_file+' ('+str(len(sent_ids))+\
+                            ') does not match the number of sentences in '+corpus_file+' ('+str(len(sentences))+')')
+    else:
+        sent_ids = [ b'' ] * len(sentences)
+    data_start = _HEADER.size + (_ENTRY.size + _ORDINAL.size) * len(sentences)
+    entries = []
+    data    = []
+    data_offset = data_start
+    for (offset, length, tokens), sent_id in zip( sentences, sent_ids ):
+        entries.append( _ENTRY.pack( offset, length, tokens, data_offset, len(sent_id) ) )
+        data.append( sent_id )
+        data_offset += len(sent_id)
+    order = sorted( range(len(sentences)), key=lambda i: sent_ids[i] )
+    temp_file = index_file+'.'+str(os.getpid())+'.tmp'
+    with open( temp_file, 'wb' ) as out_f:
+        out_f.write( _HEADER.pack( MAGIC, corpus_stamp[0], corpus_stamp[1], sent_ids_stamp[0], \
+                                   sent_ids_stamp[1], len(sentences) ) )
+        out_f.write( b''.join(entries) )
+        out_f.write( b''.join( [_ORDINAL.pack(i) for i in order] ) )
+        out_f.write( b''.join(data) )
+    os.replace( temp_file, index_file )
+    return index_file
+
+
+def _is_up_to_date( index_file, corpus_file ):
+    ''' Whether the index file is valid, and records the current size and
+        modification time of the corpus and of its *.sent_ids file; '''
+    try:
+        with open( index_file, 'rb' ) as in_f:
+            header = in_f.read( _HEADER.size )
+    except (IOError, OSError):
+        return False
+    if len(header) < _HEADER.size:
+        return False
+    magic, corpus_size, corpus_mtime, sent_ids_size, sent_ids_mtime, n = _HEADER.unpack( header )
+    return magic == MAGIC and (corpus_size, corpus_mtime) == _file_stamp( corpus_file ) and \
+           (sent_ids_size, sent_ids_mtime) == _file_stamp( get_sent_ids_file( corpus_file ) )
+
+
+def _map_file( file_name ):
+    with open( file_name, 'rb' ) as in_f:
+        if os.fstat( in_f.fileno() ).st_size == 0:
+            return b''
+        return mmap.mmap( in_f.fileno(), 0, access=mmap.ACCESS_READ )
+
+
+class CorpusIndex(object):
+    ''' Random access to the sentences of a CONLL corpus by their ordinals (0
+        based positions in the corpus) and sent_id-s, via the memory-mapped
+        corpus and index files; Can be pickled (e.g. sent to worker
+        processes): the unpickled index maps the same files again;
+    '''
+
+    def __init__( self, corpus_file, index_file ):
+        self.corpus_file = corpus_file
+        self.index_file  = index_file
+        self._open()
+
+    def _open( self ):
+        self._index  = _map_file( self.index_file )
+        self._corpus = _map_file( self.corpus_file )
+        magic, corpus_size, corpus_mtime, sent_ids_size, sent_ids_mtime, self._size = \
+            _HEADER.unpack_from( self._index, 0 )
+        if magic != MAGIC:
+            raise Exception('(!) Not a corpus index file: '+self.index_file)
+        if corpus_size != len(self._corpus):
+            raise Exception('(!) The corpus index '+self.index_file+' does not match the corpus: '+self.corpus_file)
+        self.has_sent_ids = sent_ids_size > -1
+        self._order_start = _HEADER.size + _ENTRY.size * self._size
+
+    def __len__( self ):
+        return self._size
+
+    def _entry( self, i ):
+        if i < 0 or i >= self._size:
+            raise IndexError( 'sentence ordinal out of range: '+str(i) )
+        return _ENTRY.unpack_from( self._index, _HEADER.size + i * _ENTRY.size )
+
+    def _sent_id_bytes( self, i ):
+        offset, length, tokens, sent_id_offset, sent_id_length = self._entry( i )
+        return self._index[sent_id_offset:sent_id_offset+sent_id_length]
+
+    def _ordinal_at( self, k ):
+        return _ORDINAL.unpack_from( self._index, self._order_start + k * _ORDINAL.size )[0]
+
+    def sentence_bytes( self, i ):
+        ''' Returns the lines of the i-th sentence as bytes (in UTF-8, with the
+            line endings, without the empty line following the sentence); '''
+        offset, length, tokens, sent_id_offset, sent_id_length = self._entry( i )
+        return self._corpus[offset:offset+length]
+
+    def sentence_lines( self, i ):
+        ''' Returns the lines of the i-th sentence (without line endings), as
+            yielded by conll_utils.iter_conll_sentence_lines(); '''
+        return [ line.rstrip('\r') for line in self.sentence_bytes( i ).decode('utf-8').rstrip('\r\n').split('\n') ]
+
+    def token_count( self, i ):
+        return self._entry( i )[2]
+
+    def sent_id( self, i ):
+        ''' Returns the sent_id of the i-th sentence (None, if the corpus has no
+            *.sent_ids file); '''
+        return self._sent_id_bytes( i ).decode('utf-8') if self.has_sent_ids else None
+
+    def _lower_bound( self, key ):
+        ''' Returns the position of the first sent_id not smaller than *key* in
+            the sorted order of sent_id-s; '''
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if self._sent_id_bytes( self._ordinal_at( middle ) ) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find( self, sent_id ):
+        ''' Returns the ordinal of the sentence with the given sent_id, or -1; '''
+        if not self.has_sent_ids:
+            return -1
+        key = sent_id.encode('utf-8')
+        k = self._lower_bound( key )
+        if k < self._size and self._sent_id_bytes( self._ordinal_at( k ) ) == key:
+            return self._ordinal_at( k )
+        return -1
+
+    def find_document( self, doc_id ):
+        ''' Returns the ordinals (in the order of the corpus) of the sentences
+            (and clauses) of the given document; '''
+        if not self.has_sent_ids:
+            return []
+        prefix = (doc_id+'_').encode('utf-8')
+        ordinals = []
+        k = self._lower_bound( prefix )
+        while k < self._size:
+            i = self._ordinal_at( k )
+            sent_id = self._sent_id_bytes( i )
+            if not sent_id.startswith( prefix ):
+                break
+            if sent_id_to_doc_id( sent_id.decode('utf-8') ) == doc_id:
+                ordinals.append( i )
+            k += 1
+        return sorted( ordinals )
+
+    def iter_sentence_lines( self, ordinals ):
+        ''' Yields the sentences (lists of lines) with the given ordinals; '''
+        for i in ordinals:
+            yield self.sentence_lines( i )
+
+    def write_sentences( self, ordinals, out_file ):
+        ''' Writes the sentences with the given ordinals (in the given order)
+            into *out_file* (compressed, if the file name has a compression
+            suffix), copying the bytes of the sentences as they are;
+            Returns the number of tokens written;
+        '''
+        tokens = 0
+        o_f = open_corpus( out_file, 'wb' )
+        try:
+            for i in ordinals:
+                sentence = self.sentence_bytes( i )
+                o_f.write( sentence )
+                o_f.write( b'\n' if sentence.endswith(b'\n') else b'\n\n' )
+                tokens += self.token_count( i )
+        finally:
+            o_f.close()
+        return tokens
+
+    def __getstate__( self ):
+        return { 'corpus_file': self.corpus_file, 'index_file': self.index_file }
+
+    def __setstate__( self, state ):
+        self.corpus_file = state['corpus_file']
+        self.index_file  = state['index_file']
+        self._open()
+
+    def close( self ):
+        for mapped in [ self._index, self._corpus ]:
+            if isinstance( mapped, mmap.mmap ):
+                mapped.close()
+
+
+def load_corpus_index( corpus_file, build=True ):
+    ''' Loads the offset index of the given CONLL corpus; If the index does not
+        exist or is out of date, it is (re)built (only if *build* is set);
+        Returns a CorpusIndex, or None if the corpus is compressed (or has no
+        up-to-date index, and *build* is not set);
+    '''
+    if is_compressed( corpus_file ):
+        return None
+    index_file = get_index_file( corpus_file )
+    if not _is_up_to_date( index_file, corpus_file ):
+        if not build:
+            return None
+        build_corpus_index( corpus_file, index_file )
+    return CorpusIndex( corpus_file, index_file )
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+#
+#    Evaluates MaltParser with given configuration via k-fold cross-validation;
+#    Folds are split at the document level (using the .sent_ids file), and
+#    the folds are trained and evaluated in parallel worker processes;
+#
+from __future__ import unicode_literals, print_function
+
+import sys, os, re, os.path
+import codecs, json
+import argparse
+
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer as timer
+
+import numpy as np
+
+from conll_evaluation import evaluate_conll_files, format_results, METRICS
+from conll_utils import read_sent_ids, get_sent_ids_file, split_conll_into_folds, count_conll_sentences
+from maltparser_utils import make_train_command, make_parse_command, read_feature_model_from_opt_file
+from process_runner import RunRecord, format_stage_records, terminate_on_interrupt
+from resource_planner import plan_training, plan_concurrency, heap_option_to_mb, format_plan
+from run_history import RunHistory, DEFAULT_HISTORY_DB
+
+
+def train_and_evaluate_fold( fold, train_file, test_file, work_dir, config ):
+    ''' Trains a MaltParser model on *train_file*, parses *test_file* with the
+        model, and evaluates the results; Each fold uses its own working directory
+        *work_dir*, so that the folds can be processed in parallel;
+        Returns a dict with the evaluation results of the fold, along with the
+        records of the processing stages ('stages');
+    '''
+    model_name = config['model_name']+'-fold'+str(fold)
+    run_record = RunRecord( fold=fold, model_name=model_name )
+    log_file = os.path.join( work_dir, model_name+'.log' )
+    if os.path.exists( log_file ):
+        os.unlink( log_file )
+    command = make_train_command( config['java_loc'], config['malt_parser_jar'], model_name, \
+                                  train_file, heap_size=config['heap_size'], \
+                                  final_options_file=config['final_options_file'], \
+                                  feature_model_file=config['feature_model_file'], \
+                                  working_dir=work_dir )
+    run_record.run( command, stage='learn', cwd=work_dir, log_file=log_file, echo=False, \
+                    timeout=config['learn_timeout'] )
+    if not os.path.exists( os.path.join(work_dir, model_name+'.mco') ):
+        raise Exception('(!) Unable to find the model file of the fold '+str(fold)+': '+model_name+'.mco')
+    out_file = test_file+'.parsed'
+    command = make_parse_command( config['java_loc'], config['malt_parser_jar'], model_name, \
+                                  test_file, out_file, heap_size=config['heap_size'], working_dir=work_dir )
+    run_record.run( command, stage='parse', cwd=work_dir, log_file=log_file, echo=False, \
+                    timeout=config['parse_timeout'] )
+    with run_record.measure('evaluate'):
+        results = evaluate_conll_files( test_file, out_file )
+    results['stages'] = run_record.stages
+    return results
+
+
+if __name__ == '__main__':
+    # =============================================================================
+    #    Fetch command line arguments
+    # =============================================================================
+    malt_parser_jar   = 'maltparser-1.9.0.jar'
+    corpus            = os.path.join('UD_Estonian-master', 'et-train-diff.cg3-conll')
+    model_name        = 'estnltkECG-cv'
+    java_loc          = 'java'
+    heap_size         = 'auto'
+    n_folds           = 10
+    n_workers         = 'auto'
+    seed              = 1
+    learn_timeout     = None
+    parse_timeout     = None
+
+    final_options_file = None
+    feature_model_file = None
+
+    arg_parser = argparse.ArgumentParser(description='''
+      Evaluates MaltParser with the given configuration via k-fold cross-validation on the given corpus, and reports the
+      mean and the variance of the accuracy over the folds.
+      The corpus is split into folds at the document level: sentences of one document always belong to the same fold.
+      Note that if no configuration is given, the script uses the default configuration.
+    ''',\
+    epilog='''
+      Document ids of the sentences are taken from the .sent_ids file accompanying the corpus (the file with the same
+      base name as the corpus, but with the extension .sent_ids), which is created by the data preparation scripts.
+      The folds are trained and evaluated in parallel worker processes. Outputs of the folds (fold corpora, models,
+      logs and parsed files) are written into the <work_dir>, and the summary of the results into <work_dir>/cv_results.json.
+      The script reports accuracy in terms of three metrics: LA, UAS and LAS.
+    '''
+    )
+    arg_parser.add_argument("-m", "--maltparser_jar", default=malt_parser_jar, \
+                                            help="MaltParser's jar file to be used in training/evaluation (default: '"+malt_parser_jar+"');", \
+                                            metavar='<maltparser_jar>')
+    arg_parser.add_argument("-n", "--name",  default=model_name, \
+                                             help="name prefix of the models of the folds (default: '"+model_name+"');", \
+                                             metavar='<model_name>')
+    arg_parser.add_argument("-j", "--heap", default=heap_size, \
+                                            help="Java heap size argument used in executing Java commands, e.g. 'Xmx5048M'; if 'auto', "+\
+                                                 "the heap size is planned from the size of the fold's training set and the feature "+\
+                                                 "model (default: '"+heap_size+"');", \
+                                            metavar='<heap_size>')
+    arg_parser.add_argument("-i", "--corpus", default=corpus, \
+                                              help="the CONLL corpus to be split into folds (default: '"+corpus+"');", \
+                                              metavar='<corpus>')
+    arg_parser.add_argument("-k", "--folds", default=n_folds, type=int, \
+                                             help="number of folds (default: "+str(n_folds)+");", \
+                                             metavar='<folds>')
+    arg_parser.add_argument("-w", "--workers", default=n_workers, \
+                                               help="number of parallel worker processes; if 'auto', then as many as fit into "+\
+                                                    "the available memory and CPUs (default: "+str(n_workers)+");", \
+                                               metavar='<workers>')
+    arg_parser.add_argument("-d", "--work_dir", default=None, \
+                                                help="directory for the outputs of the folds (default: <corpus>.cv);", \
+                                                metavar='<work_dir>')
+    arg_parser.add_argument("-r", "--seed", default=seed, type=int, \
+                                            help="random seed used in assigning documents to folds (default: "+str(seed)+");", \
+                                            metavar='<seed>')
+    arg_parser.add_argument("-F", "--final_options", default=final_options_file, \
+                                  help="final configuration file (finalOptionsFile.xml) with path (default: "+str(final_options_file)+");", \
+                                  metavar='<finalOptionsFile>')
+    arg_parser.add_argument("-f", "--feature_model", default=feature_model_file, \
+                                                     help="feature model XML file with path (default: "+str(feature_model_file)+");", \
+                                                     metavar='<feature_model_file>')
+    arg_parser.add_argument("-o", "--opt_file", default=None, \
+                                                help="options file of MaltOptimizer (e.g. phase3_optFile.txt), from which the "+\
+                                                     "feature model file is read, if -f is not given (default: None);", \
+                                                metavar='<optFile>')
+    arg_parser.add_argument("-tl", "--learn_timeout", default=learn_timeout, type=float, \
+                                                     help="timeout of training a fold (in seconds) (default: "+str(learn_timeout)+");", \
+                                                     metavar='<seconds>')
+    arg_parser.add_argument("-tp", "--parse_timeout", default=parse_timeout, type=float, \
+                                                     help="timeout of parsing a fold (in seconds) (default: "+str(parse_timeout)+");", \
+                                                     metavar='<seconds>')
+    arg_parser.add_argument("-hd", "--history", default=DEFAULT_HISTORY_DB, \
+                                               help="run history used for calibrating the planned heap size, if it exists "+\
+                                                    "(default: '"+DEFAULT_HISTORY_DB+"');", \
+                                               metavar='<history_db>')
+    args = arg_parser.parse_args()
+    if not args.maltparser_jar or not os.path.isfile(args.maltparser_jar):
+       raise Exception('MaltParser jar not found: '+args.maltparser_jar)
+    if not args.corpus or not os.path.isfile(args.corpus):
+       raise Exception('Corpus not found: '+args.corpus)
+    sent_ids_file = get_sent_ids_file( args.corpus )
+    if not os.path.isfile(sent_ids_file):
+       raise Exception('Sent_ids file of the corpus not found: '+sent_ids_file)
+    if args.opt_file and not args.feature_model:
+        if not os.path.isfile(args.opt_file):
+            raise Exception('Options file not found: '+args.opt_file)
+        args.feature_model = read_feature_model_from_opt_file( args.opt_file )
+        if not args.feature_model:
+            raise Exception('(!) No feature model in the options file: '+args.opt_file)
+    if args.feature_model and not os.path.isfile(args.feature_model):
+        raise Exception('Feature model file not found: '+args.feature_model)
+    if args.final_options and (not os.path.isfile(args.final_options) or \
+                               not 'finalOptionsFile.xml' in args.final_options):
+        raise Exception('Invalid final_options file: '+args.final_options)
+    if bool(args.feature_model) != bool(args.final_options):
+        raise Exception('(!) Both final_options file and feature_model file should be given.')
+    if args.folds < 2:
+        raise Exception('Invalid number of folds: '+str(args.folds))
+    if args.workers != 'auto' and (not args.workers.isdigit() or int(args.workers) < 1):
+        raise Exception('Invalid number of workers: '+str(args.workers))
+    heap_size = args.heap
+    n_workers = min( args.folds, int(args.workers) ) if args.workers != 'auto' else args.folds
+    if heap_size == 'auto':
+        # Each fold is trained on (k-1)/k of the corpus
+        sentence_count, token_count = count_conll_sentences( args.corpus )
+        fold_tokens = token_count * (args.folds - 1) // args.folds
+        history = RunHistory( args.history ) if os.path.isfile(args.history) else None
+        plan = plan_training( fold_tokens, feature_model_file=args.feature_model, max_jobs=n_workers, \
+                              history=history )
+        if history:
+            history.close()
+        heap_size = plan['heap_size']
+        if args.workers == 'auto':
+            n_workers = plan['jobs']
+        print(' Planned resources: '+format_plan( plan ))
+    elif args.workers == 'auto':
+        n_workers = plan_concurrency( heap_option_to_mb( heap_size ), max_jobs=args.folds )
+    if not heap_size.startswith('-'):
+       heap_size = '-'+heap_size
+    work_dir = args.work_dir if args.work_dir else args.corpus+'.cv'
+    if not os.path.isdir(work_dir):
+        os.makedirs(work_dir)
+    # Workers run in their own working directories, so all paths must be absolute
+    config = { 'java_loc': java_loc, \
+               'malt_parser_jar': os.path.abspath(args.maltparser_jar), \
+               'model_name': args.name, \
+               'heap_size': heap_size, \
+               'final_options_file': os.path.abspath(args.final_options) if args.final_options else None, \
+               'feature_model_file': os.path.abspath(args.feature_model) if args.feature_model else None, \
+               'learn_timeout': args.learn_timeout, \
+               'parse_timeout': args.parse_timeout }
+
+    # =============================================================================
+    #    Split the corpus into folds
+    # =============================================================================
+    start_time = timer()
+    print(' Splitting '+args.corpus+' into '+str(args.folds)+' folds ...')
+    sent_ids   = read_sent_ids( sent_ids_file )
+    fold_files = split_conll_into_folds( args.corpus, sent_ids, args.folds, \
+                                         os.path.abspath(work_dir), seed=args.seed )
+
+    # =============================================================================
+    #    Train and evaluate the folds in parallel
+    # =============================================================================
+    print(' Training and evaluating the folds with '+str(n_workers)+' workers ...')
+    executor = ProcessPoolExecutor( max_workers=n_workers )
+    futures  = []
+    for fold, (train_file, test_file) in enumerate( fold_files ):
+        futures.append( executor.submit( train_and_evaluate_fold, fold, train_file, test_file, \
+                                         os.path.abspath(work_dir), config ) )
+    with terminate_on_interrupt():
+        executor.shutdown( wait=True )
+    # A failed fold does not discard the others: the completed folds are
+    # summarized, and the failed ones are reported
+    fold_results = []
+    failed_folds = []
+    for fold, future in enumerate( futures ):
+        error = future.exception()
+        if error is not None:
+            failed_folds.append( { 'fold': fold, 'error': str(error) } )
+            continue
+        results = future.result()
+        results['fold'] = fold
+        fold_results.append( results )
+
+    # =============================================================================
+    #    Report the results
+    # =============================================================================
+    print()
+    summary = { 'folds': args.folds, 'corpus': args.corpus, 'seed': args.seed, \
+                'fold_results': fold_results, 'failed_folds': failed_folds }
+    for results in fold_results:
+        print('  *** Fold '+str(results['fold'])+' ('+str(results['sentences'])+' sentences): ')
+        print( '\n'.join( format_results( results ) ) )
+        print( '\n'.join( format_stage_records( results['stages'] ) ) )
+    for failed in failed_folds:
+        print(' (!) Fold '+str(failed['fold'])+' failed: '+failed['error'])
+    print()
+    if fold_results:
+        print('  *** Cross-validation results ('+str(len(fold_results))+' of '+str(args.folds)+' folds): ')
+        for metric in METRICS:
+            scores = np.array( [results[metric] for results in fold_results] )
+            # The variance needs at least two folds
+            variance = float(scores.var(ddof=1)) if len(scores) > 1 else None
+            summary[metric] = { 'mean': float(scores.mean()), 'variance': variance, \
+                                'std': float(np.sqrt(variance)) if variance is not None else None }
+            print('  {:<4} mean: {:.4f}   variance: {}   std: {}'.format( metric, summary[metric]['mean'], \
+                  '{:.6f}'.format(variance) if variance is not None else '-', \
+                  '{:.4f}'.format(summary[metric]['std']) if variance is not None else '-' ))
+    summary_file = os.path.join( work_dir, 'cv_results.json' )
+    o_f = codecs.open( summary_file, mode='w', encoding='utf-8' )
+    json.dump( summary, o_f, indent=1, sort_keys=True )
+    o_f.close()
+    print('  --> ',summary_file)
+    print('  Total time: {:.1f}s'.format( timer() - start_time ))
+    if failed_folds:
+        print(' (!) '+str(len(failed_folds))+' of '+str(args.folds)+' folds failed: '+\
+              ', '.join( [str(failed['fold']) for failed in failed_folds] ))
+        sys.exit(1)
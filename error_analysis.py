@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+#
+#     Indexed SQLite store for error analysis of parser outputs;
+#
+#     A parser output (system CONLL file) is ingested along with its gold
+#    standard CONLL file: each token is stored with its form, lemma, POS tags,
+#    FEATS, gold and system HEAD and DEPREL, the length of its sentence, and
+#    whether its HEAD and its label are correct; each sentence is stored with
+#    its sent_id (from the *.sent_ids file of the gold corpus, if available)
+#    and the EDT document id, so that errors can be traced back to the EDT
+#    documents. The token table is indexed by the labels, the POS tag and the
+#    sentence length, so queries like "all @OBJ -> @ADVL confusions in
+#    sentences longer than 30 tokens" do not have to scan the whole store.
+#
+from __future__ import unicode_literals, print_function
+
+import os, os.path
+import time
+import sqlite3
+
+from conll_utils import iter_conll_sentence_lines, read_sent_ids, get_sent_ids_file, sent_id_to_doc_id
+from model_store import file_fingerprint
+
+DEFAULT_ERRORS_DB = 'error_analysis.sqlite'
+
+# Kinds of errors that can be queried: a wrong HEAD, a wrong label, or
+# either (i.e. the token does not count as correct in LAS)
+ERROR_KINDS = { 'head': 'head_ok = 0', 'label': 'label_ok = 0', 'las': '(head_ok = 0 OR label_ok = 0)' }
+
+_SCHEMA = [
+  'CREATE TABLE IF NOT EXISTS outputs ( output_id INTEGER PRIMARY KEY AUTOINCREMENT, gold_file TEXT, '+\
+     'system_file TEXT, gold_fingerprint TEXT, system_fingerprint TEXT, ingested TEXT, '+\
+     'sentences INTEGER, tokens INTEGER )',
+  'CREATE TABLE IF NOT EXISTS sentences ( output_id INTEGER NOT NULL REFERENCES outputs(output_id), '+\
+     'sent_idx INTEGER NOT NULL, sent_id TEXT, doc_id TEXT, length INTEGER, PRIMARY KEY (output_id, sent_idx) )',
+  'CREATE TABLE IF NOT EXISTS tokens ( output_id INTEGER NOT NULL REFERENCES outputs(output_id), '+\
+     'sent_idx INTEGER NOT NULL, token_id INTEGER NOT NULL, form TEXT, lemma TEXT, cpostag TEXT, postag TEXT, '+\
+     'feats TEXT, gold_head INTEGER, sys_head INTEGER, gold_deprel TEXT, sys_deprel TEXT, '+\
+     'sent_len INTEGER, head_ok INTEGER, label_ok INTEGER )',
+  'CREATE INDEX IF NOT EXISTS idx_tokens_labels  ON tokens ( output_id, gold_deprel, sys_deprel, sent_len )',
+  'CREATE INDEX IF NOT EXISTS idx_tokens_postag  ON tokens ( output_id, cpostag, sent_len )',
+  'CREATE INDEX IF NOT EXISTS idx_tokens_length  ON tokens ( output_id, sent_len )',
+  'CREATE INDEX IF NOT EXISTS idx_tokens_sent    ON tokens ( output_id, sent_idx )',
+  'CREATE INDEX IF NOT EXISTS idx_sentences_doc  ON sentences ( doc_id )',
+]
+
+# Number of token rows inserted at once
+INSERT_BATCH_SIZE = 10000
+
+
+def _iter_paired_sentences( gold_file, system_file ):
+    ''' Yields pairs of sentences (lists of lists of CONLL fields) from the
+        gold and system files; Comment lines are skipped; '''
+    gold_sents = iter_conll_sentence_lines( gold_file )
+    sys_sents  = iter_conll_sentence_lines( system_file )
+    sid = 0
+    while True:
+        gold_sent = next(gold_sents, None)
+        sys_sent  = next(sys_sents, None)
+        if gold_sent is None and sys_sent is None:
+            break
+        if gold_sent is None or sys_sent is None:
+            raise Exception('(!) Different number of sentences in '+gold_file+' and '+system_file)
+        gold_sent = [ line.split('\t') for line in gold_sent if not line.startswith('#') ]
+        sys_sent  = [ line.split('\t') for line in sys_sent if not line.startswith('#') ]
+        if len(gold_sent) != len(sys_sent):
+            raise Exception('(!) Different number of tokens in the sentence #'+str(sid+1)+\
+                            ' of '+gold_file+' and '+system_file+': '+\
+                            str(len(gold_sent))+' vs '+str(len(sys_sent)))
+        yield gold_sent, sys_sent
+        sid += 1
+
+
+class ErrorStore(object):
+    ''' SQLite store of the token-level evaluation results of parser outputs; '''
+
+    def __init__( self, db_file=DEFAULT_ERRORS_DB ):
+        self.db_file = db_file
+        self.connection = sqlite3.connect( db_file )
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            for statement in _SCHEMA:
+                self.connection.execute( statement )
+
+    def close( self ):
+        self.connection.close()
+
+    def ingest( self, gold_file, system_file, sent_ids_file=None ):
+        ''' Ingests the system output *system_file* evaluated against *gold_file*;
+            Sentence ids are read from *sent_ids_file* (by default, the
+            *.sent_ids file of the gold corpus, if it exists); If the same
+            pair of files (by contents) has already been ingested, the old
+            output is replaced;
+            Returns the output_id of the ingested output;
+        '''
+        if sent_ids_file is None and os.path.isfile( get_sent_ids_file( gold_file ) ):
+            sent_ids_file = get_sent_ids_file( gold_file )
+        sent_ids = read_sent_ids( sent_ids_file ) if sent_ids_file else []
+        gold_fingerprint   = file_fingerprint( gold_file )
+        system_fingerprint = file_fingerprint( system_file )
+        with self.connection:
+            for row in self.connection.execute( 'SELECT output_id FROM outputs WHERE gold_fingerprint = ? '+\
+                                                'AND system_fingerprint = ?', (gold_fingerprint, system_fingerprint) ).fetchall():
+                self.delete_output( row['output_id'] )
+            cursor = self.connection.execute( 'INSERT INTO outputs (gold_file, system_file, gold_fingerprint, '+\
+                                              'system_fingerprint, ingested) VALUES (?, ?, ?, ?, ?)', \
+                                              (gold_file, system_file, gold_fingerprint, system_fingerprint, \
+                                               time.strftime('%Y-%m-%d %H:%M:%S')) )
+            output_id = cursor.lastrowid
+            token_rows = []
+            sentence_rows = []
+            n_sentences = 0
+            n_tokens = 0
+            for sid, (gold_sent, sys_sent) in enumerate( _iter_paired_sentences( gold_file, system_file ) ):
+                sent_id = sent_ids[sid] if sid < len(sent_ids) else None
+                sentence_rows.append( (output_id, sid, sent_id, sent_id_to_doc_id(sent_id) if sent_id else None, \
+                                       len(gold_sent)) )
+                for gold_tok, sys_tok in zip(gold_sent, sys_sent):
+                    gold_head = int(gold_tok[6])
+                    sys_head  = int(sys_tok[6]) if sys_tok[6] != '_' else -1
+                    token_rows.append( (output_id, sid, int(gold_tok[0]), gold_tok[1], gold_tok[2], gold_tok[3], \
+                                        gold_tok[4], gold_tok[5], gold_head, sys_head, gold_tok[7], sys_tok[7], \
+                                        len(gold_sent), int(gold_head == sys_head), int(gold_tok[7] == sys_tok[7])) )
+                n_sentences += 1
+                n_tokens    += len(gold_sent)
+                if len(token_rows) >= INSERT_BATCH_SIZE:
+                    self._insert( sentence_rows, token_rows )
+                    sentence_rows, token_rows = [], []
+            self._insert( sentence_rows, token_rows )
+            self.connection.execute( 'UPDATE outputs SET sentences = ?, tokens = ? WHERE output_id = ?', \
+                                     (n_sentences, n_tokens, output_id) )
+        if sent_ids and len(sent_ids) != n_sentences:
+            print(' (!) Warning: '+str(len(sent_ids))+' sent_ids for '+str(n_sentences)+' sentences in '+gold_file)
+        return output_id
+
+    def _insert( self, sentence_rows, token_rows ):
+        self.connection.executemany( 'INSERT INTO sentences VALUES (?, ?, ?, ?, ?)', sentence_rows )
+        self.connection.executemany( 'INSERT INTO tokens VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', token_rows )
+
+    def delete_output( self, output_id ):
+        for table in ['tokens', 'sentences', 'outputs']:
+            self.connection.execute( 'DELETE FROM '+table+' WHERE output_id = ?', (output_id,) )
+
+    def get_outputs( self ):
+        return [ dict(row) for row in self.connection.execute( 'SELECT * FROM outputs ORDER BY output_id DESC' ) ]
+
+    def latest_output_id( self ):
+        row = self.connection.execute( 'SELECT MAX(output_id) AS output_id FROM outputs' ).fetchone()
+        return row['output_id']
+
+    def _where( self, output_id, gold_deprel=None, sys_deprel=None, cpostag=None, \
+                min_length=None, max_length=None, error=None ):
+        conditions = [ 'tokens.output_id = ?' ]
+        params = [ output_id ]
+        for column, value in [ ('gold_deprel', gold_deprel), ('sys_deprel', sys_deprel), ('cpostag', cpostag) ]:
+            if value is not None:
+                conditions.append( 'tokens.'+column+' = ?' )
+                params.append( value )
+        if min_length is not None:
+            conditions.append( 'tokens.sent_len >= ?' )
+            params.append( min_length )
+        if max_length is not None:
+            conditions.append( 'tokens.sent_len <= ?' )
+            params.append( max_length )
+        if error is not None:
+            if error not in ERROR_KINDS:
+                raise Exception('(!) Unknown kind of errors: '+str(error))
+            conditions.append( ERROR_KINDS[error] )
+        return ' WHERE '+' AND '.join(conditions), params
+
+    def find_tokens( self, output_id, gold_deprel=None, sys_deprel=None, cpostag=None, \
+                     min_length=None, max_length=None, error=None, limit=100 ):
+        ''' Returns tokens (as dicts, with the sent_id and doc_id of their
+            sentences) of the given output that match all the given
+            conditions: the gold label, the system label, the gold CPOSTAG,
+            the sentence length range (inclusive) and the kind of the error
+            (see ERROR_KINDS); '''
+        where, params = self._where( output_id, gold_deprel, sys_deprel, cpostag, min_length, max_length, error )
+        query = 'SELECT tokens.*, sentences.sent_id, sentences.doc_id FROM tokens JOIN sentences ON '+\
+                'sentences.output_id = tokens.output_id AND sentences.sent_idx = tokens.sent_idx'+where+\
+                ' ORDER BY tokens.sent_idx, tokens.token_id'
+        if limit:
+            query += ' LIMIT ?'
+            params.append( limit )
+        return [ dict(row) for row in self.connection.execute( query, params ) ]
+
+    def label_confusions( self, output_id, cpostag=None, min_length=None, max_length=None, limit=20 ):
+        ''' Returns the most frequent label confusions (gold label != system
+            label) of the given output: a list of dicts with keys 'gold_deprel',
+            'sys_deprel' and 'count'; '''
+        where, params = self._where( output_id, cpostag=cpostag, min_length=min_length, \
+                                     max_length=max_length, error='label' )
+        query = 'SELECT gold_deprel, sys_deprel, COUNT(*) AS count FROM tokens'+where+\
+                ' GROUP BY gold_deprel, sys_deprel ORDER BY count DESC, gold_deprel, sys_deprel'
+        if limit:
+            query += ' LIMIT ?'
+            params.append( limit )
+        return [ dict(row) for row in self.connection.execute( query, params ) ]
+
+    def get_sentence( self, output_id, sent_idx ):
+        ''' Returns the tokens of the given sentence of the output; '''
+        return [ dict(row) for row in self.connection.execute( 'SELECT * FROM tokens WHERE output_id = ? AND '+\
+                 'sent_idx = ? ORDER BY token_id', (output_id, sent_idx) ) ]
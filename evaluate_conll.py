@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+#
+#    Evaluates parser output CONLL file(s) against the gold standard CONLL file;
+#    (a native replacement for:  java -jar MaltEval.jar -s <system> -g <gold> --Metric LAS;UAS;LA )
+#
+from __future__ import unicode_literals, print_function
+
+import sys, os, os.path
+import codecs, json
+import argparse
+
+from conll_evaluation import evaluate_conll_files, format_results, format_breakdown
+
+arg_parser = argparse.ArgumentParser(description='''
+  Evaluates parser output CONLL file(s) against the gold standard CONLL file, and reports the accuracy in terms of
+  three metrics: LAS, UAS and LA. The scores are computed the same way as MaltEval computes them with its default
+  settings, but without launching a Java VM.
+''',\
+epilog='''
+  With the flag --breakdown, the accuracy is also reported by gold DEPREL, by gold CPOSTAG, and by sentence length.
+  With the argument --json, the full structured results (including the label confusion matrix) are saved into a JSON
+  file: if multiple system files are given, the JSON file contains a dict mapping system file names to their results.
+'''
+)
+arg_parser.add_argument("gold", help="the gold standard CONLL file;", metavar='<gold_corpus>')
+arg_parser.add_argument("system", nargs='+', help="parser output CONLL file(s) to be evaluated;", metavar='<system_corpus>')
+arg_parser.add_argument("-b", "--breakdown", action='store_true', \
+                                             help="whether the breakdowns by DEPREL, CPOSTAG and sentence length should be reported;")
+arg_parser.add_argument("-js", "--json", default=None, \
+                                         help="name of the JSON file where the structured results will be saved (default: None);", \
+                                         metavar='<json_file>')
+args = arg_parser.parse_args()
+if not os.path.isfile(args.gold):
+   raise Exception('Gold corpus not found: '+args.gold)
+for system_file in args.system:
+   if not os.path.isfile(system_file):
+      raise Exception('System corpus not found: '+system_file)
+
+all_results = {}
+for system_file in args.system:
+    results = evaluate_conll_files( args.gold, system_file )
+    all_results[system_file] = results
+    if len(args.system) > 1:
+        print('  *** '+system_file+': ')
+    print( '\n'.join( format_results( results ) ) )
+    if args.breakdown:
+        for key in ['by_deprel', 'by_postag', 'by_length']:
+            print()
+            print( '\n'.join( format_breakdown( results, key ) ) )
+    print()
+
+if args.json:
+    o_f = codecs.open( args.json, mode='w', encoding='utf-8' )
+    if len(args.system) == 1:
+        json.dump( all_results[args.system[0]], o_f, indent=1, sort_keys=True )
+    else:
+        json.dump( all_results, o_f, indent=1, sort_keys=True )
+    o_f.close()
+    print('  --> ',args.json)
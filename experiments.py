@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+#     A single entry point to the scripts of the repository: each subcommand
+#    runs the corresponding script with the remaining command line arguments,
+#    e.g.
+#        python experiments.py prepare UD_Estonian-master\et-ud-train.conllu EDT
+#        python experiments.py train -h
+#
+#     Only the script of the subcommand is loaded, and the scripts import
+#    EstNLTK only after their arguments have been parsed, so --help and
+#    argument errors are reported at once;
+#
+from __future__ import unicode_literals, print_function
+
+import sys, os, os.path
+import argparse
+import runpy
+
+# Subcommands: (name, script, help)
+SUBCOMMANDS = [
+  ('prepare', 'align_ud_corpus_with_edt_corpus.py', \
+              'align a UD_Estonian file with EDT, and convert the aligned sentences into CONLL;'),
+  ('diff', 'get_edt_corpus_diff_from_ud_corpus.py', \
+           'convert the EDT sentences that are not in the given UD_Estonian files into CONLL;'),
+  ('train', 'train_and_test_maltparser.py', 'train a MaltParser model and evaluate it;'),
+  ('evaluate', 'test_maltparser.py', 'evaluate MaltParser models on the test corpus;'),
+  ('vislcg3-eval', 'test_estnltk_vislcg3.py', 'evaluate EstNLTK\'s VISLCG3 based parser on the test corpus;'),
+  ('bench', 'benchmark_parsers.py', 'benchmark MaltParser against VISLCG3 (speed and accuracy);'),
+  ('cv', 'cross_validate_maltparser.py', 'cross-validate MaltParser with document-level folds;'),
+  ('learning-curve', 'benchmark_learning_curve.py', 'measure accuracy at increasing training set sizes;'),
+  ('score', 'evaluate_conll.py', 'score a parser output against the gold standard;'),
+  ('compare', 'compare_parser_outputs.py', 'test the significance of the differences between parser outputs;'),
+  ('validate', 'validate_conll.py', 'validate (and clean) CONLL corpus files;'),
+  ('errors', 'query_errors.py', 'ingest and query parser errors;'),
+  ('history', 'query_run_history.py', 'query the history of training and evaluation runs;'),
+  ('profile', 'profile_maltparser_latency.py', 'profile the per-sentence latency of EstNLTK\'s MaltParser;'),
+  ('bench-features', 'benchmark_feature_generators.py', 'microbenchmark the feature generation;'),
+  ('synth', 'generate_synthetic_corpus.py', 'generate a synthetic EDT-like corpus for scale testing;'),
+  ('extract', 'extract_sentences.py', 'extract sentences (by sent_id, document or position) via the corpus index;'),
+  ('pipeline', 'run_pipeline.py', 'run the pipeline of pipeline.json, skipping the stages that are up to date;'),
+]
+
+SCRIPTS_DIR = os.path.dirname( os.path.abspath(__file__) )
+
+
+def get_subcommand_script( name ):
+    ''' Returns the full path of the script of the given subcommand; '''
+    for command, script, help_str in SUBCOMMANDS:
+        if command == name:
+            return os.path.join( SCRIPTS_DIR, script )
+    raise Exception('(!) Unknown subcommand: '+str(name))
+
+
+def run_subcommand( name, arguments ):
+    ''' Runs the script of the given subcommand with the given command line
+        arguments (in the current process, as the __main__ module); '''
+    script = get_subcommand_script( name )
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert( 0, SCRIPTS_DIR )
+    sys.argv = [ script ] + list( arguments )
+    runpy.run_path( script, run_name='__main__' )
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='''
+      A single entry point to the scripts for preparing data, training and evaluating MaltParser's models, and
+      evaluating EstNLTK's VISLCG3 based parser. Each subcommand runs the corresponding script with the remaining
+      arguments; use "<subcommand> -h" to see the arguments of a subcommand.
+    ''',\
+    epilog='Subcommands:\n'+'\n'.join( ['  '+command.ljust(16)+script.ljust(40)+help_str \
+                                        for command, script, help_str in SUBCOMMANDS] ),\
+    formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    arg_parser.add_argument("command", choices=[command for command, script, help_str in SUBCOMMANDS], \
+                                       help="the subcommand;", metavar='<subcommand>')
+    arg_parser.add_argument("arguments", nargs=argparse.REMAINDER, \
+                                         help="arguments of the subcommand;", metavar='<arguments>')
+    args = arg_parser.parse_args()
+    run_subcommand( args.command, args.arguments )
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+#     Extracts a subset of sentences (given by sent_id-s, document ids or
+#    ordinals) from a CONLL corpus, using the offset index of the corpus (see
+#    corpus_index.py), so that only the selected sentences are read;
+#
+from __future__ import unicode_literals, print_function
+
+import sys, os, os.path
+import codecs
+import argparse
+
+from timeit import default_timer as timer
+
+from conll_utils import read_sent_ids, get_sent_ids_file, iter_conll_sentence_lines, sent_id_to_doc_id
+from conll_utils import count_sentence_tokens
+from compressed_io import open_corpus
+from corpus_index import load_corpus_index, build_corpus_index
+
+
+def parse_ordinals( ordinals ):
+    ''' Parses sentence ordinals given as numbers or ranges (e.g. '5', '10-20');
+        Ordinals are 1-based (as the sentence numbers of sent_id-s), and are
+        returned as 0-based positions; '''
+    positions = []
+    for ordinal in ordinals:
+        if '-' in ordinal:
+            start, end = ordinal.split('-', 1)
+            positions.extend( range( int(start)-1, int(end) ) )
+        else:
+            positions.append( int(ordinal)-1 )
+    return positions
+
+
+def select_with_index( index, sent_ids, doc_ids, ordinals ):
+    ''' Returns a pair (ordinals of the selected sentences, missing sent_id-s
+        and document ids), using the offset index of the corpus; '''
+    selected = set()
+    missing  = []
+    for sent_id in sent_ids:
+        i = index.find( sent_id )
+        if i < 0:
+            missing.append( sent_id )
+        else:
+            selected.add( i )
+    for doc_id in doc_ids:
+        document = index.find_document( doc_id )
+        if not document:
+            missing.append( doc_id )
+        selected.update( document )
+    for i in ordinals:
+        if i < 0 or i >= len(index):
+            raise Exception('(!) Sentence ordinal out of range: '+str(i+1))
+        selected.add( i )
+    return sorted( selected ), missing
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='''
+      Extracts sentences from a CONLL corpus: sentences with the given sent_id-s (-s, or from a file with -l, e.g. a
+      *.sent_ids file, or the sent_ids of erroneous sentences written by "query_errors.py tokens -w"), all the sentences
+      of the given documents (-d), or the sentences at the given positions (-n). The sentences are written into
+      <out_file> in the order of the corpus, and their sent_id-s into the accompanying *.sent_ids file.
+    ''',\
+    epilog='''
+      The sentences are read via the offset index of the corpus (<corpus>.idx, written by the data preparation scripts;
+      it is built if it is missing or out of date), so only the selected sentences are read. Compressed corpora cannot
+      be indexed: they are scanned.
+    '''
+    )
+    arg_parser.add_argument("corpus", help="the CONLL corpus file;", metavar='<corpus>')
+    arg_parser.add_argument("-o", "--out_file", default=None, \
+                                                help="the output CONLL file (default: None -- only the index is built);", \
+                                                metavar='<out_file>')
+    arg_parser.add_argument("-s", "--sent_ids", nargs='+', default=[], help="sent_id-s of the sentences;", \
+                                                metavar='<sent_id>')
+    arg_parser.add_argument("-l", "--list", default=None, \
+                                            help="file listing sent_id-s of the sentences (one per line);", \
+                                            metavar='<sent_ids_file>')
+    arg_parser.add_argument("-d", "--documents", nargs='+', default=[], \
+                                                 help="document ids (e.g. aja_ee199920);", metavar='<doc_id>')
+    arg_parser.add_argument("-n", "--ordinals", nargs='+', default=[], \
+                                                help="positions of the sentences in the corpus (1-based), or ranges "+\
+                                                     "of positions (e.g. 10-20);", \
+                                                metavar='<ordinal>')
+    args = arg_parser.parse_args()
+    if not os.path.isfile(args.corpus):
+        raise Exception('Corpus not found: '+args.corpus)
+    if args.list and not os.path.isfile(args.list):
+        raise Exception('File not found: '+args.list)
+    sent_ids = list( args.sent_ids ) + ( read_sent_ids( args.list ) if args.list else [] )
+    ordinals = parse_ordinals( args.ordinals )
+    start_time = timer()
+    if not args.out_file:
+        print('  --> ', build_corpus_index( args.corpus ))
+        sys.exit(0)
+
+    try:
+        index = load_corpus_index( args.corpus )
+    except Exception as error:
+        # e.g. the .sent_ids file does not match the corpus
+        print( error, file=sys.stderr )
+        index = None
+    if index is not None:
+        selected, missing = select_with_index( index, sent_ids, args.documents, ordinals )
+        tokens = index.write_sentences( selected, args.out_file )
+        out_sent_ids = [ index.sent_id(i) for i in selected ] if index.has_sent_ids else []
+        index.close()
+    else:
+        # A compressed corpus (or a corpus that cannot be indexed): scan it
+        corpus_sent_ids = read_sent_ids( get_sent_ids_file( args.corpus ) ) \
+                          if os.path.isfile( get_sent_ids_file( args.corpus ) ) else []
+        wanted  = set( sent_ids )
+        docs    = set( args.documents )
+        positions = set( ordinals )
+        found   = set()
+        selected, out_sent_ids = [], []
+        tokens  = 0
+        o_f = open_corpus( args.out_file, mode='w' )
+        for i, sentence in enumerate( iter_conll_sentence_lines( args.corpus ) ):
+            sent_id = corpus_sent_ids[i] if i < len(corpus_sent_ids) else None
+            doc_id  = sent_id_to_doc_id( sent_id ) if sent_id else None
+            if i in positions or sent_id in wanted or doc_id in docs:
+                o_f.write( '\n'.join(sentence)+'\n\n' )
+                tokens += count_sentence_tokens( sentence )
+                selected.append( i )
+                found.update( [sent_id, doc_id] )
+                if sent_id:
+                    out_sent_ids.append( sent_id )
+        o_f.close()
+        missing = [ x for x in sent_ids + args.documents if x not in found ]
+    if out_sent_ids:
+        o_f = codecs.open( get_sent_ids_file( args.out_file ), mode='w', encoding='utf-8' )
+        for sent_id in out_sent_ids:
+            o_f.write( '#'+sent_id+'\n' )
+        o_f.close()
+    if missing:
+        print('(!) Not found in the corpus: '+', '.join( missing[:20] )+(' ...' if len(missing) > 20 else ''), \
+              file=sys.stderr)
+    print(' Extracted sentences: ', len(selected), '   tokens: ', tokens, '   missing: ', len(missing))
+    print(' Processing time: {:.2f}s'.format( timer() - start_time ))
+    print('  --> ', args.out_file)
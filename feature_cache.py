@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+#
+#     Content-addressed on-disk cache of the CONLL rows generated from EDT
+#    sentences (by convert_text_w_syntax_to_CONLL in feature_generators.py);
+#
+#     An entry is keyed by a hash of: the configuration of the feature
+#    generator (its settings, the source of feature_generators.py, which
+#    defines the conversion, and of the module defining the generator, the
+#    version of EstNLTK, along with the conversion options), the tokens and
+#    the morphological analyses of the sentence, and the syntactic layer of
+#    the sentence. So, when the data preparation scripts are re-run with an
+#    unchanged generator, the conversion of each sentence becomes a cache
+#    read; when the generator changes, new entries are added, and the old
+#    ones remain available for the old configuration.
+#
+#     Entries are stored in an SQLite database; the size of the cache is
+#    limited (both in bytes and in the number of entries): once a limit is
+#    exceeded, least recently used entries are evicted. Statistics of hits
+#    and misses are kept for the current session and accumulated over all
+#    sessions.
+#
+#     Several processes may share the same cache: the stored entries and the
+#    updated access times are buffered in memory and written to the database
+#    in short transactions (every COMMIT_INTERVAL operations), so that the
+#    database is not kept locked between the writes;
+#
+from __future__ import unicode_literals, print_function
+
+import sys, os.path
+import json
+import time
+import hashlib
+import sqlite3
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from model_store import file_fingerprint
+
+DEFAULT_FEATURE_CACHE = 'feature_cache.sqlite'
+
+# Default maximum size of the cache (in bytes of the stored CONLL rows)
+DEFAULT_CACHE_SIZE = 2 * 1024**3
+
+# Settings of CONLLFeatGenerator that determine its output
+GENERATOR_SETTINGS = [ 'addAmbiguousPos', 'addVerbcGramm', 'addNomAdvVinf', 'addClauseBound', \
+                       'addSeSayingVerbs', 'kSubCatRelsLex', 'parseScope' ]
+
+# Number of cache operations between commits to the database
+COMMIT_INTERVAL = 1000
+
+# How long (in seconds) to wait for a lock held by another process sharing
+# the database before giving up
+LOCK_TIMEOUT = 120.0
+
+# The module defining convert_text_w_syntax_to_CONLL(): the conversion always
+# runs through it, regardless of the feature generator
+CONVERTER_MODULE = 'feature_generators'
+
+# Once a size limit is exceeded, entries are evicted until the size is below
+# this fraction of the limit (so that eviction does not run on each insert)
+EVICT_TO_FRACTION = 0.9
+
+STAT_NAMES = [ 'hits', 'misses', 'stores', 'evictions' ]
+
+_SCHEMA = [
+  'CREATE TABLE IF NOT EXISTS entries ( key TEXT PRIMARY KEY, conll TEXT, size INTEGER, last_used REAL )',
+  'CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries ( last_used )',
+  'CREATE TABLE IF NOT EXISTS stats ( name TEXT PRIMARY KEY, value INTEGER )',
+]
+
+
+def _module_fingerprint( module_name ):
+    ''' Returns the fingerprint of the source file of the given module (or
+        '<None>', if the source file is not available); The module is looked
+        up among the loaded modules, and then next to this file; '''
+    module = sys.modules.get( module_name )
+    module_file = getattr( module, '__file__', None )
+    if module_file is None:
+        module_file = os.path.join( os.path.dirname( os.path.abspath(__file__) ), \
+                                    module_name.split('.')[-1]+'.py' )
+    if module_file.endswith('.pyc'):
+        module_file = module_file[:-1]
+    if os.path.isfile( module_file ):
+        return file_fingerprint( module_file )
+    return '<None>'
+
+
+def generator_fingerprint( feature_generator, **options ):
+    ''' Computes a hash (a hex string) of the configuration of the feature
+        generator: its settings (see GENERATOR_SETTINGS), the source of
+        feature_generators.py (which defines the conversion, and is hashed
+        even if the generator itself comes from EstNLTK), the source of the
+        module defining the generator, the version of EstNLTK, and the given
+        conversion options (such as layer and replace_root);
+    '''
+    hasher = hashlib.sha1()
+    hasher.update( (type(feature_generator).__name__+'\n').encode('utf-8') )
+    for setting in GENERATOR_SETTINGS:
+        value = getattr( feature_generator, setting, None )
+        if isinstance( value, Mapping ):
+            value = sorted( value.items() )
+        hasher.update( (setting+'\n'+repr(value)+'\n').encode('utf-8') )
+    hasher.update( ('converter\n'+_module_fingerprint( CONVERTER_MODULE )+'\n').encode('utf-8') )
+    generator_module = type(feature_generator).__module__
+    hasher.update( ('module\n'+generator_module+'\n'+_module_fingerprint( generator_module )+'\n').encode('utf-8') )
+    try:
+        import estnltk
+        estnltk_version = getattr( estnltk, '__version__', '<unknown>' )
+    except ImportError:
+        estnltk_version = '<None>'
+    hasher.update( ('estnltk\n'+str(estnltk_version)+'\n').encode('utf-8') )
+    for name in sorted( options.keys() ):
+        hasher.update( (name+'\n'+repr(options[name])+'\n').encode('utf-8') )
+    return hasher.hexdigest()
+
+
+def sentence_fingerprint( text, layer ):
+    ''' Computes a hash (a hex string) of the tokens and the morphological
+        analyses of the given Text, and of its syntactic *layer*; '''
+    from estnltk.names import WORDS, TEXT, ANALYSIS, PARSER_OUT
+    words  = [ [word[TEXT], word.get(ANALYSIS)] for word in text[WORDS] ]
+    syntax = [ token[PARSER_OUT] for token in text[layer] ]
+    hasher = hashlib.sha1()
+    hasher.update( json.dumps( words, sort_keys=True, ensure_ascii=False ).encode('utf-8') )
+    hasher.update( b'\n' )
+    hasher.update( json.dumps( syntax, sort_keys=True, ensure_ascii=False ).encode('utf-8') )
+    return hasher.hexdigest()
+
+
+class FeatureCache(object):
+    ''' SQLite cache of CONLL rows generated from sentences, with size limits
+        and least-recently-used eviction;
+    '''
+
+    def __init__( self, db_file=DEFAULT_FEATURE_CACHE, max_size=DEFAULT_CACHE_SIZE, max_entries=None ):
+        self.db_file     = db_file
+        self.max_size    = max_size
+        self.max_entries = max_entries
+        self.connection  = sqlite3.connect( db_file, timeout=LOCK_TIMEOUT )
+        with self.connection:
+            for statement in _SCHEMA:
+                self.connection.execute( statement )
+        row = self.connection.execute( 'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries' ).fetchone()
+        self.entries, self.size = row[0], row[1]
+        self.session_stats = dict( [(name, 0) for name in STAT_NAMES] )
+        self._generator_keys = {}
+        # Writes not yet flushed to the database: stored entries (key ->
+        # (conll, size, last_used)) and access times of the read entries
+        self._stored  = {}
+        self._touched = {}
+        self._pending = 0
+
+    def get( self, key ):
+        ''' Returns the CONLL rows stored under the key, or None; '''
+        if key in self._stored:
+            self.session_stats['hits'] += 1
+            return self._stored[key][0]
+        row = self.connection.execute( 'SELECT conll FROM entries WHERE key = ?', (key,) ).fetchone()
+        if row is None:
+            self.session_stats['misses'] += 1
+            return None
+        self.session_stats['hits'] += 1
+        self._touched[key] = time.time()
+        self._operation_done()
+        return row[0]
+
+    def put( self, key, conll_str ):
+        ''' Stores the CONLL rows under the key, and evicts least recently used
+            entries if a size limit is exceeded; '''
+        size = len( conll_str.encode('utf-8') )
+        if key in self._stored:
+            old = ( self._stored[key][1], )
+        else:
+            old = self.connection.execute( 'SELECT size FROM entries WHERE key = ?', (key,) ).fetchone()
+        if old is not None:
+            self.entries -= 1
+            self.size    -= old[0]
+        self._stored[key] = ( conll_str, size, time.time() )
+        self._touched.pop( key, None )
+        self.entries += 1
+        self.size    += size
+        self.session_stats['stores'] += 1
+        if self.size > self.max_size or (self.max_entries is not None and self.entries > self.max_entries):
+            self.evict()
+        self._operation_done()
+
+    def evict( self ):
+        ''' Removes least recently used entries until both the size and the
+            number of entries are below EVICT_TO_FRACTION of the limits;
+            Returns the number of removed entries;
+        '''
+        self.flush()
+        # Other processes sharing the database may have changed it
+        row = self.connection.execute( 'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries' ).fetchone()
+        self.entries, self.size = row[0], row[1]
+        target_size    = self.max_size * EVICT_TO_FRACTION
+        target_entries = self.max_entries * EVICT_TO_FRACTION if self.max_entries is not None else None
+        removed = 0
+        with self.connection:
+            while self.entries > 0 and (self.size > target_size or \
+                  (target_entries is not None and self.entries > target_entries)):
+                rows = self.connection.execute( 'SELECT key, size FROM entries ORDER BY last_used LIMIT ?', \
+                                                (COMMIT_INTERVAL,) ).fetchall()
+                if not rows:
+                    break
+                removed_keys = []
+                for key, size in rows:
+                    if self.size <= target_size and (target_entries is None or self.entries <= target_entries):
+                        break
+                    removed_keys.append( (key,) )
+                    self.entries -= 1
+                    self.size    -= size
+                self.connection.executemany( 'DELETE FROM entries WHERE key = ?', removed_keys )
+                removed += len(removed_keys)
+        self.session_stats['evictions'] += removed
+        return removed
+
+    def flush( self ):
+        ''' Writes the buffered entries and access times into the database (in
+            a single transaction); '''
+        if self._stored or self._touched:
+            with self.connection:
+                self.connection.executemany( 'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)', \
+                    [ (key, conll_str, size, last_used) for key, (conll_str, size, last_used) in self._stored.items() ] )
+                self.connection.executemany( 'UPDATE entries SET last_used = ? WHERE key = ?', \
+                    [ (last_used, key) for key, last_used in self._touched.items() ] )
+            self._stored  = {}
+            self._touched = {}
+        self._pending = 0
+
+    def _operation_done( self ):
+        self._pending += 1
+        if self._pending >= COMMIT_INTERVAL:
+            self.flush()
+
+    def convert( self, text, feature_generator, layer, replace_root=True ):
+        ''' Converts the given Text (a sentence with the syntactic *layer*) into
+            CONLL rows with convert_text_w_syntax_to_CONLL(), or fetches the
+            rows from the cache if the same sentence has already been
+            converted with the same generator configuration;
+            Returns the CONLL rows as a string;
+        '''
+        from feature_generators import convert_text_w_syntax_to_CONLL
+        generator_id = ( id(feature_generator), layer, replace_root )
+        if generator_id not in self._generator_keys:
+            self._generator_keys[generator_id] = \
+                generator_fingerprint( feature_generator, layer=layer, replace_root=replace_root )
+        hasher = hashlib.sha1()
+        hasher.update( self._generator_keys[generator_id].encode('utf-8') )
+        hasher.update( sentence_fingerprint( text, layer ).encode('utf-8') )
+        key = hasher.hexdigest()
+        conll_str = self.get( key )
+        if conll_str is None:
+            conll_str = convert_text_w_syntax_to_CONLL( text, feature_generator, layer=layer, replace_root=replace_root )
+            self.put( key, conll_str )
+        return conll_str
+
+    def hit_rate( self ):
+        ''' Returns the hit rate of the current session (or None, if the cache
+            has not been used yet); '''
+        lookups = self.session_stats['hits'] + self.session_stats['misses']
+        return float(self.session_stats['hits']) / lookups if lookups else None
+
+    def total_stats( self ):
+        ''' Returns the statistics accumulated over all the sessions (including
+            the current one); '''
+        stats = dict( self.session_stats )
+        for name, value in self.connection.execute( 'SELECT name, value FROM stats' ):
+            if name in stats:
+                stats[name] += value
+        return stats
+
+    def format_stats( self ):
+        ''' Formats the statistics of the cache as a string; '''
+        hit_rate = self.hit_rate()
+        stats = self.session_stats
+        total = self.total_stats()
+        total_lookups = total['hits'] + total['misses']
+        return ' Feature cache: '+str(stats['hits'])+' hits, '+str(stats['misses'])+' misses'+\
+               (' (hit rate: {:.1f}%)'.format(hit_rate * 100) if hit_rate is not None else '')+\
+               ', '+str(stats['stores'])+' stored, '+str(stats['evictions'])+' evicted;  '+\
+               str(self.entries)+' entries, {:.1f}MB'.format( self.size / 1024.0**2 )+\
+               (';  overall hit rate: {:.1f}%'.format(total['hits'] * 100.0 / total_lookups) if total_lookups else '')
+
+    def close( self ):
+        ''' Saves the buffered entries and the statistics of the session, and
+            closes the database; '''
+        self.flush()
+        with self.connection:
+            for name in STAT_NAMES:
+                self.connection.execute( 'INSERT OR IGNORE INTO stats VALUES (?, 0)', (name,) )
+                self.connection.execute( 'UPDATE stats SET value = value + ? WHERE name = ?', \
+                                         (self.session_stats[name], name) )
+        self.session_stats = dict( [(name, 0) for name in STAT_NAMES] )
+        self.connection.close()
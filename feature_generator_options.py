@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#
+#     Command line options of the predefined feature generators (the flags
+#    --f01, --f02_a, ... and the settings of the generators behind them);
+#
+#     The options are kept apart from feature_generators.py, which imports
+#    EstNLTK and constructs the generators, so that scripts can define their
+#    arguments (and answer --help or report argument errors) without loading
+#    EstNLTK;
+#
+from __future__ import unicode_literals, print_function
+
+# =============================================================================
+# =============================================================================
+#  The set of predefined feature generators
+#  (you can augment this set with your own generators to experiment with
+#   different models); 'settings' are the keyword arguments of
+#  CONLLFeatGenerator, or None for EstNLTK's default feature generator
+# =============================================================================
+# =============================================================================
+
+feature_generator_options = [
+{ 'flag':'--f01',  \
+  'settings': None, \
+  'help': 'EstNLTK\'s feature generator (Default).'
+},\
+{ 'flag':'--f02_a', \
+  'settings': dict(parseScope='sentences'), \
+  'help': 'The feature generator with settings: parseScope=sentences;'
+},\
+{ 'flag':'--f02_b', \
+  'settings': dict(parseScope='sentences',addAmbiguousPos=True), \
+  'help': 'The feature generator with settings: parseScope=sentences, addAmbiguousPos=True;'
+},\
+{ 'flag':'--f03_a', \
+  'settings': dict(parseScope='sentences',addAmbiguousPos=True,addVerbcGramm=True), \
+  'help': 'The feature generator with settings: parseScope=sentences, addAmbiguousPos=True, addVerbcGramm=True;',
+},\
+{ 'flag':'--f03_b', \
+  'settings': dict(parseScope='sentences',addAmbiguousPos=True,addVerbcGramm=True,addNomAdvVinf=True), \
+  'help': 'The feature generator with settings: parseScope=sentences, addAmbiguousPos=True, addVerbcGramm=True, addNomAdvVinf=True;',
+},\
+{ 'flag':'--f03_c', \
+  'settings': dict(parseScope='sentences',addAmbiguousPos=True,addVerbcGramm=True,addNomAdvVinf=True, addClauseBound=True), \
+  'help': 'The feature generator with settings: parseScope=sentences, addAmbiguousPos=True, addVerbcGramm=True, addNomAdvVinf=True, addClauseBound=True;',
+},\
+{ 'flag':'--f04', \
+  'settings': dict(parseScope='sentences',addAmbiguousPos=True,addVerbcGramm=True,addNomAdvVinf=True,addClauseBound=True,addSeSayingVerbs=True), \
+  'help': 'The feature generator with settings: parseScope=sentences, addAmbiguousPos=True, addVerbcGramm=True, addNomAdvVinf=True, addClauseBound=True, addSeSayingVerbs=True;'
+},\
+{ 'flag':'--f05', \
+  'settings': dict(parseScope='clauses'), \
+  'help': 'The feature generator with settings: parseScope=clauses;'
+},\
+{ 'flag':'--f06', \
+  'settings': dict(parseScope='clauses',addAmbiguousPos=True), \
+  'help': 'The feature generator with settings: parseScope=clauses, addAmbiguousPos=True;'
+},\
+]
+
+def add_feature_generator_arguments_to_argparser( argparser ):
+    group = argparser.add_mutually_exclusive_group()
+    for gen_id, generator in enumerate(feature_generator_options):
+        group.add_argument(generator['flag'], dest='generator_id', action='store_const', const=gen_id, help=generator['help'])
+
+def get_feature_generator_id( args ):
+    ''' Returns the index of the feature generator selected in the parsed
+        command line arguments (0, if none was selected); '''
+    args_as_dict = vars( args )
+    generator_id = 0
+    if 'generator_id' in args_as_dict and not args_as_dict['generator_id'] == None:
+        generator_id = args_as_dict['generator_id']
+    return generator_id
@@ -5,7 +5,7 @@ from __future__ import unicode_literals, print_function
 from estnltk.names import *
 
 from estnltk.core import PACKAGE_PATH
-from estnltk.syntax.maltparser_support import _loadKSubcatRelations, _findKsubcatFeatures
+from estnltk.syntax.maltparser_support import _findKsubcatFeatures
 
 from estnltk.syntax.parsers import MaltParser
 from estnltk.syntax.maltparser_support import CONLLFeatGenerator as EstNLTKCONLLFeatGenerator
@@ -14,6 +14,10 @@ import re
 import os, os.path
 import codecs
 
+from ksubcat_lexicon import load_ksubcat_lexicon
+from feature_generator_options import feature_generator_options, get_feature_generator_id
+from feature_generator_options import add_feature_generator_arguments_to_argparser
+
 # =============================================================================
 # =============================================================================
 #  Generating features to be used in CONLL
@@ -58,9 +62,10 @@ class CONLLFeatGenerator(object):
            addKSubCatRels : string
                 If used, the argument value should contain a location of the
                 _K_ subcategorization relations file -- a file that can be loaded
-                via method _loadKSubcatRelations();
-                Then the dictionary loaded from file is used to provide adposition
-                type ("post" or "pre");
+                via method _loadKSubcatRelations() --, or of its compiled form
+                (see ksubcat_lexicon.py);
+                The lexicon is compiled (if needed) and memory-mapped, and then
+                used to provide adposition type ("post" or "pre");
                 Default: None
            addVerbChainGramm : bool
                 If True, verb chains layer in the input Text object is used to
@@ -113,8 +118,8 @@ class CONLLFeatGenerator(object):
                 self.parseScope = argVal
             elif argName in ['addKSubCatRels', 'kSubCatRels']:
                 if os.path.isfile(argVal):
-                    # Load K subcategorization lexicon from file
-                    self.kSubCatRelsLex = _loadKSubcatRelations( argVal )
+                    # Load (the compiled) K subcategorization lexicon from file
+                    self.kSubCatRelsLex = load_ksubcat_lexicon( argVal )
                 else:
                     raise Exception('(!) Lexicon file not found: ',argVal)
 
@@ -230,61 +235,23 @@ class CONLLFeatGenerator(object):
 # =============================================================================
 # =============================================================================
 #  The set of predefined feature generators
-#  (you can augment this set with your own generators to experiment with
-#   different models)
+#  (the flags and the settings of the generators are listed in
+#   feature_generator_options.py; add your own generators there to
+#   experiment with different models)
 # =============================================================================
 # =============================================================================
 
-feature_generators = [
-{ 'flag':'--f01',  \
-  'generator': MaltParser.load_default_feature_generator(), \
-  'help': 'EstNLTK\'s feature generator (Default).'
-},\
-{ 'flag':'--f02_a', \
-  'generator': CONLLFeatGenerator(parseScope='sentences'), \
-  'help': 'The feature generator with settings: parseScope=sentences;'
-},\
-{ 'flag':'--f02_b', \
-  'generator': CONLLFeatGenerator(parseScope='sentences',addAmbiguousPos=True), \
-  'help': 'The feature generator with settings: parseScope=sentences, addAmbiguousPos=True;'
-},\
-{ 'flag':'--f03_a', \
-  'generator': CONLLFeatGenerator(parseScope='sentences',addAmbiguousPos=True,addVerbcGramm=True), \
-  'help': 'The feature generator with settings: parseScope=sentences, addAmbiguousPos=True, addVerbcGramm=True;',
-},\
-{ 'flag':'--f03_b', \
-  'generator': CONLLFeatGenerator(parseScope='sentences',addAmbiguousPos=True,addVerbcGramm=True,addNomAdvVinf=True), \
-  'help': 'The feature generator with settings: parseScope=sentences, addAmbiguousPos=True, addVerbcGramm=True, addNomAdvVinf=True;',
-},\
-{ 'flag':'--f03_c', \
-  'generator': CONLLFeatGenerator(parseScope='sentences',addAmbiguousPos=True,addVerbcGramm=True,addNomAdvVinf=True, addClauseBound=True), \
-  'help': 'The feature generator with settings: parseScope=sentences, addAmbiguousPos=True, addVerbcGramm=True, addNomAdvVinf=True, addClauseBound=True;',
-},\
-{ 'flag':'--f04', \
-  'generator': CONLLFeatGenerator(parseScope='sentences',addAmbiguousPos=True,addVerbcGramm=True,addNomAdvVinf=True,addClauseBound=True,addSeSayingVerbs=True), \
-  'help': 'The feature generator with settings: parseScope=sentences, addAmbiguousPos=True, addVerbcGramm=True, addNomAdvVinf=True, addClauseBound=True, addSeSayingVerbs=True;'
-},\
-{ 'flag':'--f05', \
-  'generator': CONLLFeatGenerator(parseScope='clauses'), \
-  'help': 'The feature generator with settings: parseScope=clauses;'
-},\
-{ 'flag':'--f06', \
-  'generator': CONLLFeatGenerator(parseScope='clauses',addAmbiguousPos=True), \
-  'help': 'The feature generator with settings: parseScope=clauses, addAmbiguousPos=True;'
-},\
-]
-
-def add_feature_generator_arguments_to_argparser( argparser ):
-    group = argparser.add_mutually_exclusive_group()
-    for gen_id, generator in enumerate(feature_generators):
-        group.add_argument(generator['flag'], dest='generator_id', action='store_const', const=gen_id, help=generator['help'])
+feature_generators = []
+for option in feature_generator_options:
+    if option['settings'] is None:
+        generator = MaltParser.load_default_feature_generator()
+    else:
+        generator = CONLLFeatGenerator( **option['settings'] )
+    feature_generators.append( { 'flag': option['flag'], 'generator': generator, 'help': option['help'] } )
 
 def get_feature_generator( args, verbose=False ):
     args_as_dict = vars( args )
-    generator_id = 0
-    if 'generator_id' in args_as_dict and not args_as_dict['generator_id'] == None:
-        generator_id = args_as_dict['generator_id']
-    gen = feature_generators[generator_id]
+    gen = feature_generators[ get_feature_generator_id( args ) ]
     if verbose:
         print(' Using feature generator: '+str(gen['flag'])+' "'+str(gen['help'])+'"' )
         if 'replace_root' in args_as_dict and not args_as_dict['replace_root']:
@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+#
+#     Generates a synthetic EDT-like corpus for scale testing: EstCG (VISLCG3)
+#    format *.inforem files, as in https://github.com/EstSyntax/EDT, and the
+#    matching UD_Estonian-like *.conllu files (train/dev/test) with valid
+#    sent_id-s, so that the data preparation scripts (the alignment of the
+#    UD and EDT corpora) and the evaluators can be run on corpora of any size,
+#    without downloading anything;
+#
+#     Sentences are built from a small lexicon by a simple clause grammar:
+#    each clause has a subject, a finite verb, and optionally objects,
+#    adverbials and adjective modifiers; clauses can embed subordinate
+#    clauses (up to the given depth), and sentences can be quoted speech
+#    followed by a saying verb (as in: " ... , " ütles Mari .). Sentence
+#    lengths follow a log-normal distribution. The output is deterministic
+#    for a given seed.
+#
+from __future__ import unicode_literals, print_function
+
+import os, os.path
+import codecs, json
+import math
+import random
+import argparse
+
+from timeit import default_timer as timer
+
+# Names of the UD splits, and the default fractions of the sentences in them;
+# sentences not in any split are only in the EDT files (like the sentences
+# extracted by get_edt_corpus_diff_from_ud_corpus.py)
+UD_SPLITS = ['train', 'dev', 'test']
+DEFAULT_SPLIT_FRACTIONS = [0.6, 0.1, 0.1]
+
+# Width of the zero-padded document number: the alignment scripts find the
+# file of a sent_id by prefix matching, so document ids must not be prefixes
+# of each other
+DOC_NUMBER_WIDTH = 6
+
+# Lexicon: (form, lemma, CG3 tags, UD POS, UD features)
+NOUNS_NOM = [ ('mees', 'mees'), ('naine', 'naine'), ('laps', 'laps'), ('koer', 'koer'), ('õpetaja', 'õpetaja'), \
+              ('valitsus', 'valitsus'), ('linn', 'linn'), ('firma', 'firma'), ('arst', 'arst'), ('sõber', 'sõber') ]
+NOUNS_PART = [ ('raamatut', 'raamat'), ('maja', 'maja'), ('kirja', 'kiri'), ('otsust', 'otsus'), \
+               ('autot', 'auto'), ('tööd', 'töö'), ('leiba', 'leib'), ('plaani', 'plaan') ]
+NOUNS_INE = [ ('linnas', 'linn'), ('majas', 'maja'), ('metsas', 'mets'), ('koolis', 'kool'), \
+              ('aias', 'aed'), ('toas', 'tuba'), ('poes', 'pood') ]
+ADJECTIVES = [ ('suur', 'suur'), ('väike', 'väike'), ('uus', 'uus'), ('vana', 'vana'), ('ilus', 'ilus'), \
+               ('tark', 'tark'), ('kiire', 'kiire') ]
+VERBS = [ ('nägi', 'nägema'), ('ostis', 'ostma'), ('kirjutas', 'kirjutama'), ('tegi', 'tegema'), \
+          ('luges', 'lugema'), ('leidis', 'leidma'), ('ootas', 'ootama'), ('otsis', 'otsima') ]
+ADVERBS = [ ('täna', 'täna'), ('kiiresti', 'kiiresti'), ('jälle', 'jälle'), ('eile', 'eile'), \
+            ('seal', 'seal'), ('hiljem', 'hiljem') ]
+CONJUNCTIONS = [ ('et', 'et'), ('kui', 'kui'), ('sest', 'sest'), ('kuigi', 'kuigi') ]
+SAYING_VERBS = [ ('ütles', 'ütlema'), ('lisas', 'lisama'), ('vaidles', 'vaidlema'), ('kinnitas', 'kinnitama') ]
+NAMES = [ ('Mari', 'Mari'), ('Jaan', 'Jaan'), ('Peeter', 'Peeter'), ('Anu', 'Anu'), ('Tiit', 'Tiit') ]
+
+
+def _token( form, lemma, cg_tags, cg_label, ud_pos, ud_feats, ud_label, head=None ):
+    ''' A token of a clause; *head* is the index of the head within the clause
+        (None for the root of the clause); '''
+    return { 'form': form, 'lemma': lemma, 'cg_tags': cg_tags, 'cg_label': cg_label, 'ud_pos': ud_pos, \
+             'ud_feats': ud_feats, 'ud_label': ud_label, 'head': head }
+
+
+# CG3 case tags and the corresponding UD case features
+UD_CASES = { 'nom': 'Nom', 'part': 'Par', 'in': 'Ine' }
+
+
+def _noun_phrase( rng, words, cg_label, ud_label, case, max_adjectives ):
+    ''' Returns the tokens of a noun phrase (adjectives + noun), and the index
+        of the noun; '''
+    tokens = []
+    for i in range( rng.randint(0, max_adjectives) ):
+        form, lemma = rng.choice( ADJECTIVES )
+        tokens.append( _token( form, lemma, 'A pos sg '+case, '@AN>', 'ADJ', 'Case='+UD_CASES[case]+'|Number=Sing', 'amod' ) )
+    form, lemma = rng.choice( words )
+    tokens.append( _token( form, lemma, 'S com sg '+case, cg_label, 'NOUN', 'Case='+UD_CASES[case]+'|Number=Sing', ud_label ) )
+    noun = len(tokens) - 1
+    for token in tokens[:-1]:
+        token['head'] = noun
+    return tokens, noun
+
+
+def _append( tokens, part, head ):
+    ''' Appends the tokens of *part* to *tokens*: the root of *part* is attached
+        to *head* (an index in *tokens*); Returns the index of the root of *part*
+        in *tokens*; '''
+    offset = len(tokens)
+    root = None
+    for i, token in enumerate( part ):
+        token = dict( token )
+        if token['head'] is None:
+            root = offset + i
+            token['head'] = head
+        else:
+            token['head'] += offset
+        tokens.append( token )
+    return root
+
+
+def make_clause( rng, n_words, depth, config ):
+    ''' Builds a clause of roughly *n_words* words (subject, finite verb,
+        objects and adverbials), possibly embedding subordinate clauses if
+        *depth* is below the maximum clause depth; Returns a list of tokens,
+        where the root (the verb) has head None;
+    '''
+    tokens = []
+    subject, subject_root = _noun_phrase( rng, NOUNS_NOM, '@SUBJ', 'nsubj', 'nom', 1 if n_words > 4 else 0 )
+    tokens.extend( subject )
+    form, lemma = rng.choice( VERBS )
+    verb = len(tokens)
+    tokens.append( _token( form, lemma, 'V main indic impf ps3 sg ps af', '@FMV', 'VERB', \
+                           'Mood=Ind|Number=Sing|Person=3|Tense=Past|VerbForm=Fin|Voice=Act', 'root' ) )
+    tokens[subject_root]['head'] = verb
+    for token in subject:
+        if token['head'] is None:
+            token['head'] = verb
+    budget = n_words - len(tokens)
+    # Embed a subordinate clause
+    if depth < config['max_clause_depth'] and budget >= 4 and rng.random() < config['clause_prob']:
+        sub_words = rng.randint( 2, max(2, budget // 2) )
+        budget -= sub_words + 2
+    else:
+        sub_words = 0
+    while budget > 0:
+        choice = rng.random()
+        if choice < 0.4:
+            part, part_root = _noun_phrase( rng, NOUNS_PART, '@OBJ', 'obj', 'part', min(2, budget - 1) )
+        elif choice < 0.7:
+            part, part_root = _noun_phrase( rng, NOUNS_INE, '@ADVL', 'obl', 'in', min(1, budget - 1) )
+        else:
+            form, lemma = rng.choice( ADVERBS )
+            part = [ _token( form, lemma, 'D', '@ADVL', 'ADV', '_', 'advmod' ) ]
+            part_root = 0
+        part[part_root]['head'] = None
+        _append( tokens, part, verb )
+        budget -= len(part)
+    if sub_words > 0:
+        sub_clause = make_clause( rng, sub_words, depth + 1, config )
+        comma = len(tokens)
+        tokens.append( _token( ',', ',', 'Z Com CLB', None, 'PUNCT', '_', 'punct' ) )
+        form, lemma = rng.choice( CONJUNCTIONS )
+        conj = len(tokens)
+        tokens.append( _token( form, lemma, 'J sub', '@J', 'SCONJ', '_', 'mark' ) )
+        for token in sub_clause:
+            if token['head'] is None:
+                token['cg_label'] = '@FMV'
+                token['ud_label'] = 'advcl'
+        sub_root = _append( tokens, sub_clause, verb )
+        tokens[comma]['head'] = sub_root
+        tokens[conj]['head']  = sub_root
+    return tokens
+
+
+def make_sentence( rng, config ):
+    ''' Builds a sentence: a list of tokens with 1-based heads (0 for the root); '''
+    n_words = int( round( rng.lognormvariate( math.log(config['mean_length']), config['length_sigma'] ) ) )
+    n_words = max( 2, min( config['max_length'], n_words ) )
+    quoted = n_words >= 6 and rng.random() < config['quote_prob']
+    if quoted:
+        # " <clause> , " <saying verb> <name> .
+        clause = make_clause( rng, n_words - 6, 0, config )
+        tokens = [ _token( '"', '"', 'Z Quo', None, 'PUNCT', '_', 'punct' ) ]
+        clause_root = _append( tokens, clause, None )
+        tokens[clause_root]['ud_label'] = 'ccomp'
+        tokens[clause_root]['cg_label'] = '@FMV'
+        tokens.append( _token( ',', ',', 'Z Com CLB', None, 'PUNCT', '_', 'punct', clause_root ) )
+        tokens.append( _token( '"', '"', 'Z Quo', None, 'PUNCT', '_', 'punct', clause_root ) )
+        tokens[0]['head'] = clause_root
+        form, lemma = rng.choice( SAYING_VERBS )
+        root = len(tokens)
+        tokens.append( _token( form, lemma, 'V main indic impf ps3 sg ps af', '@FMV', 'VERB', \
+                               'Mood=Ind|Number=Sing|Person=3|Tense=Past|VerbForm=Fin|Voice=Act', 'root' ) )
+        form, lemma = rng.choice( NAMES )
+        tokens.append( _token( form, lemma, 'S prop sg nom', '@SUBJ', 'PROPN', 'Case=Nom|Number=Sing', 'nsubj', root ) )
+        tokens[clause_root]['head'] = root
+    else:
+        tokens = make_clause( rng, n_words - 1, 0, config )
+        root = [ i for i, t in enumerate(tokens) if t['head'] is None ][0]
+    tokens.append( _token( '.', '.', 'Z Fst CLB', None, 'PUNCT', '_', 'punct', root ) )
+    first = [ token for token in tokens if token['ud_pos'] != 'PUNCT' ][0]
+    first['form'] = first['form'][0].upper() + first['form'][1:]
+    for i, token in enumerate( tokens ):
+        token['head'] = 0 if token['head'] is None else token['head'] + 1
+    return tokens
+
+
+# =============================================================================
+#    Writing the corpus
+# =============================================================================
+
+def format_cg3_sentence( tokens ):
+    ''' Formats the sentence in the EstCG format of EDT *.inforem files; '''
+    lines = [ '"<s>"' ]
+    for i, token in enumerate( tokens ):
+        lines.append( '"<'+token['form']+'>"' )
+        label = ' '+token['cg_label'] if token['cg_label'] else ''
+        lines.append( '\t"'+token['lemma']+'" L0 '+token['cg_tags']+label+' #'+str(i+1)+'->'+str(token['head']) )
+    lines.append( '"</s>"' )
+    lines.append( '' )
+    return '\n'.join( lines )+'\n'
+
+
+def format_conllu_sentence( tokens, sent_id ):
+    ''' Formats the sentence in the UD_Estonian's CONLLU format (with the
+        sent_id comment used by UD_Estonian v1.x); '''
+    lines = [ '# sent_id '+sent_id ]
+    for i, token in enumerate( tokens ):
+        lines.append( '\t'.join( [ str(i+1), token['form'], token['lemma'], token['ud_pos'], \
+                                   token['cg_tags'].split()[0], token['ud_feats'], str(token['head']), \
+                                   token['ud_label'], '_', '_' ] ) )
+    lines.append( '' )
+    return '\n'.join( lines )+'\n'
+
+
+def generate_corpus( out_dir, n_tokens, config, split_fractions=DEFAULT_SPLIT_FRACTIONS, \
+                     sentences_per_doc=50, seed=None ):
+    ''' Generates a synthetic corpus of (roughly) *n_tokens* tokens into
+        *out_dir*: the *.inforem files into the subdir 'EDT', and the files
+        et-ud-<split>.conllu into the subdir 'UD_Estonian-master'; Each
+        sentence goes into one of the UD splits with the probabilities
+        *split_fractions* (or into none of them, with the remaining
+        probability); Returns a dict with statistics of the corpus;
+    '''
+    rng = random.Random( seed )
+    edt_dir = os.path.join( out_dir, 'EDT' )
+    ud_dir  = os.path.join( out_dir, 'UD_Estonian-master' )
+    for dir_name in [ edt_dir, ud_dir ]:
+        if not os.path.isdir( dir_name ):
+            os.makedirs( dir_name )
+    ud_files = {}
+    for split in UD_SPLITS:
+        ud_files[split] = codecs.open( os.path.join( ud_dir, 'et-ud-'+split+'.conllu' ), mode='w', encoding='utf-8' )
+    stats = { 'documents': 0, 'sentences': 0, 'tokens': 0, 'quoted_sentences': 0, \
+              'split_sentences': dict([(split, 0) for split in UD_SPLITS]) }
+    try:
+        while stats['tokens'] < n_tokens:
+            doc_nr = str( stats['documents'] + 1 ).zfill( DOC_NUMBER_WIDTH )
+            if len(doc_nr) > DOC_NUMBER_WIDTH:
+                raise Exception('(!) Too many documents: increase the number of sentences per document.')
+            # e.g. aja_syn_000012.tasak.inforem  -->  doc id aja_syn000012
+            edt_file = os.path.join( edt_dir, 'aja_syn_'+doc_nr+'.tasak.inforem' )
+            doc_id   = 'aja_syn'+doc_nr
+            o_f = codecs.open( edt_file, mode='w', encoding='utf-8' )
+            for sent_nr in range( 1, sentences_per_doc + 1 ):
+                if stats['tokens'] >= n_tokens:
+                    break
+                tokens = make_sentence( rng, config )
+                o_f.write( format_cg3_sentence( tokens ) )
+                r = rng.random()
+                for split, fraction in zip( UD_SPLITS, split_fractions ):
+                    if r < fraction:
+                        ud_files[split].write( format_conllu_sentence( tokens, doc_id+'_'+str(sent_nr) ) )
+                        stats['split_sentences'][split] += 1
+                        break
+                    r -= fraction
+                stats['sentences'] += 1
+                stats['tokens'] += len(tokens)
+                if tokens[0]['form'] == '"':
+                    stats['quoted_sentences'] += 1
+            o_f.close()
+            stats['documents'] += 1
+    finally:
+        for o_f in ud_files.values():
+            o_f.close()
+    return stats
+
+
+if __name__ == '__main__':
+    # =============================================================================
+    #    Fetch command line arguments
+    # =============================================================================
+    n_tokens          = 400000
+    mean_length       = 12.0
+    length_sigma      = 0.6
+    max_length        = 150
+    max_clause_depth  = 2
+    clause_prob       = 0.3
+    quote_prob        = 0.05
+    sentences_per_doc = 50
+    seed              = 1
+
+    arg_parser = argparse.ArgumentParser(description='''
+      Generates a synthetic EDT-like corpus for scale testing: EstCG format *.inforem files (into <out_dir>/EDT) and
+      the matching UD_Estonian-like CONLLU files et-ud-train.conllu, et-ud-dev.conllu and et-ud-test.conllu (into
+      <out_dir>/UD_Estonian-master) with valid sent_id-s. The corpus can be used as an input of the data preparation
+      scripts (align_ud_corpus_with_edt_corpus.py, get_edt_corpus_diff_from_ud_corpus.py) and the evaluators.
+    ''',\
+    epilog='''
+      Sentences are built from a small lexicon by a simple clause grammar, so the corpus is only useful for testing
+      the speed and the scaling of the scripts, not for training real models. Sentence lengths follow a log-normal
+      distribution with the given mean and sigma; clauses embed subordinate clauses with the given probability (up to
+      the given depth); and sentences are quoted speech followed by a saying verb with the given probability. The EDT
+      part of the corpus has roughly <tokens> tokens (EDT itself has about 400 000 tokens, so use e.g. 4000000 for 10x
+      and 40000000 for 100x scale). The output is deterministic for a given seed.
+    '''
+    )
+    arg_parser.add_argument("out_dir", help="the output directory;", metavar='<out_dir>')
+    arg_parser.add_argument("-t", "--tokens", default=n_tokens, type=int, \
+                                              help="number of tokens in the EDT files (default: "+str(n_tokens)+");", \
+                                              metavar='<tokens>')
+    arg_parser.add_argument("-ml", "--mean_length", default=mean_length, type=float, \
+                                                    help="median sentence length (default: "+str(mean_length)+");", \
+                                                    metavar='<tokens>')
+    arg_parser.add_argument("-ls", "--length_sigma", default=length_sigma, type=float, \
+                                                     help="sigma of the log-normal sentence length distribution (default: "+\
+                                                          str(length_sigma)+");", \
+                                                     metavar='<sigma>')
+    arg_parser.add_argument("-xl", "--max_length", default=max_length, type=int, \
+                                                   help="maximum sentence length (default: "+str(max_length)+");", \
+                                                   metavar='<tokens>')
+    arg_parser.add_argument("-cd", "--clause_depth", default=max_clause_depth, type=int, \
+                                                     help="maximum depth of embedded clauses (default: "+str(max_clause_depth)+");", \
+                                                     metavar='<depth>')
+    arg_parser.add_argument("-cp", "--clause_prob", default=clause_prob, type=float, \
+                                                    help="probability of embedding a subordinate clause into a clause (default: "+\
+                                                         str(clause_prob)+");", \
+                                                    metavar='<probability>')
+    arg_parser.add_argument("-qp", "--quote_prob", default=quote_prob, type=float, \
+                                                   help="probability of a sentence being quoted speech (default: "+str(quote_prob)+");", \
+                                                   metavar='<probability>')
+    arg_parser.add_argument("-sp", "--splits", nargs=3, default=DEFAULT_SPLIT_FRACTIONS, type=float, \
+                                               help="fractions of the sentences in the UD train, dev and test files; the remaining "+\
+                                                    "sentences are only in the EDT files (default: "+\
+                                                    ' '.join([str(f) for f in DEFAULT_SPLIT_FRACTIONS])+");", \
+                                               metavar='<fraction>')
+    arg_parser.add_argument("-sd", "--sentences_per_doc", default=sentences_per_doc, type=int, \
+                                                          help="number of sentences in an EDT file (default: "+str(sentences_per_doc)+");", \
+                                                          metavar='<sentences>')
+    arg_parser.add_argument("-s", "--seed", default=seed, type=int, \
+                                            help="random seed (default: "+str(seed)+");", \
+                                            metavar='<seed>')
+    args = arg_parser.parse_args()
+    if args.tokens < 1 or args.sentences_per_doc < 1 or args.mean_length < 2 or args.max_length < 2:
+        raise Exception('(!) Invalid size of the corpus or of the sentences.')
+    if any([f < 0 for f in args.splits]) or sum(args.splits) > 1.0:
+        raise Exception('(!) Invalid split fractions: '+str(args.splits))
+    config = { 'mean_length': args.mean_length, 'length_sigma': args.length_sigma, 'max_length': args.max_length, \
+               'max_clause_depth': args.clause_depth, 'clause_prob': args.clause_prob, 'quote_prob': args.quote_prob }
+
+    start_time = timer()
+    stats = generate_corpus( args.out_dir, args.tokens, config, split_fractions=args.splits, \
+                             sentences_per_doc=args.sentences_per_doc, seed=args.seed )
+    print(' Generated '+str(stats['documents'])+' documents, '+str(stats['sentences'])+' sentences, '+\
+          str(stats['tokens'])+' tokens ('+str(stats['quoted_sentences'])+' quoted sentences) in {:.1f}s'.format( timer() - start_time ))
+    print(' UD sentences: '+', '.join( [split+': '+str(stats['split_sentences'][split]) for split in UD_SPLITS] ))
+    stats['config'] = config
+    stats['seed']   = args.seed
+    stats_file = os.path.join( args.out_dir, 'synthetic_corpus.json' )
+    o_f = codecs.open( stats_file, mode='w', encoding='utf-8' )
+    json.dump( stats, o_f, indent=1, sort_keys=True )
+    o_f.close()
+    print('  --> ',stats_file)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+#
+#     Precompiled K subcategorization lexicon (the lexicon of the adposition
+#    types, used by CONLLFeatGenerator(addKSubCatRels=...));
+#
+#     The text lexicon is parsed once (with EstNLTK's _loadKSubcatRelations)
+#    and compiled into a binary file that has an index sorted by lemma. The
+#    binary file is memory-mapped read-only, and looked up via binary search,
+#    so loading it is instant, and parallel worker processes share the same
+#    pages of the file (instead of each holding a copy of the parsed lexicon).
+#    KSubcatLexicon behaves as a read-only dict mapping a lemma to the list of
+#    [post/pre, FEATS pattern] pairs, i.e. the same as the dict returned by
+#    _loadKSubcatRelations, so it can be passed to _findKsubcatFeatures;
+#
+#     The format of the binary file:
+#       magic (8 bytes) | fingerprint of the text lexicon (40 bytes, ascii) |
+#       number of lemmas (uint32) | index: for each lemma, in the order of the
+#       UTF-8 bytes of the lemmas: (lemma offset, lemma length, value offset,
+#       value length) as uint32 | data: lemmas (UTF-8) and values (JSON);
+#
+from __future__ import unicode_literals, print_function
+
+import os, os.path
+import json
+import mmap
+import struct
+import tempfile
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from model_store import file_fingerprint
+
+MAGIC = b'KSUBCAT1'
+COMPILED_SUFFIX = '.bin'
+
+_HEADER = struct.Struct( '<8s40sI' )
+_INDEX_ENTRY = struct.Struct( '<IIII' )
+
+
+def compile_ksubcat_lexicon( lexicon_file, compiled_file ):
+    ''' Parses the text lexicon *lexicon_file* and writes its binary form into
+        *compiled_file* (atomically, so that concurrent processes never see a
+        partially written file); '''
+    from estnltk.syntax.maltparser_support import _loadKSubcatRelations
+    lexicon = _loadKSubcatRelations( lexicon_file )
+    items = sorted( [ (lemma.encode('utf-8'), json.dumps(value, ensure_ascii=False).encode('utf-8')) \
+                      for lemma, value in lexicon.items() ] )
+    data_start = _HEADER.size + _INDEX_ENTRY.size * len(items)
+    index = []
+    data  = []
+    offset = data_start
+    for lemma, value in items:
+        index.append( _INDEX_ENTRY.pack( offset, len(lemma), offset+len(lemma), len(value) ) )
+        data.append( lemma )
+        data.append( value )
+        offset += len(lemma) + len(value)
+    temp_file = compiled_file+'.'+str(os.getpid())+'.tmp'
+    with open( temp_file, 'wb' ) as out_f:
+        out_f.write( _HEADER.pack( MAGIC, file_fingerprint( lexicon_file ).encode('ascii'), len(items) ) )
+        out_f.write( b''.join(index) )
+        out_f.write( b''.join(data) )
+    os.replace( temp_file, compiled_file )
+
+
+def _read_header( compiled_file ):
+    ''' Returns (fingerprint of the text lexicon, number of lemmas) from the
+        header of the compiled file, or None if the file is not valid; '''
+    try:
+        with open( compiled_file, 'rb' ) as in_f:
+            header = in_f.read( _HEADER.size )
+    except (IOError, OSError):
+        return None
+    if len(header) < _HEADER.size:
+        return None
+    magic, fingerprint, size = _HEADER.unpack( header )
+    if magic != MAGIC:
+        return None
+    return fingerprint.decode('ascii'), size
+
+
+class KSubcatLexicon(Mapping):
+    ''' A read-only mapping from lemmas to lists of [post/pre, FEATS pattern]
+        pairs, backed by a memory-mapped compiled lexicon file; Can be pickled
+        (e.g. sent to worker processes): the unpickled lexicon maps the same
+        file again;
+    '''
+
+    def __init__( self, compiled_file ):
+        self.compiled_file = compiled_file
+        self._open()
+
+    def _open( self ):
+        with open( self.compiled_file, 'rb' ) as in_f:
+            self._mmap = mmap.mmap( in_f.fileno(), 0, access=mmap.ACCESS_READ )
+        magic, fingerprint, self._size = _HEADER.unpack_from( self._mmap, 0 )
+        if magic != MAGIC:
+            raise Exception('(!) Not a compiled K subcategorization lexicon: '+self.compiled_file)
+        self.fingerprint = fingerprint.decode('ascii')
+
+    def _entry( self, i ):
+        return _INDEX_ENTRY.unpack_from( self._mmap, _HEADER.size + i * _INDEX_ENTRY.size )
+
+    def _lemma_bytes( self, i ):
+        lemma_offset, lemma_len, value_offset, value_len = self._entry( i )
+        return self._mmap[lemma_offset:lemma_offset+lemma_len]
+
+    def _find( self, lemma ):
+        ''' Returns the index position of the lemma, or -1; '''
+        key = lemma.encode('utf-8')
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if self._lemma_bytes( middle ) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._size and self._lemma_bytes( low ) == key:
+            return low
+        return -1
+
+    def __getitem__( self, lemma ):
+        i = self._find( lemma )
+        if i < 0:
+            raise KeyError( lemma )
+        lemma_offset, lemma_len, value_offset, value_len = self._entry( i )
+        return json.loads( self._mmap[value_offset:value_offset+value_len].decode('utf-8') )
+
+    def __contains__( self, lemma ):
+        return self._find( lemma ) > -1
+
+    def __iter__( self ):
+        for i in range( self._size ):
+            yield self._lemma_bytes( i ).decode('utf-8')
+
+    def __len__( self ):
+        return self._size
+
+    def __repr__( self ):
+        return 'KSubcatLexicon('+repr(self.compiled_file)+', fingerprint='+self.fingerprint+')'
+
+    def __getstate__( self ):
+        return { 'compiled_file': self.compiled_file }
+
+    def __setstate__( self, state ):
+        self.compiled_file = state['compiled_file']
+        self._open()
+
+    def close( self ):
+        self._mmap.close()
+
+
+def get_compiled_file( lexicon_file ):
+    ''' Returns the name of the compiled file of the text lexicon: the file
+        next to the lexicon, if its directory is writable, and a file in the
+        temporary directory otherwise; '''
+    compiled_file = lexicon_file+COMPILED_SUFFIX
+    lexicon_dir = os.path.dirname( os.path.abspath(lexicon_file) )
+    if os.path.isfile( compiled_file ) or os.access( lexicon_dir, os.W_OK ):
+        return compiled_file
+    return os.path.join( tempfile.gettempdir(), 'ksubcat_'+file_fingerprint( lexicon_file )[:16]+COMPILED_SUFFIX )
+
+
+def load_ksubcat_lexicon( lexicon_file ):
+    ''' Loads the K subcategorization lexicon: *lexicon_file* can be either a
+        text lexicon (in the format of EstNLTK's _loadKSubcatRelations), or a
+        compiled lexicon; A text lexicon is compiled, unless its compiled file
+        already exists and is up to date;
+        Returns a KSubcatLexicon;
+    '''
+    header = _read_header( lexicon_file )
+    if header is not None:
+        return KSubcatLexicon( lexicon_file )
+    compiled_file = get_compiled_file( lexicon_file )
+    header = _read_header( compiled_file )
+    if header is None or header[0] != file_fingerprint( lexicon_file ):
+        compile_ksubcat_lexicon( lexicon_file, compiled_file )
+    return KSubcatLexicon( compiled_file )
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+#
+#     Utilities for executing MaltParser: building the commands, and parsing
+#    corpora (optionally, in shards, with concurrent MaltParser processes);
+#
+from __future__ import unicode_literals, print_function
+
+import re
+import os, os.path
+import codecs
+import shutil
+import tempfile
+
+from conll_utils import split_conll_into_shards, concatenate_files
+from process_runner import start_process, wait_process, java_gc_log_options, ProcessFailedError
+from compressed_io import plain_input_file, plain_output_file
+
+
+def make_train_command( java_loc, malt_parser_jar, model_name, train_corpus, heap_size=None, \
+                        final_options_file=None, feature_model_file=None, algorithm=None, \
+                        working_dir=None, jvm_options=None ):
+    ''' Builds the MaltParser's command (a list of arguments) for training the
+        model *model_name* on *train_corpus*; If *final_options_file* and
+        *feature_model_file* are given (e.g. from MaltOptimizer), the training
+        uses the configuration from these files, otherwise the default
+        configuration is used; *jvm_options* is a list of additional options
+        for the JVM (e.g. from java_gc_log_options());
+    '''
+    command = [java_loc]
+    if heap_size:
+        command.append( heap_size )
+    if jvm_options:
+        command.extend( jvm_options )
+    command.extend( ['-jar', malt_parser_jar, '-c', model_name] )
+    if working_dir:
+        command.extend( ['-w', working_dir] )
+    command.extend( ['-i', train_corpus, '-m', 'learn'] )
+    if final_options_file and feature_model_file:
+        command.extend( ['-f', final_options_file, '-F', feature_model_file] )
+    if algorithm:
+        command.extend( ['-a', algorithm] )
+    return command
+
+
+def make_parse_command( java_loc, malt_parser_jar, model_name, in_corpus, out_corpus, \
+                        heap_size=None, working_dir=None, jvm_options=None ):
+    ''' Builds the MaltParser's command (a list of arguments) for parsing
+        *in_corpus* with the model *model_name* and writing the results into
+        *out_corpus*;
+    '''
+    command = [java_loc]
+    if heap_size:
+        command.append( heap_size )
+    if jvm_options:
+        command.extend( jvm_options )
+    command.extend( ['-jar', malt_parser_jar, '-c', model_name] )
+    if working_dir:
+        command.extend( ['-w', working_dir] )
+    command.extend( ['-i', in_corpus, '-o', out_corpus, '-m', 'parse'] )
+    return command
+
+
+def read_feature_model_from_opt_file( opt_file ):
+    ''' Reads the name of the feature model file from an options file of
+        MaltOptimizer (e.g. phase3_optFile.txt, which has the line
+        "feature_model (-F): <file>.xml"); A relative name is resolved against
+        the directory of the options file (the working directory of
+        MaltOptimizer); Returns None if the options file names no model;
+    '''
+    in_f = codecs.open( opt_file, mode='r', encoding='utf-8' )
+    for line in in_f:
+        m = re.match( r'\s*feature_model\s*\(-F\)\s*:\s*(\S+)', line )
+        if m:
+            in_f.close()
+            return os.path.join( os.path.dirname( os.path.abspath(opt_file) ), m.group(1) )
+    in_f.close()
+    return None
+
+
+def _link_or_copy( src, dst ):
+    try:
+        os.link( src, dst )
+    except (OSError, AttributeError):
+        shutil.copyfile( src, dst )
+
+
+def parse_corpus( java_loc, malt_parser_jar, model_name, in_corpus, out_corpus, \
+                  heap_size=None, shards=1, verbose=True, run_record=None, gc_log=None, \
+                  log_file=None, timeout=None, isolated=False ):
+    ''' Parses *in_corpus* with the MaltParser's model *model_name* (the file
+        <model_name>.mco in the current directory), and writes the results into
+        *out_corpus*;
+
+        If *isolated* is set, the (unsharded) parsing runs in its own temporary
+        working directory, like the shards (see below), so that it can run
+        concurrently with other MaltParser processes using the same model;
+
+        If *shards* > 1, the input corpus is split at sentence boundaries into
+        the given number of shards, and the shards are parsed by concurrent
+        MaltParser processes; Each process gets its own working directory (with
+        a link to the model file), so that the processes do not interfere with
+        each other while unpacking the model; Finally, outputs of the shards are
+        concatenated in the original order;
+
+        Compressed (*.gz, *.xz) input and output corpora are handled via plain
+        temporary files (see compressed_io.py), as MaltParser only reads and
+        writes plain files;
+
+        If *run_record* (a process_runner.RunRecord) is given, records of the
+        parsing processes are added to it; If *gc_log* is given, the JVM's GC log
+        is written into that file (with the suffix .shard<k> for each shard);
+        If *log_file* is given, the output of MaltParser is written into that
+        file (with the suffix .shard<k> for each shard), and echoed to stdout
+        if *verbose* is set; *timeout* is the timeout (in seconds) of each
+        parsing process;
+        Raises ProcessFailedError if parsing fails or times out;
+        Returns a list of records of the parsing processes;
+    '''
+    records = []
+    if shards <= 1:
+        work_dir = None
+        if isolated:
+            work_dir = tempfile.mkdtemp( prefix='malt_parse_' )
+            _link_or_copy( os.path.abspath( model_name+'.mco' ), os.path.join(work_dir, model_name+'.mco') )
+            malt_parser_jar = os.path.abspath( malt_parser_jar )
+            gc_log   = os.path.abspath( gc_log ) if gc_log else None
+            log_file = os.path.abspath( log_file ) if log_file else None
+        jvm_options = java_gc_log_options( gc_log ) if gc_log else None
+        try:
+            with plain_input_file( in_corpus ) as plain_in_corpus, plain_output_file( out_corpus ) as plain_out_corpus:
+                if isolated:
+                    plain_in_corpus  = os.path.abspath( plain_in_corpus )
+                    plain_out_corpus = os.path.abspath( plain_out_corpus )
+                command = make_parse_command( java_loc, malt_parser_jar, model_name, plain_in_corpus, \
+                                              plain_out_corpus, heap_size=heap_size, working_dir=work_dir, \
+                                              jvm_options=jvm_options )
+                if verbose:
+                    print ("  Executing:  "+' '.join(command))
+                handle = start_process( command, stage='parse', cwd=work_dir, gc_log=gc_log, log_file=log_file, \
+                                        echo=verbose, timeout=timeout )
+                try:
+                    records.append( wait_process( handle ) )
+                except ProcessFailedError as error:
+                    records.append( error.record )
+                    _add_records( run_record, records )
+                    raise
+        finally:
+            if work_dir:
+                shutil.rmtree( work_dir, ignore_errors=True )
+    else:
+        model_file = os.path.abspath( model_name+'.mco' )
+        malt_parser_jar = os.path.abspath( malt_parser_jar )
+        temp_dir = tempfile.mkdtemp( prefix='malt_shards_' )
+        try:
+            shard_files = split_conll_into_shards( in_corpus, shards, temp_dir )
+            if verbose:
+                print ('  Parsing '+in_corpus+' in '+str(len(shard_files))+' shards ...')
+            handles   = []
+            out_files = []
+            for shard_id, shard_file in enumerate( shard_files ):
+                shard_dir = os.path.join( temp_dir, 'w'+str(shard_id) )
+                os.makedirs( shard_dir )
+                _link_or_copy( model_file, os.path.join(shard_dir, model_name+'.mco') )
+                shard_out = shard_file+'.parsed'
+                out_files.append( shard_out )
+                shard_gc_log = os.path.abspath( gc_log )+'.shard'+str(shard_id) if gc_log else None
+                shard_log    = os.path.abspath( log_file )+'.shard'+str(shard_id) if log_file else None
+                jvm_options  = java_gc_log_options( shard_gc_log ) if shard_gc_log else None
+                command = make_parse_command( java_loc, malt_parser_jar, model_name, shard_file, \
+                                              shard_out, heap_size=heap_size, working_dir=shard_dir, \
+                                              jvm_options=jvm_options )
+                if verbose:
+                    print ("  Executing:  "+' '.join(command))
+                handles.append( start_process( command, stage='parse_shard'+str(shard_id), \
+                                               cwd=shard_dir, gc_log=shard_gc_log, log_file=shard_log, \
+                                               echo=verbose, timeout=timeout ) )
+            # Wait for all the shards (so that none is left running), and only
+            # then report the failures
+            errors = []
+            for handle in handles:
+                try:
+                    records.append( wait_process( handle ) )
+                except ProcessFailedError as error:
+                    records.append( error.record )
+                    errors.append( error )
+            if errors:
+                _add_records( run_record, records )
+                raise ProcessFailedError( '(!) Parsing failed for shard(s): '+\
+                                          ', '.join([str(e) for e in errors]), errors[0].record )
+            concatenate_files( out_files, out_corpus )
+        finally:
+            shutil.rmtree( temp_dir, ignore_errors=True )
+    _add_records( run_record, records )
+    return records
+
+
+def _add_records( run_record, records ):
+    if run_record is not None:
+        for record in records:
+            run_record.add( record )
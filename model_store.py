@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+#
+#     Content-addressed store of trained MaltParser models (*.mco files);
+#
+#     A model is stored under a key, which is a hash of all the inputs that
+#    determine the result of the training: the training corpus, the final
+#    configuration file, the feature model file, the algorithm, the MaltParser's
+#    jar file and the name of the model. If the same configuration is trained
+#    again, the model can be fetched from the store instead of being retrained.
+#
+#     The total size of the store is limited: once the limit is exceeded, least
+#    recently used models are evicted.
+#
+from __future__ import unicode_literals, print_function
+
+import re
+import os, os.path
+import shutil
+import hashlib
+
+# Default maximum size of the store (in bytes)
+DEFAULT_STORE_SIZE = 20 * 1024**3
+
+
+def parse_size( size_str ):
+    ''' Converts a size string (such as '500M', '20G' or '1024') into bytes; '''
+    m = re.match(r'^\s*([0-9.]+)\s*([KMGT]?)B?\s*$', str(size_str), re.IGNORECASE)
+    if not m:
+        raise Exception('(!) Unable to parse size: '+str(size_str))
+    multipliers = { '':1, 'K':1024, 'M':1024**2, 'G':1024**3, 'T':1024**4 }
+    return int( float(m.group(1)) * multipliers[m.group(2).upper()] )
+
+
+def _update_hash_with_file( hasher, file_name, block_size=1024*1024 ):
+    in_f = open(file_name, 'rb')
+    try:
+        block = in_f.read(block_size)
+        while block:
+            hasher.update(block)
+            block = in_f.read(block_size)
+    finally:
+        in_f.close()
+
+
+def file_fingerprint( file_name ):
+    ''' Returns a hash (a hex string) of the contents of the given file; '''
+    hasher = hashlib.sha1()
+    _update_hash_with_file( hasher, file_name )
+    return hasher.hexdigest()
+
+
+def fingerprint_training_inputs( train_corpus, maltparser_jar, model_name, \
+                                 final_options_file=None, feature_model_file=None, \
+                                 algorithm=None ):
+    ''' Computes a hash key (a hex string) of the inputs of a MaltParser's training run;
+        Contents of the files are hashed (not the file names), so moving or renaming
+        a file does not invalidate the key;
+        Note: the model name is a part of the key, because MaltParser stores the
+        configuration inside the *.mco file under the name of the model;
+    '''
+    hasher = hashlib.sha1()
+    files = [ ('train_corpus', train_corpus), ('maltparser_jar', maltparser_jar), \
+              ('final_options', final_options_file), ('feature_model', feature_model_file) ]
+    for role, file_name in files:
+        hasher.update( (role+'\n').encode('utf-8') )
+        if file_name:
+            _update_hash_with_file( hasher, file_name )
+        else:
+            hasher.update( b'<None>' )
+    hasher.update( ('algorithm\n'+str(algorithm)+'\n').encode('utf-8') )
+    hasher.update( ('model_name\n'+str(model_name)+'\n').encode('utf-8') )
+    return hasher.hexdigest()
+
+
+class ModelStore(object):
+    ''' A directory of MaltParser models keyed by hashes of the training inputs,
+        with a size limit and least-recently-used eviction;
+        Recency of a model is tracked via the modification time of its file:
+        the time is updated each time the model is fetched from the store;
+    '''
+
+    store_dir = None
+    max_size  = DEFAULT_STORE_SIZE
+
+    def __init__( self, store_dir, max_size=DEFAULT_STORE_SIZE ):
+        self.store_dir = store_dir
+        self.max_size  = max_size
+        if not os.path.isdir(self.store_dir):
+            os.makedirs(self.store_dir)
+
+    def _model_path( self, key ):
+        return os.path.join( self.store_dir, key+'.mco' )
+
+    def contains( self, key ):
+        return os.path.isfile( self._model_path(key) )
+
+    def fetch( self, key, target_file ):
+        ''' Copies the model with the given key into *target_file*;
+            Returns True if the model was found from the store, and False otherwise;
+        '''
+        model_path = self._model_path(key)
+        if not os.path.isfile(model_path):
+            return False
+        shutil.copyfile( model_path, target_file )
+        # Mark the model as recently used
+        os.utime( model_path, None )
+        return True
+
+    def store( self, key, model_file ):
+        ''' Copies *model_file* into the store under the given key, and evicts
+            least recently used models if the size limit is exceeded;
+        '''
+        model_path = self._model_path(key)
+        temp_path  = model_path+'.tmp'
+        shutil.copyfile( model_file, temp_path )
+        os.replace( temp_path, model_path )
+        self.evict( keep=key )
+
+    def entries( self ):
+        ''' Returns a list of (key, size, last_used) of the stored models, the
+            most recently used first;
+        '''
+        results = []
+        for file_name in os.listdir(self.store_dir):
+            if file_name.endswith('.mco'):
+                stat = os.stat( os.path.join(self.store_dir, file_name) )
+                results.append( (file_name[:-4], stat.st_size, stat.st_mtime) )
+        return sorted( results, key=lambda x : x[2], reverse=True )
+
+    def evict( self, keep=None ):
+        ''' Removes least recently used models until the total size of the store
+            fits into the size limit; The model with the key *keep* is never
+            removed;
+            Returns a list of keys of the removed models;
+        '''
+        removed = []
+        entries = self.entries()
+        total_size = sum( [size for (key, size, last_used) in entries] )
+        for key, size, last_used in reversed( entries ):
+            if total_size <= self.max_size:
+                break
+            if key == keep:
+                continue
+            os.unlink( self._model_path(key) )
+            total_size -= size
+            removed.append( key )
+        return removed
+
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+#
+#     Runner of declarative pipelines (see pipeline.json): each stage is an
+#    external command along with the files (or directories) it consumes and
+#    produces; a stage depends on the stages producing its inputs (and on the
+#    stages listed in its 'after');
+#
+#     A stage is skipped if its command and the contents of its inputs are
+#    unchanged since its last successful run, and its outputs are still the
+#    same as produced by that run (content hashes are kept in a state file);
+#    so an interrupted or failed pipeline resumes from the failed stages,
+#    and stages whose inputs were re-produced with identical contents are
+#    not re-run. Independent stages (e.g. the alignments of the three UD
+#    splits) are run concurrently.
+#
+#     The pipeline file is a JSON object with the keys 'variables' (a dict of
+#    default values of the variables) and 'stages' (a list of stages: dicts
+#    with keys 'name', 'command', 'inputs', 'outputs', and optionally 'after'
+#    and 'cwd'); In the strings of the stages, {name} is replaced with the
+#    value of the variable, and {name:abs} with its absolute path. Builtin
+#    variables: {python} (the current Python executable), {scripts} (the
+#    directory of the scripts) and {root} (the working directory of the
+#    pipeline).
+#
+from __future__ import unicode_literals, print_function
+
+import re
+import sys
+import os, os.path
+import codecs, json
+import hashlib
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from timeit import default_timer as timer
+
+from model_store import file_fingerprint
+from process_runner import run_process, ProcessFailedError, terminate_on_interrupt
+
+SCRIPTS_DIR = os.path.dirname( os.path.abspath(__file__) )
+
+DEFAULT_PIPELINE   = os.path.join( SCRIPTS_DIR, 'pipeline.json' )
+DEFAULT_STATE_FILE = 'pipeline.state.json'
+DEFAULT_LOG_DIR    = 'pipeline_logs'
+
+# Statuses of the stages after a run
+STATUS_DONE    = 'done'
+STATUS_SKIPPED = 'skipped'
+STATUS_FAILED  = 'failed'
+STATUS_BLOCKED = 'blocked'
+
+_VARIABLE = re.compile(r'\{(\w+)(?::(abs))?\}')
+
+
+# =============================================================================
+#    Loading pipelines
+# =============================================================================
+
+def substitute_variables( value, variables ):
+    ''' Replaces {name} and {name:abs} in the given string with the value (or
+        the absolute path) of the variable; '''
+    def _replace( m ):
+        if m.group(1) not in variables:
+            raise Exception('(!) Undefined variable in the pipeline: '+m.group(0))
+        result = str( variables[m.group(1)] )
+        return os.path.abspath( result ) if m.group(2) else result
+    return _VARIABLE.sub( _replace, value )
+
+
+def load_pipeline( pipeline_file, variables=None ):
+    ''' Loads stages from the given pipeline file, substituting the variables
+        (the defaults from the file, overridden by the given *variables*);
+        Returns a list of stages (dicts with keys 'name', 'command', 'inputs',
+        'outputs', 'after' and 'cwd') in the order of the file;
+    '''
+    in_f = codecs.open( pipeline_file, mode='r', encoding='utf-8' )
+    pipeline = json.load( in_f )
+    in_f.close()
+    values = { 'python': sys.executable, 'root': os.getcwd(), 'scripts': SCRIPTS_DIR }
+    values.update( pipeline.get('variables', {}) )
+    if variables:
+        values.update( variables )
+    stages = []
+    names = set()
+    for stage_def in pipeline['stages']:
+        for key in ['name', 'command']:
+            if key not in stage_def:
+                raise Exception('(!) Stage without "'+key+'" in '+pipeline_file+': '+str(stage_def))
+        if stage_def['name'] in names:
+            raise Exception('(!) Duplicate stage name in '+pipeline_file+': '+stage_def['name'])
+        names.add( stage_def['name'] )
+        cwd = stage_def.get('cwd')
+        stages.append( { 'name': stage_def['name'], \
+                         'command': [ substitute_variables( arg, values ) for arg in stage_def['command'] ], \
+                         'inputs':  [ os.path.normpath( substitute_variables( f, values ) ) for f in stage_def.get('inputs', []) ], \
+                         'outputs': [ os.path.normpath( substitute_variables( f, values ) ) for f in stage_def.get('outputs', []) ], \
+                         'after':   list( stage_def.get('after', []) ), \
+                         'cwd':     substitute_variables( cwd, values ) if cwd else None } )
+    return stages
+
+
+def stage_dependencies( stages ):
+    ''' Returns a dict mapping the name of each stage to the set of names of
+        the stages it depends on: the stages producing its inputs, and the
+        stages listed in its 'after'; Raises an exception if an output is
+        produced by several stages, or if the dependencies form a cycle;
+    '''
+    producers = {}
+    for stage in stages:
+        for output in stage['outputs']:
+            if output in producers:
+                raise Exception('(!) File '+output+' is produced by both '+producers[output]+' and '+stage['name'])
+            producers[output] = stage['name']
+    names = set( [stage['name'] for stage in stages] )
+    dependencies = {}
+    for stage in stages:
+        deps = set( [producers[f] for f in stage['inputs'] if f in producers] )
+        for name in stage['after']:
+            if name not in names:
+                raise Exception('(!) Unknown stage in "after" of '+stage['name']+': '+name)
+            deps.add( name )
+        deps.discard( stage['name'] )
+        dependencies[stage['name']] = deps
+    # Check for cycles
+    visited = {}
+    def _visit( name, path ):
+        if visited.get(name) == 'done':
+            return
+        if visited.get(name) == 'active':
+            raise Exception('(!) Cycle in the pipeline: '+' -> '.join( path+[name] ))
+        visited[name] = 'active'
+        for dep in sorted( dependencies[name] ):
+            _visit( dep, path+[name] )
+        visited[name] = 'done'
+    for stage in stages:
+        _visit( stage['name'], [] )
+    return dependencies
+
+
+def select_stages( stages, dependencies, targets ):
+    ''' Returns the names of the given target stages along with all the stages
+        they (transitively) depend on; '''
+    selected = set()
+    pending = list( targets )
+    names = set( [stage['name'] for stage in stages] )
+    while pending:
+        name = pending.pop()
+        if name not in names:
+            raise Exception('(!) Unknown stage: '+name)
+        if name not in selected:
+            selected.add( name )
+            pending.extend( dependencies[name] )
+    return selected
+
+
+# =============================================================================
+#    Content hashes and the state of the pipeline
+# =============================================================================
+
+class PipelineState(object):
+    ''' The state of the pipeline, saved in a JSON file: for each stage, the
+        key (hash of the command and of the inputs) and the fingerprints of
+        the outputs of its last successful run, along with the status of its
+        last run; File fingerprints are memoized by file size and
+        modification time, so that unchanged files are not re-hashed;
+    '''
+
+    def __init__( self, state_file=DEFAULT_STATE_FILE ):
+        self.state_file = state_file
+        self.stages = {}
+        self.file_hashes = {}
+        self.lock = threading.Lock()
+        if os.path.isfile( state_file ):
+            in_f = codecs.open( state_file, mode='r', encoding='utf-8' )
+            state = json.load( in_f )
+            in_f.close()
+            self.stages = state.get('stages', {})
+            self.file_hashes = state.get('file_hashes', {})
+
+    def save( self ):
+        with self.lock:
+            state = { 'stages': self.stages, 'file_hashes': self.file_hashes }
+            temp_file = self.state_file+'.tmp'
+            o_f = codecs.open( temp_file, mode='w', encoding='utf-8' )
+            json.dump( state, o_f, indent=1, sort_keys=True )
+            o_f.close()
+            os.replace( temp_file, self.state_file )
+
+    def file_hash( self, file_name ):
+        ''' Returns the fingerprint of the file, re-hashing it only if its size
+            or modification time has changed; '''
+        stat = os.stat( file_name )
+        path = os.path.abspath( file_name )
+        with self.lock:
+            memo = self.file_hashes.get( path )
+        if memo and memo[0] == stat.st_size and memo[1] == stat.st_mtime_ns:
+            return memo[2]
+        fingerprint = file_fingerprint( file_name )
+        with self.lock:
+            self.file_hashes[path] = [ stat.st_size, stat.st_mtime_ns, fingerprint ]
+        return fingerprint
+
+    def path_hash( self, path ):
+        ''' Returns the fingerprint of a file, or of a directory (hash of the
+            relative names and the fingerprints of all the files in it), or
+            None if the path does not exist; '''
+        if os.path.isfile( path ):
+            return self.file_hash( path )
+        if not os.path.isdir( path ):
+            return None
+        hasher = hashlib.sha1()
+        for dir_name, sub_dirs, file_names in os.walk( path ):
+            sub_dirs.sort()
+            for file_name in sorted( file_names ):
+                full_name = os.path.join( dir_name, file_name )
+                hasher.update( (os.path.relpath( full_name, path ).replace(os.sep, '/')+'\n').encode('utf-8') )
+                hasher.update( (self.file_hash( full_name )+'\n').encode('utf-8') )
+        return hasher.hexdigest()
+
+    def stage_key( self, stage ):
+        ''' Computes the key of the stage: a hash of its command, its working
+            directory and the contents of its inputs; Returns None if some
+            input is missing; '''
+        hasher = hashlib.sha1()
+        hasher.update( json.dumps( [stage['command'], stage['cwd']] ).encode('utf-8') )
+        for input_file in stage['inputs']:
+            fingerprint = self.path_hash( input_file )
+            if fingerprint is None:
+                return None
+            hasher.update( ('\n'+input_file+'\n'+fingerprint).encode('utf-8') )
+        return hasher.hexdigest()
+
+    def is_up_to_date( self, stage, key ):
+        ''' Whether the stage has successfully run with the given key, and its
+            outputs are unchanged since; '''
+        with self.lock:
+            record = self.stages.get( stage['name'] )
+        if not record or record.get('status') not in [STATUS_DONE, STATUS_SKIPPED] or record.get('key') != key:
+            return False
+        for output in stage['outputs']:
+            if self.path_hash( output ) != record['outputs'].get( output ):
+                return False
+        return True
+
+    def record( self, stage, status, key=None, wall_time=None, error=None ):
+        with self.lock:
+            record = dict( self.stages.get( stage['name'], {} ) )
+        record['status']   = status
+        record['finished'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        if status == STATUS_DONE:
+            record['key'] = key
+            record['outputs'] = dict( [(output, self.path_hash( output )) for output in stage['outputs']] )
+            record['wall_time'] = wall_time
+        if error:
+            record['error'] = error
+        else:
+            record.pop( 'error', None )
+        with self.lock:
+            self.stages[stage['name']] = record
+
+
+# =============================================================================
+#    Running the pipeline
+# =============================================================================
+
+def _report( status, name, message=None ):
+    print( (' ['+status+']').ljust(12)+name+('  ('+message+')' if message else '') )
+    sys.stdout.flush()
+
+
+def _execute_stage( stage, state, log_dir, force, echo ):
+    ''' Runs the stage, unless it is up to date; Returns a pair (status, message); '''
+    key = state.stage_key( stage )
+    if key is None:
+        missing = [ f for f in stage['inputs'] if not os.path.exists(f) ]
+        state.record( stage, STATUS_FAILED, error='missing inputs: '+', '.join(missing) )
+        return STATUS_FAILED, 'missing inputs: '+', '.join(missing)
+    if not force and state.is_up_to_date( stage, key ):
+        state.record( stage, STATUS_SKIPPED )
+        return STATUS_SKIPPED, 'up to date'
+    for output in stage['outputs']:
+        out_dir = os.path.dirname( output )
+        if out_dir and not os.path.isdir( out_dir ):
+            os.makedirs( out_dir )
+    log_file = os.path.abspath( os.path.join( log_dir, stage['name']+'.log' ) )
+    start_time = timer()
+    try:
+        run_process( stage['command'], stage=stage['name'], cwd=stage['cwd'], log_file=log_file, echo=echo )
+    except ProcessFailedError as error:
+        state.record( stage, STATUS_FAILED, error=str(error) )
+        return STATUS_FAILED, str(error)+' (see '+log_file+')'
+    except OSError as error:
+        state.record( stage, STATUS_FAILED, error=str(error) )
+        return STATUS_FAILED, str(error)
+    missing = [ f for f in stage['outputs'] if not os.path.exists(f) ]
+    if missing:
+        state.record( stage, STATUS_FAILED, error='outputs not produced: '+', '.join(missing) )
+        return STATUS_FAILED, 'outputs not produced: '+', '.join(missing)+' (see '+log_file+')'
+    wall_time = timer() - start_time
+    state.record( stage, STATUS_DONE, key=key, wall_time=wall_time )
+    return STATUS_DONE, '{:.1f}s'.format( wall_time )
+
+
+def run_pipeline( stages, state, jobs=1, log_dir=DEFAULT_LOG_DIR, targets=None, force=None, keep_going=False ):
+    ''' Runs the stages of the pipeline (only the *targets* and the stages
+        they depend on, if *targets* is given): up to *jobs* independent
+        stages are run concurrently, and up-to-date stages are skipped;
+        Stages listed in *force* are re-run even if they are up to date;
+        After a failure, no new stages are started, unless *keep_going* is
+        set (then only the stages depending on the failed ones are blocked);
+        The state is saved after each stage;
+        Returns a dict mapping the names of the stages to their statuses;
+    '''
+    dependencies = stage_dependencies( stages )
+    selected = select_stages( stages, dependencies, targets ) if targets else \
+               set( [stage['name'] for stage in stages] )
+    force = set( force or [] )
+    if not os.path.isdir( log_dir ):
+        os.makedirs( log_dir )
+    statuses = {}
+    pending  = [ stage for stage in stages if stage['name'] in selected ]
+    running  = {}
+    failed   = False
+    executor = ThreadPoolExecutor( max_workers=jobs )
+    try:
+        with terminate_on_interrupt():
+            while pending or running:
+                # Block the stages depending on failed stages
+                for stage in list( pending ):
+                    if any( [statuses.get(dep) in [STATUS_FAILED, STATUS_BLOCKED] for dep in dependencies[stage['name']]] ):
+                        statuses[stage['name']] = STATUS_BLOCKED
+                        pending.remove( stage )
+                        _report( STATUS_BLOCKED, stage['name'] )
+                # Start the stages whose dependencies have completed
+                if not failed or keep_going:
+                    for stage in list( pending ):
+                        if len(running) >= jobs:
+                            break
+                        if all( [statuses.get(dep) in [STATUS_DONE, STATUS_SKIPPED] or dep not in selected \
+                                 for dep in dependencies[stage['name']]] ):
+                            pending.remove( stage )
+                            echo = (jobs == 1)
+                            running[ executor.submit( _execute_stage, stage, state, log_dir, \
+                                                      stage['name'] in force, echo ) ] = stage
+                            _report( 'started', stage['name'] )
+                if not running:
+                    break
+                done, not_done = wait( list(running.keys()), return_when=FIRST_COMPLETED )
+                for future in done:
+                    stage = running.pop( future )
+                    status, message = future.result()
+                    statuses[stage['name']] = status
+                    if status == STATUS_FAILED:
+                        failed = True
+                    state.save()
+                    _report( status, stage['name'], message )
+    finally:
+        executor.shutdown( wait=True )
+        state.save()
+    for stage in pending:
+        statuses.setdefault( stage['name'], STATUS_BLOCKED )
+    return statuses
+
+
+def format_plan( stages, state, targets=None, force=None ):
+    ''' Describes what a run of the pipeline would do (without running it):
+        for each selected stage, whether it is up to date, would be run, or
+        depends on stages that would be run; Returns a list of strings;
+    '''
+    dependencies = stage_dependencies( stages )
+    selected = select_stages( stages, dependencies, targets ) if targets else \
+               set( [stage['name'] for stage in stages] )
+    force = set( force or [] )
+    will_run = set()
+    lines = []
+    for stage in stages:
+        if stage['name'] not in selected:
+            continue
+        upstream = [ dep for dep in dependencies[stage['name']] if dep in will_run ]
+        if upstream:
+            status = 'pending (after: '+', '.join( sorted(upstream) )+')'
+            will_run.add( stage['name'] )
+        else:
+            key = state.stage_key( stage )
+            if key is None:
+                status = 'missing inputs: '+', '.join( [f for f in stage['inputs'] if not os.path.exists(f)] )
+                will_run.add( stage['name'] )
+            elif stage['name'] not in force and state.is_up_to_date( stage, key ):
+                status = 'up to date'
+            else:
+                status = 'run'
+                will_run.add( stage['name'] )
+        lines.append( ' '+stage['name'].ljust(20)+status )
+        lines.append( '    '+' '.join( stage['command'] ) )
+    return lines
@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+#
+#     Shared runner for external processes (Java stages: learn, parse) and for
+#    in-process stages (evaluation);
+#
+#     For each stage, records the wall time, the CPU time (user + system) and
+#    the peak resident set size (RSS), and optionally summarizes the garbage
+#    collection log of the JVM. Records of all stages of a run can be saved
+#    into a JSON file, e.g. for finding out which stage is the bottleneck, and
+#    whether the Java heap size is too large or too small.
+#
+#     Processes can be given a timeout, their output can be streamed into a
+#    log file (and echoed to stdout), non-zero exit codes are raised as
+#    ProcessFailedError, and child processes are terminated if the run is
+#    cancelled (Ctrl-C);
+#
+#     Note: resource usage of child processes is obtained via os.wait4, which
+#    is not available on Windows; there, only the wall time is recorded;
+#
+from __future__ import unicode_literals, print_function
+
+import re
+import sys
+import os, os.path
+import codecs, json
+import signal
+import subprocess
+import threading
+import time
+
+from contextlib import contextmanager
+from timeit import default_timer as timer
+
+try:
+    import resource
+except ImportError:
+    # e.g. on Windows
+    resource = None
+
+
+def _rss_to_bytes( ru_maxrss ):
+    # ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+    return ru_maxrss if sys.platform == 'darwin' else ru_maxrss * 1024
+
+
+# =============================================================================
+#    Running external processes
+# =============================================================================
+
+class ProcessFailedError(Exception):
+    ''' Raised if an external process exits with a non-zero code, or if it is
+        killed after exceeding its timeout; *record* is the record of the
+        process (see wait_process());
+    '''
+
+    def __init__( self, message, record=None ):
+        Exception.__init__( self, message )
+        self.record = record
+
+
+# Processes that have been started, but not yet waited for; these are
+# terminated on cancellation (see terminate_all_processes())
+_active_handles = set()
+_active_lock    = threading.Lock()
+
+# Seconds given to a process for exiting after SIGTERM, before it is killed
+TERMINATE_GRACE_PERIOD = 5.0
+
+# Interval (in seconds) of polling for the exit of a process, where the exit
+# cannot be waited for without reaping the process (no os.waitid)
+POLL_INTERVAL = 0.05
+
+
+class ProcessHandle(object):
+    ''' A started process along with the information required for measuring it; '''
+
+    def __init__( self, process, command, stage, start_time, gc_log=None ):
+        self.process    = process
+        self.command    = command
+        self.stage      = stage
+        self.start_time = start_time
+        self.gc_log     = gc_log
+        self.timeout    = None
+        self.timed_out  = False
+        self.log_file   = None
+        self.rusage     = None
+        self._timer     = None
+        self._tee       = None
+        # Signals are sent and the process is reaped under this lock: once
+        # the process is reaped, its pid may be reused, so no more signals
+        # may be sent to it
+        self._lock      = threading.Lock()
+        self._reaped    = False
+
+
+def _tee_output( handle, log_file, echo ):
+    ''' Copies the output of the process line by line into *log_file*, and
+        (if *echo* is set) into sys.stdout, prefixed with the name of the stage;
+    '''
+    prefix = '['+str(handle.stage)+'] ' if handle.stage else ''
+    log_f  = open( log_file, 'ab' )
+    try:
+        log_f.write( ('# '+' '.join(handle.command)+'\n').encode('utf-8') )
+        for line in iter( handle.process.stdout.readline, b'' ):
+            log_f.write( line )
+            log_f.flush()
+            if echo:
+                sys.stdout.write( prefix+line.decode('utf-8', 'replace') )
+                sys.stdout.flush()
+    finally:
+        handle.process.stdout.close()
+        log_f.close()
+
+
+def _send_signal( handle, kill=False ):
+    ''' Terminates (or kills) the process along with its own child processes
+        (e.g. a JVM started by a wrapper script): on POSIX, each process is
+        started in a new session, so the signal is sent to its process group;
+        Nothing is sent if the process has already been reaped;
+    '''
+    with handle._lock:
+        process = handle.process
+        if handle._reaped or process.returncode is not None:
+            return
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg( process.pid, signal.SIGKILL if kill else signal.SIGTERM )
+            elif kill:
+                process.kill()
+            else:
+                process.terminate()
+        except OSError:
+            pass
+
+
+def _terminate( handle, grace_period=TERMINATE_GRACE_PERIOD ):
+    ''' Sends SIGTERM to the process, and kills it, if it is still running
+        after *grace_period* seconds; Does not wait for the process;
+    '''
+    _send_signal( handle )
+    def _kill():
+        _send_signal( handle, kill=True )
+    killer = threading.Timer( grace_period, _kill )
+    killer.daemon = True
+    killer.start()
+
+
+def _on_timeout( handle ):
+    handle.timed_out = True
+    _terminate( handle )
+
+
+def _try_reap( handle ):
+    ''' Reaps the process of the handle, if it has exited: sets its exit code
+        (handle.process.returncode) and its resource usage (handle.rusage, if
+        os.wait4 is available); The process is reaped under the lock of the
+        handle, so that no signal is sent to the pid once it may be reused;
+        Returns True if the process has been reaped;
+    '''
+    with handle._lock:
+        if handle._reaped:
+            return True
+        process = handle.process
+        if hasattr(os, 'wait4'):
+            try:
+                pid, status, rusage = os.wait4( process.pid, os.WNOHANG )
+            except ChildProcessError:
+                # already reaped by the Popen object
+                process.wait()
+            else:
+                if pid == 0:
+                    return False
+                if os.WIFSIGNALED(status):
+                    process.returncode = -os.WTERMSIG(status)
+                else:
+                    process.returncode = os.WEXITSTATUS(status)
+                handle.rusage = rusage
+        elif process.poll() is None:
+            return False
+        handle._reaped = True
+        return True
+
+
+def _wait_for_exit( handle, timeout=None ):
+    ''' Waits until the process of the handle has exited (at most *timeout*
+        seconds, if given); Where possible (os.waitid), the process is not
+        reaped, otherwise it is reaped (see _try_reap());
+        Returns True if the process has exited;
+    '''
+    if timeout is None and hasattr(os, 'waitid'):
+        try:
+            os.waitid( os.P_PID, handle.process.pid, os.WEXITED | os.WNOWAIT )
+        except ChildProcessError:
+            # already reaped
+            pass
+        return True
+    deadline = timer() + timeout if timeout is not None else None
+    while not _try_reap( handle ):
+        if deadline is not None and timer() >= deadline:
+            return False
+        time.sleep( POLL_INTERVAL )
+    return True
+
+
+def start_process( command, stage=None, cwd=None, stdout=None, stderr=None, gc_log=None, \
+                   log_file=None, echo=True, timeout=None ):
+    ''' Starts the given command (a list of arguments) without waiting for it
+        to finish; Use wait_process() for waiting and obtaining the record of
+        the process;
+        *gc_log* is the name of the JVM's GC log file, if the command was
+        created with java_gc_log_options();
+        If *log_file* is given, stdout and stderr of the process are appended
+        to that file as they are produced, and (if *echo* is set) are also
+        streamed to sys.stdout; Otherwise, *stdout* and *stderr* are passed
+        on to subprocess.Popen;
+        If *timeout* (in seconds) is given, the process is terminated once the
+        timeout is exceeded, and wait_process() raises ProcessFailedError;
+    '''
+    if log_file:
+        stdout, stderr = subprocess.PIPE, subprocess.STDOUT
+    start_time = timer()
+    # A new session (on POSIX) allows terminating the whole process group,
+    # and keeps Ctrl-C in the terminal from reaching the children directly:
+    # they are terminated by the runner instead (see terminate_all_processes())
+    process = subprocess.Popen( command, cwd=cwd, stdout=stdout, stderr=stderr, \
+                                start_new_session=hasattr(os, 'killpg') )
+    handle = ProcessHandle( process, command, stage, start_time, gc_log=gc_log )
+    with _active_lock:
+        _active_handles.add( handle )
+    if log_file:
+        handle.log_file = log_file
+        handle._tee = threading.Thread( target=_tee_output, args=(handle, log_file, echo) )
+        handle._tee.daemon = True
+        handle._tee.start()
+    if timeout:
+        handle.timeout = timeout
+        handle._timer  = threading.Timer( timeout, _on_timeout, [handle] )
+        handle._timer.daemon = True
+        handle._timer.start()
+    return handle
+
+
+def wait_process( handle, check=True ):
+    ''' Waits for the started process to finish, and returns its record: a dict
+        with keys 'stage', 'command', 'return_code', 'wall_time', 'user_time',
+        'sys_time', 'cpu_time' (in seconds) and 'peak_rss' (in bytes), 'timed_out',
+        and 'gc' (the summary of the GC log, if the GC log was used);
+        Resource usage values are None if os.wait4 is not available;
+        If the process timed out, or if *check* is set and the process exited
+        with a non-zero code, raises ProcessFailedError;
+        If the waiting is interrupted (Ctrl-C), all active processes are
+        terminated before the KeyboardInterrupt is passed on;
+    '''
+    record = { 'stage': handle.stage, 'command': ' '.join(handle.command), \
+               'user_time': None, 'sys_time': None, 'cpu_time': None, 'peak_rss': None }
+    process = handle.process
+    try:
+        _wait_for_exit( handle )
+        # The timeout must not fire once the process has exited
+        if handle._timer is not None:
+            handle._timer.cancel()
+        _try_reap( handle )
+        return_code = process.returncode
+        record['wall_time'] = timer() - handle.start_time
+        rusage = handle.rusage
+        if rusage is not None:
+            record['user_time'] = rusage.ru_utime
+            record['sys_time']  = rusage.ru_stime
+            record['cpu_time']  = rusage.ru_utime + rusage.ru_stime
+            record['peak_rss']  = _rss_to_bytes( rusage.ru_maxrss )
+    except KeyboardInterrupt:
+        terminate_all_processes()
+        raise
+    finally:
+        if handle._timer is not None:
+            handle._timer.cancel()
+        if handle._tee is not None:
+            handle._tee.join()
+        with _active_lock:
+            _active_handles.discard( handle )
+    record['return_code'] = return_code
+    record['timed_out']   = handle.timed_out
+    if handle.log_file:
+        record['log_file'] = handle.log_file
+    if handle.gc_log:
+        record['gc'] = parse_gc_log( handle.gc_log )
+    if handle.timed_out:
+        raise ProcessFailedError( '(!) Stage '+str(handle.stage)+' exceeded the timeout of '+\
+                                  str(handle.timeout)+'s and was terminated: '+record['command'], record )
+    if check and return_code != 0:
+        raise ProcessFailedError( '(!) Stage '+str(handle.stage)+' failed with exit code '+\
+                                  str(return_code)+': '+record['command'], record )
+    return record
+
+
+def run_process( command, stage=None, cwd=None, stdout=None, stderr=None, gc_log=None, \
+                 log_file=None, echo=True, timeout=None, check=True ):
+    ''' Executes the given command (a list of arguments), waits for it to finish,
+        and returns the record of the process (see start_process() and
+        wait_process() for details);
+    '''
+    handle = start_process( command, stage=stage, cwd=cwd, stdout=stdout, stderr=stderr, \
+                            gc_log=gc_log, log_file=log_file, echo=echo, timeout=timeout )
+    return wait_process( handle, check=check )
+
+
+def terminate_all_processes( grace_period=TERMINATE_GRACE_PERIOD ):
+    ''' Terminates all processes started by start_process() that are still
+        running, and waits (at most *grace_period* seconds) for them to exit;
+        Processes that do not exit in time are killed;
+    '''
+    with _active_lock:
+        handles = list( _active_handles )
+    for handle in handles:
+        _send_signal( handle )
+    deadline = timer() + grace_period
+    for handle in handles:
+        if not _wait_for_exit( handle, timeout=max(0.0, deadline - timer()) ):
+            _send_signal( handle, kill=True )
+
+
+@contextmanager
+def terminate_on_interrupt():
+    ''' Terminates all started processes if the enclosed block is interrupted
+        (Ctrl-C), e.g. while the main thread waits for worker threads:
+            with terminate_on_interrupt():
+                executor.shutdown( wait=True )
+    '''
+    try:
+        yield
+    except KeyboardInterrupt:
+        print('\n (!) Interrupted, terminating child processes ...', file=sys.stderr)
+        terminate_all_processes()
+        raise
+
+
+# =============================================================================
+#    JVM garbage collection logs
+# =============================================================================
+
+def java_gc_log_options( gc_log_file ):
+    ''' Returns JVM options for writing the GC log into *gc_log_file*;
+        (-Xloggc is accepted both by Java 8 and by newer JVMs, where it is
+         mapped to the unified logging -Xlog:gc:<file>)
+    '''
+    return ['-verbose:gc', '-Xloggc:'+gc_log_file]
+
+
+_unit_to_mb = { 'K': 1.0/1024, 'M': 1.0, 'G': 1024.0 }
+
+# Java 8:          [GC (Allocation Failure)  65536K->1234K(251392K), 0.0123456 secs]
+_pat_gc_legacy  = re.compile(r'(\d+)K->(\d+)K\((\d+)K\),\s+([0-9.]+)\s+secs\]')
+# Unified logging: [0.123s][info][gc] GC(0) Pause Young (Normal) (G1 Evacuation Pause) 24M->3M(256M) 3.456ms
+_pat_gc_unified = re.compile(r'GC\(\d+\)\s+(Pause.*?)\s+(\d+)([KMG])->(\d+)([KMG])\((\d+)([KMG])\)\s+([0-9.]+)ms')
+
+
+def parse_gc_log( gc_log_file ):
+    ''' Summarizes the JVM's GC log (Java 8 format or unified logging format);
+        Returns a dict with keys 'collections', 'full_collections', 'pause_time'
+        (total, in seconds), 'max_heap_after_gc_mb' (peak live set observed),
+        and 'max_heap_committed_mb'; Returns None if the log is missing;
+    '''
+    if not os.path.isfile(gc_log_file):
+        return None
+    summary = { 'collections': 0, 'full_collections': 0, 'pause_time': 0.0, \
+                'max_heap_after_gc_mb': 0.0, 'max_heap_committed_mb': 0.0 }
+    in_f = codecs.open( gc_log_file, mode='r', encoding='utf-8', errors='replace' )
+    for line in in_f:
+        m = _pat_gc_legacy.search( line )
+        if m:
+            after, committed = int(m.group(2))/1024.0, int(m.group(3))/1024.0
+            pause = float(m.group(4))
+            is_full = 'Full GC' in line
+        else:
+            m = _pat_gc_unified.search( line )
+            if not m:
+                continue
+            after     = int(m.group(4)) * _unit_to_mb[m.group(5)]
+            committed = int(m.group(6)) * _unit_to_mb[m.group(7)]
+            pause     = float(m.group(8)) / 1000.0
+            is_full   = 'Pause Full' in m.group(1)
+        summary['collections'] += 1
+        if is_full:
+            summary['full_collections'] += 1
+        summary['pause_time'] += pause
+        summary['max_heap_after_gc_mb']  = max( summary['max_heap_after_gc_mb'], after )
+        summary['max_heap_committed_mb'] = max( summary['max_heap_committed_mb'], committed )
+    in_f.close()
+    return summary
+
+
+# =============================================================================
+#    Records of a run
+# =============================================================================
+
+class RunRecord(object):
+    ''' Collects records of the stages of a single run (e.g. training + parsing +
+        evaluation), and saves them into a JSON file;
+    '''
+
+    def __init__( self, **run_info ):
+        self.info   = dict( run_info )
+        self.info['started'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.stages = []
+
+    def add( self, record ):
+        self.stages.append( record )
+        return record
+
+    def run( self, command, stage=None, **kwargs ):
+        ''' Executes the command via run_process(), and adds its record; The
+            record is added also if the process fails (ProcessFailedError);
+        '''
+        try:
+            return self.add( run_process( command, stage=stage, **kwargs ) )
+        except ProcessFailedError as error:
+            self.add( error.record )
+            raise
+
+    @contextmanager
+    def measure( self, stage ):
+        ''' Measures an in-process stage (e.g. the evaluation):
+                with run_record.measure('evaluate'):
+                    ...
+            The peak RSS of an in-process stage is the peak RSS of the Python
+            process so far;
+        '''
+        record = { 'stage': stage, 'command': None, 'return_code': 0, \
+                   'user_time': None, 'sys_time': None, 'cpu_time': None, 'peak_rss': None }
+        usage_before = resource.getrusage( resource.RUSAGE_SELF ) if resource else None
+        start_time = timer()
+        try:
+            yield record
+        finally:
+            record['wall_time'] = timer() - start_time
+            if resource:
+                usage_after = resource.getrusage( resource.RUSAGE_SELF )
+                record['user_time'] = usage_after.ru_utime - usage_before.ru_utime
+                record['sys_time']  = usage_after.ru_stime - usage_before.ru_stime
+                record['cpu_time']  = record['user_time'] + record['sys_time']
+                record['peak_rss']  = _rss_to_bytes( usage_after.ru_maxrss )
+            self.add( record )
+
+    def as_dict( self ):
+        result = dict( self.info )
+        result['stages'] = self.stages
+        return result
+
+    def save( self, file_name ):
+        o_f = codecs.open( file_name, mode='w', encoding='utf-8' )
+        json.dump( self.as_dict(), o_f, indent=1, sort_keys=True )
+        o_f.close()
+
+
+def format_stage_records( records ):
+    ''' Formats records of stages as a table; Returns a list of strings; '''
+    lines = [ 'Stage'.ljust(16)+'Wall(s)'.ljust(10)+'CPU(s)'.ljust(10)+'PeakRSS(MB)'.ljust(13)+'GC pause(s)' ]
+    for record in records:
+        cpu  = '{:.1f}'.format(record['cpu_time']) if record.get('cpu_time') is not None else '-'
+        rss  = '{:.0f}'.format(record['peak_rss']/1024.0**2) if record.get('peak_rss') is not None else '-'
+        gc   = '{:.2f}'.format(record['gc']['pause_time']) if record.get('gc') else '-'
+        lines.append( str(record['stage']).ljust(16)+'{:.1f}'.format(record['wall_time']).ljust(10)+\
+                      cpu.ljust(10)+rss.ljust(13)+gc )
+    return lines
+
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+#
+#    Profiles per-sentence latency of parsing with EstNLTK's MaltParser: each
+#    sentence is parsed separately (as in parsing live text), and the stages
+#    of the parsing (morphological analysis, feature generation, the JVM
+#    round-trip and the alignment of the results with the Text) are timed
+#    separately; latency percentiles are reported by sentence length;
+#
+from __future__ import unicode_literals, print_function
+
+import sys, os, re, os.path
+import codecs, json
+import argparse
+
+from timeit import default_timer as timer
+
+import numpy as np
+
+from conll_evaluation import length_bucket_names, SENT_LENGTH_BUCKETS
+from conll_utils import iter_conll_sentence_batches
+from feature_generator_options import add_feature_generator_arguments_to_argparser
+
+STAGES = ['analysis', 'features', 'jvm', 'align']
+
+PERCENTILES = [50, 95, 99]
+
+
+def parse_sentence_timed( text, parser ):
+    ''' Parses the given Text (a single sentence) in the same way as
+        MaltParser.parse_text() does, and returns a dict mapping each stage
+        (see STAGES) to its duration (in seconds); '''
+    timings = {}
+    start_time = timer()
+    if not text.is_tagged(ANALYSIS):
+        text.tag_analysis()
+    timings['analysis'] = timer() - start_time
+    start_time = timer()
+    conll_str = convert_text_to_CONLL( text, parser.feature_generator )
+    timings['features'] = timer() - start_time
+    start_time = timer()
+    lines = _executeMaltparser( conll_str, parser.maltparser_dir, parser.maltparser_jar, parser.model_name )
+    timings['jvm'] = timer() - start_time
+    start_time = timer()
+    alignments = align_CONLL_with_Text( lines, text, parser.feature_generator )
+    alignments = normalise_alignments( alignments, data_type=CONLL_DATA )
+    text[LAYER_CONLL] = alignments
+    timings['align'] = timer() - start_time
+    return timings
+
+
+def summarize_latencies( lengths, timings ):
+    ''' Computes latency percentiles (in milliseconds) of each stage, and of
+        the total, by sentence length bucket and over all sentences;
+        *lengths* is a list of sentence lengths, and *timings* a list of the
+        corresponding dicts returned by parse_sentence_timed();
+        Returns a dict mapping bucket names (and 'all') to dicts mapping
+        stage names (and 'total') to dicts with keys 'p50', 'p95', 'p99',
+        'mean' and 'count';
+    '''
+    lengths = np.array( lengths )
+    values  = { stage: np.array( [t[stage] for t in timings] ) * 1000.0 for stage in STAGES }
+    values['total'] = sum( [values[stage] for stage in STAGES] )
+    buckets = np.searchsorted( SENT_LENGTH_BUCKETS, lengths, side='left' )
+    groups  = [ ('all', np.ones(len(lengths), dtype=bool)) ] + \
+              [ (name, buckets == b) for b, name in enumerate( length_bucket_names() ) ]
+    summary = {}
+    for name, mask in groups:
+        if not mask.any():
+            continue
+        summary[name] = {}
+        for stage in STAGES + ['total']:
+            stage_values = values[stage][mask]
+            p = np.percentile( stage_values, PERCENTILES )
+            summary[name][stage] = { 'mean': float(stage_values.mean()), 'count': int(mask.sum()) }
+            for percentile, value in zip( PERCENTILES, p ):
+                summary[name][stage]['p'+str(percentile)] = float(value)
+    return summary
+
+
+def format_latency_table( summary ):
+    ''' Formats the latency percentiles as a table; Returns a list of strings; '''
+    lines = [ 'Length'.ljust(8)+'Sents'.ljust(7)+'Stage'.ljust(10)+'Mean(ms)'.ljust(10)+\
+              ''.join([('p'+str(p)+'(ms)').ljust(10) for p in PERCENTILES]) ]
+    for name in ['all'] + length_bucket_names():
+        if name not in summary:
+            continue
+        for stage in STAGES + ['total']:
+            s = summary[name][stage]
+            lines.append( (name if stage == STAGES[0] else '').ljust(8)+\
+                          (str(s['count']) if stage == STAGES[0] else '').ljust(7)+stage.ljust(10)+\
+                          '{:.1f}'.format(s['mean']).ljust(10)+\
+                          ''.join(['{:.1f}'.format(s['p'+str(p)]).ljust(10) for p in PERCENTILES]) )
+    return lines
+
+
+if __name__ == '__main__':
+    # =============================================================================
+    #    Fetch command line arguments
+    # =============================================================================
+    test_corpus   = os.path.join('UD_Estonian-master', 'et-ud-test.cg3-conll')
+    max_sentences = None
+    warmup        = 3
+
+    arg_parser = argparse.ArgumentParser(description='''
+      Profiles the per-sentence latency of parsing with EstNLTK's MaltParser, using the given feature generator:
+      each sentence of the corpus is parsed separately (as in parsing live text), and the stages of the parsing --
+      morphological analysis, feature generation, the JVM round-trip and the alignment of the results with the Text --
+      are timed separately. Latency percentiles (p50, p95, p99) are reported by sentence length.
+    ''',\
+    epilog='''
+      Only the tokenization of the corpus is used: the morphological analysis is performed by EstNLTK (as it would
+      be on live text). The MaltParser's model must match the feature generator. By default, EstNLTK's MaltParser
+      model is used; another model can be given with --model_dir and --name.
+    '''
+    )
+    arg_parser.add_argument("-g", "--test",  default=test_corpus, \
+                                             help="CONLL file providing the sentences (default: '"+test_corpus+"');", \
+                                             metavar='<test_corpus>')
+    arg_parser.add_argument("-md", "--model_dir", default=None, \
+                                                  help="directory containing the MaltParser's jar and model (default: EstNLTK's MaltParser dir);", \
+                                                  metavar='<model_dir>')
+    arg_parser.add_argument("-n", "--name", default=None, \
+                                            help="name of the MaltParser's model (default: EstNLTK's default model);", \
+                                            metavar='<model_name>')
+    arg_parser.add_argument("-s", "--sentences", default=max_sentences, type=int, \
+                                                 help="maximum number of sentences profiled (default: all);", \
+                                                 metavar='<sentences>')
+    arg_parser.add_argument("-wu", "--warmup", default=warmup, type=int, \
+                                               help="number of sentences parsed before the profiling, and not recorded "+\
+                                                    "(default: "+str(warmup)+");", \
+                                               metavar='<sentences>')
+    arg_parser.add_argument("-js", "--json", default=None, \
+                                             help="name of the JSON file where the results will be saved (default: None);", \
+                                             metavar='<json_file>')
+    add_feature_generator_arguments_to_argparser( arg_parser )
+    args = arg_parser.parse_args()
+    if not os.path.isfile(args.test):
+        raise Exception('Test corpus not found: '+args.test)
+    # EstNLTK and the feature generators are imported only after the arguments
+    # have been parsed, so that --help and argument errors are reported at once
+    from estnltk.names import *
+    from estnltk.syntax.parsers import MaltParser
+    from estnltk.syntax.maltparser_support import _executeMaltparser
+    from estnltk.syntax.utils import normalise_alignments, CONLL_DATA
+
+    from conll_text_reader import conll_sentences_to_text
+    from feature_generators import get_feature_generator
+    from feature_generators import convert_text_to_CONLL, align_CONLL_with_Text
+    feature_generator = get_feature_generator( args, verbose=True )
+    parser_args = { 'feature_generator': feature_generator }
+    if args.model_dir:
+        parser_args['maltparser_dir'] = args.model_dir
+    if args.name:
+        parser_args['model_name'] = args.name
+    parser = MaltParser( **parser_args )
+
+    # =============================================================================
+    #    Parse the sentences one by one
+    # =============================================================================
+    print(' Profiling '+args.test+' ...')
+    lengths = []
+    timings = []
+    total_start = timer()
+    for sid, sentence in enumerate( iter_conll_sentence_batches( args.test, 1 ) ):
+        if args.sentences is not None and len(timings) >= args.sentences:
+            break
+        text = conll_sentences_to_text( sentence, conll_layer=False )
+        sentence_timings = parse_sentence_timed( text, parser )
+        if sid < args.warmup:
+            continue
+        lengths.append( len(text[WORDS]) )
+        timings.append( sentence_timings )
+    if not timings:
+        raise Exception('(!) No sentences were profiled.')
+
+    # =============================================================================
+    #    Report the results
+    # =============================================================================
+    summary = summarize_latencies( lengths, timings )
+    print()
+    print( '\n'.join( format_latency_table( summary ) ) )
+    print()
+    print('  '+str(len(timings))+' sentences, total time: {:.1f}s'.format( timer() - total_start ))
+    if args.json:
+        results = { 'corpus': args.test, 'model': parser.model_name, 'latency': summary }
+        o_f = codecs.open( args.json, mode='w', encoding='utf-8' )
+        json.dump( results, o_f, indent=1, sort_keys=True )
+        o_f.close()
+        print('  --> ',args.json)
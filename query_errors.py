@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+#    Error analysis of parser outputs: ingests gold standard and system CONLL
+#    files into an indexed SQLite store (see error_analysis.py), and queries
+#    label confusions and erroneous tokens;
+#
+from __future__ import unicode_literals, print_function
+
+import sys, os, os.path
+import codecs
+import argparse
+
+from timeit import default_timer as timer
+
+from error_analysis import ErrorStore, DEFAULT_ERRORS_DB, ERROR_KINDS
+
+
+def format_tokens( tokens ):
+    ''' Formats the given tokens (from ErrorStore.find_tokens()) as a table;
+        Returns a list of strings; '''
+    lines = [ 'Sentence'.ljust(26)+'Len'.ljust(5)+'ID'.ljust(5)+'Form'.ljust(16)+'POS'.ljust(6)+\
+              'Gold'.ljust(16)+'System'.ljust(16)+'Feats' ]
+    for token in tokens:
+        sentence = token['sent_id'] if token['sent_id'] else '#'+str(token['sent_idx']+1)
+        gold   = str(token['gold_head'])+':'+token['gold_deprel']
+        system = str(token['sys_head'])+':'+token['sys_deprel']
+        lines.append( sentence[:25].ljust(26)+str(token['sent_len']).ljust(5)+str(token['token_id']).ljust(5)+\
+                      token['form'][:15].ljust(16)+token['cpostag'][:5].ljust(6)+gold[:15].ljust(16)+\
+                      system[:15].ljust(16)+token['feats'] )
+    return lines
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='''
+      Error analysis of parser outputs: ingests gold standard and parser output CONLL files into an indexed SQLite
+      database, and queries label confusions and erroneous tokens (e.g. all @OBJ -> @ADVL confusions in sentences
+      longer than 30 tokens).
+    ''',\
+    epilog='''
+      Commands: "ingest" adds a parser output (along with the sent_ids of the gold corpus, read from its *.sent_ids
+      file, if it exists); "list" lists the ingested outputs; "confusions" shows the most frequent label confusions;
+      "tokens" lists the tokens matching the given conditions, along with their sent_ids, so that each error can be
+      traced back to its EDT document. The queries use the latest ingested output, unless --output is given.
+    '''
+    )
+    arg_parser.add_argument("-db", "--database", default=DEFAULT_ERRORS_DB, \
+                                                 help="SQLite database of the error analysis (default: '"+DEFAULT_ERRORS_DB+"');", \
+                                                 metavar='<errors_db>')
+    subparsers = arg_parser.add_subparsers( dest='command' )
+    ingest_parser = subparsers.add_parser( 'ingest', help='ingest a parser output;' )
+    ingest_parser.add_argument("gold", help="the gold standard CONLL file;", metavar='<gold_corpus>')
+    ingest_parser.add_argument("system", help="the parser output CONLL file;", metavar='<system_corpus>')
+    ingest_parser.add_argument("-s", "--sent_ids", default=None, \
+                                                   help="the *.sent_ids file of the gold corpus (default: derived from the name of the gold corpus);", \
+                                                   metavar='<sent_ids_file>')
+    subparsers.add_parser( 'list', help='list the ingested outputs;' )
+    for name, help_str in [ ('confusions', 'show the most frequent label confusions;'), \
+                            ('tokens', 'list the tokens matching the given conditions;') ]:
+        query_parser = subparsers.add_parser( name, help=help_str )
+        query_parser.add_argument("-o", "--output", default=None, type=int, \
+                                                    help="id of the ingested output (default: the latest);", metavar='<output_id>')
+        query_parser.add_argument("-c", "--postag", default=None, help="gold CPOSTAG of the tokens;", metavar='<postag>')
+        query_parser.add_argument("-min", "--min_length", default=None, type=int, \
+                                                          help="minimum length of the sentences;", metavar='<tokens>')
+        query_parser.add_argument("-max", "--max_length", default=None, type=int, \
+                                                          help="maximum length of the sentences;", metavar='<tokens>')
+        query_parser.add_argument("-l", "--limit", default=20 if name == 'confusions' else 100, type=int, \
+                                                   help="number of rows shown;", metavar='<limit>')
+        if name == 'tokens':
+            query_parser.add_argument("-gl", "--gold_label", default=None, help="gold DEPREL of the tokens;", metavar='<label>')
+            query_parser.add_argument("-sl", "--system_label", default=None, help="system DEPREL of the tokens;", metavar='<label>')
+            query_parser.add_argument("-e", "--error", default='las', choices=sorted(ERROR_KINDS.keys())+['none'], \
+                                                       help="kind of the errors: 'head', 'label', 'las' (either), or 'none' "+\
+                                                            "(all tokens) (default: 'las');")
+            query_parser.add_argument("-w", "--write_sent_ids", default=None, \
+                                                                help="write the sent_id-s of the sentences of the listed tokens into "+\
+                                                                     "the given file (e.g. for extract_sentences.py -l);", \
+                                                                metavar='<sent_ids_file>')
+    args = arg_parser.parse_args()
+    if args.command != 'ingest' and not os.path.isfile(args.database):
+        raise Exception('Error analysis database not found: '+args.database)
+    store = ErrorStore( args.database )
+    if args.command == 'ingest':
+        for file_name in [args.gold, args.system] + ([args.sent_ids] if args.sent_ids else []):
+            if not os.path.isfile(file_name):
+                raise Exception('File not found: '+file_name)
+        start_time = timer()
+        output_id = store.ingest( args.gold, args.system, sent_ids_file=args.sent_ids )
+        output = [ o for o in store.get_outputs() if o['output_id'] == output_id ][0]
+        print(' Ingested output '+str(output_id)+': '+str(output['sentences'])+' sentences, '+\
+              str(output['tokens'])+' tokens  ({:.2f}s)'.format( timer() - start_time ))
+    elif args.command in ['confusions', 'tokens']:
+        output_id = args.output if args.output is not None else store.latest_output_id()
+        if output_id is None:
+            raise Exception('(!) No outputs have been ingested.')
+        start_time = timer()
+        if args.command == 'confusions':
+            confusions = store.label_confusions( output_id, cpostag=args.postag, min_length=args.min_length, \
+                                                 max_length=args.max_length, limit=args.limit )
+            print( 'Gold'.ljust(16)+'System'.ljust(16)+'Count' )
+            for confusion in confusions:
+                print( confusion['gold_deprel'][:15].ljust(16)+confusion['sys_deprel'][:15].ljust(16)+\
+                       str(confusion['count']) )
+        else:
+            tokens = store.find_tokens( output_id, gold_deprel=args.gold_label, sys_deprel=args.system_label, \
+                                        cpostag=args.postag, min_length=args.min_length, max_length=args.max_length, \
+                                        error=None if args.error == 'none' else args.error, limit=args.limit )
+            print( '\n'.join( format_tokens( tokens ) ) )
+            if args.write_sent_ids:
+                sent_ids = []
+                for token in tokens:
+                    if token['sent_id'] and token['sent_id'] not in sent_ids:
+                        sent_ids.append( token['sent_id'] )
+                o_f = codecs.open( args.write_sent_ids, mode='w', encoding='utf-8' )
+                for sent_id in sent_ids:
+                    o_f.write( '#'+sent_id+'\n' )
+                o_f.close()
+                print('  --> '+args.write_sent_ids+'  ('+str(len(sent_ids))+' sentences)')
+        print()
+        print('  Output '+str(output_id)+', query time: {:.1f}ms'.format( (timer() - start_time) * 1000 ))
+    else:
+        print( 'Output'.ljust(8)+'Ingested'.ljust(21)+'Sentences'.ljust(11)+'Tokens'.ljust(9)+'System file' )
+        for output in store.get_outputs():
+            print( str(output['output_id']).ljust(8)+str(output['ingested']).ljust(21)+\
+                   str(output['sentences']).ljust(11)+str(output['tokens']).ljust(9)+str(output['system_file']) )
+    store.close()
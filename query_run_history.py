@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+#    Queries the run history (see run_history.py): lists and compares runs,
+#    shows the best configurations per metric, and flags regressions;
+#
+from __future__ import unicode_literals, print_function
+
+import sys, os, os.path
+import argparse
+
+from run_history import RunHistory, DEFAULT_HISTORY_DB, METRICS
+from process_runner import format_stage_records
+
+
+def _format_value( value, fmt='{:.4f}' ):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return fmt.format( value )
+    return str( value )
+
+
+def format_runs( runs ):
+    ''' Formats the given runs as a table; Returns a list of strings; '''
+    lines = [ 'Run'.ljust(7)+'Started'.ljust(21)+'Phase'.ljust(7)+'Model'.ljust(20)+'Config'.ljust(10)+\
+              'FeatGen'.ljust(9)+'LAS'.ljust(8)+'UAS'.ljust(8)+'LA'.ljust(8)+'Tokens/s'.ljust(10)+'Error' ]
+    for run in runs:
+        config = run['config_hash'][:8] if run['config_hash'] else '-'
+        lines.append( str(run['run_id']).ljust(7)+str(run['started']).ljust(21)+str(run['phase']).ljust(7)+\
+                      str(run['model_name'])[:19].ljust(20)+config.ljust(10)+_format_value(run['feat_gen']).ljust(9)+\
+                      _format_value(run['LAS']).ljust(8)+_format_value(run['UAS']).ljust(8)+\
+                      _format_value(run['LA']).ljust(8)+_format_value(run['parse_throughput'], '{:.0f}').ljust(10)+\
+                      ('yes' if run['error'] else '') )
+    return lines
+
+
+def compare_runs( history, run_ids ):
+    ''' Formats the given runs side by side (one column per run), followed by
+        the records of their stages; Returns a list of strings; '''
+    runs = { run['run_id']: run for run in history.get_runs( run_ids=run_ids ) }
+    missing = [ str(run_id) for run_id in run_ids if run_id not in runs ]
+    if missing:
+        raise Exception('(!) Run(s) not found: '+', '.join(missing))
+    runs = [ runs[run_id] for run_id in run_ids ]
+    fields = [ 'started', 'script', 'phase', 'model_name', 'config_hash', 'feat_gen', 'final_options', \
+               'feature_model', 'heap_size', 'shards', 'train_corpus', 'test_corpus', 'tokens' ] + METRICS + \
+             [ 'train_time', 'parse_time', 'parse_throughput', 'peak_rss', 'error' ]
+    lines = [ ''.ljust(18)+''.join( [('Run '+str(run['run_id'])).ljust(24) for run in runs] ) ]
+    for field in fields:
+        values = [ _format_value(run[field]) for run in runs ]
+        if field == 'peak_rss':
+            values = [ _format_value(run[field]/1024.0**2, '{:.0f}MB') if run[field] else '-' for run in runs ]
+        mark = '' if len(set(values)) == 1 else '  *'
+        lines.append( field.ljust(18)+''.join( [v[:23].ljust(24) for v in values] )+mark )
+    if len(runs) > 1:
+        for metric in METRICS:
+            if runs[0][metric] is not None and runs[-1][metric] is not None:
+                lines.append( ('delta '+metric).ljust(18)+'{:+.4f}'.format( runs[-1][metric] - runs[0][metric] ) )
+    for run in runs:
+        lines.append( '' )
+        lines.append( '  Stages of the run '+str(run['run_id'])+':' )
+        stages = history.get_stages( run['run_id'] )
+        for stage in stages:
+            if stage['gc_pause_time'] is not None:
+                stage['gc'] = { 'pause_time': stage['gc_pause_time'] }
+        lines.extend( format_stage_records( stages ) )
+    return lines
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='''
+      Queries the run history: the SQLite database where train_and_test_maltparser.py and test_maltparser.py record
+      the results of their runs.
+    ''',\
+    epilog='''
+      Commands: "list" lists the latest runs; "compare" shows the given runs side by side (differing fields are marked
+      with *); "best" shows the best configurations by the given metric; "regressions" compares the latest run of each
+      configuration against its previous runs, and reports drops in accuracy or in the parsing throughput.
+      The script exits with code 1, if "regressions" finds any regressions.
+    '''
+    )
+    arg_parser.add_argument("-hd", "--history", default=DEFAULT_HISTORY_DB, \
+                                               help="SQLite database of the run history (default: '"+DEFAULT_HISTORY_DB+"');", \
+                                               metavar='<history_db>')
+    subparsers = arg_parser.add_subparsers( dest='command' )
+    list_parser = subparsers.add_parser( 'list', help='list the latest runs;' )
+    list_parser.add_argument("-n", "--name", default=None, help="show only runs of the given model;", metavar='<model_name>')
+    list_parser.add_argument("-l", "--limit", default=20, type=int, help="number of runs shown (default: 20);", metavar='<limit>')
+    compare_parser = subparsers.add_parser( 'compare', help='compare the given runs;' )
+    compare_parser.add_argument("run_ids", nargs='+', type=int, help="ids of the runs to be compared;", metavar='<run_id>')
+    best_parser = subparsers.add_parser( 'best', help='show the best configurations by the given metric;' )
+    best_parser.add_argument("-t", "--metric", default='LAS', choices=METRICS+['parse_throughput'], \
+                                              help="the metric (default: 'LAS');")
+    best_parser.add_argument("-p", "--phase", default='test', help="evaluation phase: 'test' or 'train' (default: 'test');")
+    best_parser.add_argument("-l", "--limit", default=10, type=int, help="number of configurations shown (default: 10);", \
+                                              metavar='<limit>')
+    regr_parser = subparsers.add_parser( 'regressions', help='flag accuracy or throughput regressions;' )
+    regr_parser.add_argument("-t", "--metric", default='LAS', choices=METRICS, help="the accuracy metric (default: 'LAS');")
+    regr_parser.add_argument("-a", "--tolerance", default=0.005, type=float, \
+                                                  help="tolerated drop of the metric (default: 0.005);", metavar='<tolerance>')
+    regr_parser.add_argument("-s", "--speed_tolerance", default=0.1, type=float, \
+                                                        help="tolerated relative drop of the parsing throughput (default: 0.1);", \
+                                                        metavar='<tolerance>')
+    args = arg_parser.parse_args()
+    if not os.path.isfile(args.history):
+        raise Exception('Run history not found: '+args.history)
+    history = RunHistory( args.history )
+    exit_code = 0
+    if args.command == 'compare':
+        print( '\n'.join( compare_runs( history, args.run_ids ) ) )
+    elif args.command == 'best':
+        best = history.best_configurations( metric=args.metric, phase=args.phase, limit=args.limit )
+        print( '\n'.join( format_runs( best ) ) )
+        print()
+        print('  Runs per configuration: '+', '.join( [str(run['run_count']) for run in best] ))
+    elif args.command == 'regressions':
+        regressions = history.find_regressions( metric=args.metric, metric_tolerance=args.tolerance, \
+                                                throughput_tolerance=args.speed_tolerance )
+        for regression in regressions:
+            run = regression['run']
+            print(' (!) Run {} ({}, config {}): {} dropped from {:.4f} to {:.4f}'.format( run['run_id'], \
+                  run['model_name'], (run['config_hash'] or '-')[:8], regression['kind'], \
+                  regression['baseline'], regression['value'] ))
+        if not regressions:
+            print(' No regressions found.')
+        exit_code = 1 if regressions else 0
+    else:
+        runs = history.get_runs( model_name=getattr(args, 'name', None), limit=getattr(args, 'limit', 20) )
+        print( '\n'.join( format_runs( runs ) ) )
+    history.close()
+    sys.exit( exit_code )
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+#
+#     Plans the Java heap size and the number of concurrent MaltParser jobs:
+#    estimates the memory required for training from the token count of the
+#    training corpus and the number of features in the feature model, and
+#    fits the jobs into the physical memory of the machine;
+#
+#     The memory model is linear: a fixed base, plus a number of bytes per
+#    (token x feature) pair -- the training instances MaltParser collects for
+#    its classifier grow with both. The number of bytes per pair has a
+#    conservative default, which can be calibrated from the training runs
+#    recorded in the run history (see run_history.py).
+#
+#     Parsing does not collect training instances: the heap of a parsing job
+#    holds the trained model (estimated from the size of the .mco file), and a
+#    small working set for the sentences being parsed.
+#
+from __future__ import unicode_literals, print_function
+
+import re
+import os, os.path
+import codecs
+
+# Memory used by a JVM besides its heap (metaspace, code cache, thread stacks)
+JVM_OVERHEAD_MB = 256
+
+# Base heap of a training run, and bounds of the planned heap size
+BASE_HEAP_MB = 256
+MIN_HEAP_MB  = 512
+MAX_HEAP_MB  = 64 * 1024
+
+# Default number of heap bytes per (token x feature) pair; used if there are
+# no recorded runs to calibrate against
+DEFAULT_BYTES_PER_UNIT = 80.0
+
+# The planned heap is the estimated memory use multiplied by this factor (the
+# garbage collector needs headroom above the live set)
+HEAP_HEADROOM = 1.5
+
+# Percentile of the per-run estimates of bytes per (token x feature) pair
+# used in the calibration: high enough to stay on the safe side, but not the
+# maximum, so that a single outlier does not inflate all the plans
+CALIBRATION_PERCENTILE = 90
+
+# Heap of a parsing job: the classifiers unpacked from the (compressed) .mco
+# archive take about this many times the size of the archive, and each job
+# needs a working set of this size besides the model
+MODEL_EXPANSION      = 4.0
+PARSE_WORKING_SET_MB = 64
+
+# Memory left for the operating system and for the Python processes
+RESERVED_MEMORY_MB = 2048
+
+# Number of features assumed if no feature model file is given (roughly the
+# size of MaltParser's default feature model of the nivreeager algorithm)
+DEFAULT_FEATURE_COUNT = 20
+
+
+# =============================================================================
+#    Machine resources
+# =============================================================================
+
+def physical_memory_mb():
+    ''' Returns the physical memory of the machine in megabytes, or None if it
+        cannot be determined; '''
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024.0**2
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def available_memory_mb():
+    ''' Returns the memory currently available for new processes in megabytes
+        (MemAvailable from /proc/meminfo on Linux; the physical memory on other
+        platforms), or None if it cannot be determined; '''
+    if os.path.isfile('/proc/meminfo'):
+        in_f = codecs.open('/proc/meminfo', mode='r', encoding='utf-8')
+        for line in in_f:
+            m = re.match(r'^MemAvailable:\s+(\d+)\s+kB', line)
+            if m:
+                in_f.close()
+                return int(m.group(1)) / 1024.0
+        in_f.close()
+    return physical_memory_mb()
+
+
+def cpu_count():
+    return os.cpu_count() or 1
+
+
+# =============================================================================
+#    Estimating the memory use
+# =============================================================================
+
+def count_features( feature_model_file=None ):
+    ''' Returns the number of features in the given MaltParser's feature model
+        XML file (the number of <feature> elements); If no file is given,
+        returns DEFAULT_FEATURE_COUNT;
+    '''
+    if not feature_model_file:
+        return DEFAULT_FEATURE_COUNT
+    in_f = codecs.open( feature_model_file, mode='r', encoding='utf-8' )
+    content = in_f.read()
+    in_f.close()
+    count = len( re.findall(r'<feature[\s>]', content) )
+    return count if count > 0 else DEFAULT_FEATURE_COUNT
+
+
+def estimate_memory_mb( tokens, feature_count, bytes_per_unit=DEFAULT_BYTES_PER_UNIT ):
+    ''' Estimates the memory (in megabytes) used by training on a corpus of
+        *tokens* tokens with a feature model of *feature_count* features;
+    '''
+    return BASE_HEAP_MB + tokens * feature_count * bytes_per_unit / 1024.0**2
+
+
+def calibrate_bytes_per_unit( history, default=DEFAULT_BYTES_PER_UNIT ):
+    ''' Calibrates the number of bytes per (token x feature) pair from the
+        training runs recorded in the given RunHistory; Only runs with a GC log
+        are used: their peak live heap after GC measures the memory the
+        training actually needed (the peak RSS of a JVM mostly reflects the
+        heap it was given, so calibrating against it would only reproduce the
+        previous plans); Returns the CALIBRATION_PERCENTILE-th percentile of
+        the per-run estimates, or *default* if there are no suitable runs;
+    '''
+    observed = []
+    for run in history.get_training_memory_usage():
+        if run['gc_live_heap_mb'] is None:
+            continue
+        used_mb = run['gc_live_heap_mb']
+        units = run['train_tokens'] * run['feature_count']
+        if units > 0 and used_mb > BASE_HEAP_MB:
+            observed.append( (used_mb - BASE_HEAP_MB) * 1024.0**2 / units )
+    if not observed:
+        return default
+    observed.sort()
+    # nearest-rank percentile
+    rank = max( 1, int( -(-CALIBRATION_PERCENTILE * len(observed) // 100) ) )
+    return observed[rank - 1]
+
+
+# =============================================================================
+#    Planning
+# =============================================================================
+
+def heap_option_to_mb( heap_size ):
+    ''' Converts a JVM heap option (e.g. '-Xmx5048M' or 'Xmx5g') into megabytes; '''
+    m = re.match(r'^-?Xmx([0-9]+)([kKmMgG]?)$', heap_size.strip())
+    if not m:
+        raise Exception('(!) Unable to parse the heap size: '+str(heap_size))
+    multipliers = { '':1.0/1024**2, 'K':1.0/1024, 'M':1.0, 'G':1024.0 }
+    return int( int(m.group(1)) * multipliers[m.group(2).upper()] )
+
+
+def plan_heap_mb( tokens, feature_count, bytes_per_unit=DEFAULT_BYTES_PER_UNIT ):
+    ''' Returns the heap size (in megabytes) planned for training on a corpus
+        of *tokens* tokens with a feature model of *feature_count* features;
+    '''
+    heap_mb = estimate_memory_mb( tokens, feature_count, bytes_per_unit ) * HEAP_HEADROOM
+    # round up to a multiple of 256M
+    heap_mb = int( (heap_mb + 255) // 256 * 256 )
+    return max( MIN_HEAP_MB, min( MAX_HEAP_MB, heap_mb ) )
+
+
+def plan_parse_heap_mb( model_mb ):
+    ''' Returns the heap size (in megabytes) planned for a parsing job with a
+        model file (.mco) of *model_mb* megabytes;
+    '''
+    heap_mb = (model_mb * MODEL_EXPANSION + PARSE_WORKING_SET_MB) * HEAP_HEADROOM
+    # round up to a multiple of 256M
+    heap_mb = int( (heap_mb + 255) // 256 * 256 )
+    return max( MIN_HEAP_MB, min( MAX_HEAP_MB, heap_mb ) )
+
+
+def fit_heap_into_memory( heap_mb, memory_mb ):
+    ''' Reduces the heap size *heap_mb* (with a warning) to the memory available
+        for a single job, if it does not fit into *memory_mb* megabytes;
+    '''
+    if memory_mb is not None:
+        limit_mb = int( memory_mb - RESERVED_MEMORY_MB - JVM_OVERHEAD_MB )
+        if heap_mb > limit_mb:
+            print(' (!) Warning: the estimated heap size '+str(heap_mb)+'M exceeds the available memory; '+\
+                  'using '+str(max(MIN_HEAP_MB, limit_mb))+'M instead.')
+            heap_mb = max( MIN_HEAP_MB, limit_mb )
+    return heap_mb
+
+
+def plan_concurrency( heap_mb, max_jobs=None, memory_mb=None ):
+    ''' Returns the number of concurrent jobs, each with a heap of *heap_mb*
+        megabytes, that fit into the memory of the machine (*memory_mb*, by
+        default the available memory) and into the number of CPUs; The result
+        is at most *max_jobs* (if given), and at least 1;
+    '''
+    if memory_mb is None:
+        memory_mb = available_memory_mb()
+    jobs = cpu_count()
+    if memory_mb is not None:
+        jobs = min( jobs, int( (memory_mb - RESERVED_MEMORY_MB) // (heap_mb + JVM_OVERHEAD_MB) ) )
+    if max_jobs is not None:
+        jobs = min( jobs, max_jobs )
+    return max( 1, jobs )
+
+
+def plan_training( tokens, feature_model_file=None, max_jobs=1, history=None, memory_mb=None ):
+    ''' Plans the heap size and the concurrency of training jobs on corpora of
+        (at most) *tokens* tokens; If *history* (a RunHistory) is given, the
+        memory model is calibrated against the recorded runs;
+        If the planned heap does not fit into the memory even for a single job,
+        the heap is reduced to the memory available (with a warning);
+        Returns a dict with keys 'heap_mb', 'heap_size' (the JVM option, e.g.
+        '-Xmx4096M'), 'jobs', 'feature_count', 'bytes_per_unit' and
+        'memory_mb';
+    '''
+    feature_count  = count_features( feature_model_file )
+    bytes_per_unit = calibrate_bytes_per_unit( history ) if history else DEFAULT_BYTES_PER_UNIT
+    heap_mb = plan_heap_mb( tokens, feature_count, bytes_per_unit )
+    if memory_mb is None:
+        memory_mb = available_memory_mb()
+    heap_mb = fit_heap_into_memory( heap_mb, memory_mb )
+    jobs = plan_concurrency( heap_mb, max_jobs=max_jobs, memory_mb=memory_mb )
+    return { 'heap_mb': heap_mb, 'heap_size': '-Xmx'+str(heap_mb)+'M', 'jobs': jobs, \
+             'feature_count': feature_count, 'bytes_per_unit': bytes_per_unit, 'memory_mb': memory_mb }
+
+
+def plan_parsing( model_file, max_jobs=1, memory_mb=None ):
+    ''' Plans the heap size and the concurrency of parsing jobs with the given
+        MaltParser's model file (.mco); The heap holds the model and a working
+        set of PARSE_WORKING_SET_MB; the training corpus is irrelevant;
+        Returns a dict with keys 'heap_mb', 'heap_size', 'jobs', 'model_mb' and
+        'memory_mb';
+    '''
+    model_mb = os.path.getsize( model_file ) / 1024.0**2
+    heap_mb  = plan_parse_heap_mb( model_mb )
+    if memory_mb is None:
+        memory_mb = available_memory_mb()
+    heap_mb = fit_heap_into_memory( heap_mb, memory_mb )
+    jobs = plan_concurrency( heap_mb, max_jobs=max_jobs, memory_mb=memory_mb )
+    return { 'heap_mb': heap_mb, 'heap_size': '-Xmx'+str(heap_mb)+'M', 'jobs': jobs, \
+             'model_mb': model_mb, 'memory_mb': memory_mb }
+
+
+def format_plan( plan ):
+    ''' Formats the plan (of training or of parsing) as a (one line) string; '''
+    memory = '{:.0f}M'.format( plan['memory_mb'] ) if plan['memory_mb'] is not None else 'unknown'
+    if 'model_mb' in plan:
+        details = 'model: {:.1f}M'.format( plan['model_mb'] )
+    else:
+        details = 'features: '+str(plan['feature_count'])+\
+                  ', bytes per token x feature: {:.1f}'.format( plan['bytes_per_unit'] )
+    return 'heap '+plan['heap_size']+' x '+str(plan['jobs'])+' job(s)  ('+details+', memory available: '+memory+')'
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+#
+#     SQLite store of the history of training and evaluation runs;
+#
+#     Each evaluation run is stored as a row of the table 'runs': the
+#    configuration (hash of the final configuration file, the feature model
+#    file, the algorithm and the feature generator flag), fingerprints of the
+#    corpora and of the model, the scores (LAS, UAS, LA), the parsing speed
+#    and the peak memory usage; records of the processing stages (see
+#    process_runner.py) go into the table 'stages'.
+#
+#     The history allows comparing runs, finding the best configuration for
+#    each metric, and detecting regressions in accuracy or in the parsing
+#    speed; the tables are indexed, so that queries remain fast also after
+#    thousands of runs (e.g. from parameter sweeps).
+#
+from __future__ import unicode_literals, print_function
+
+import json
+import hashlib
+import sqlite3
+import statistics
+
+from model_store import file_fingerprint
+
+DEFAULT_HISTORY_DB = 'run_history.sqlite'
+
+METRICS = ['LAS', 'UAS', 'LA']
+
+# Runs grouped together in finding the best configurations and regressions:
+# runs of the same configuration, or (if the configuration is not known) runs
+# of the same model
+_CONFIG_GROUP = "COALESCE( config_hash, 'model:' || model_fingerprint )"
+
+# Columns of the table 'runs' (other than run_id), and their SQL types;
+# Keys of a run's info that are not columns are kept in the JSON column 'info'
+RUN_COLUMNS = [ ('started', 'TEXT'), ('script', 'TEXT'), ('phase', 'TEXT'), \
+                ('model_name', 'TEXT'), ('model_fingerprint', 'TEXT'), ('config_hash', 'TEXT'), \
+                ('final_options', 'TEXT'), ('feature_model', 'TEXT'), ('algorithm', 'TEXT'), \
+                ('feat_gen', 'TEXT'), ('heap_size', 'TEXT'), ('shards', 'INTEGER'), \
+                ('train_corpus', 'TEXT'), ('train_fingerprint', 'TEXT'), \
+                ('train_tokens', 'INTEGER'), ('feature_count', 'INTEGER'), \
+                ('test_corpus', 'TEXT'), ('test_fingerprint', 'TEXT'), \
+                ('tokens', 'INTEGER'), ('sentences', 'INTEGER'), \
+                ('LAS', 'REAL'), ('UAS', 'REAL'), ('LA', 'REAL'), \
+                ('train_time', 'REAL'), ('parse_time', 'REAL'), ('parse_throughput', 'REAL'), \
+                ('peak_rss', 'INTEGER'), ('error', 'TEXT') ]
+
+STAGE_COLUMNS = [ ('stage', 'TEXT'), ('command', 'TEXT'), ('return_code', 'INTEGER'), \
+                  ('timed_out', 'INTEGER'), ('wall_time', 'REAL'), ('cpu_time', 'REAL'), \
+                  ('peak_rss', 'INTEGER'), ('gc_pause_time', 'REAL'), ('gc_collections', 'INTEGER'), \
+                  ('gc_live_heap_mb', 'REAL') ]
+
+_SCHEMA = [
+  'CREATE TABLE IF NOT EXISTS runs ( run_id INTEGER PRIMARY KEY AUTOINCREMENT, '+\
+     ', '.join([name+' '+sql_type for (name, sql_type) in RUN_COLUMNS])+', info TEXT )',
+  'CREATE TABLE IF NOT EXISTS stages ( run_id INTEGER NOT NULL REFERENCES runs(run_id), '+\
+     ', '.join([name+' '+sql_type for (name, sql_type) in STAGE_COLUMNS])+' )',
+  'CREATE INDEX IF NOT EXISTS idx_runs_config ON runs ( config_hash, test_fingerprint, phase, run_id )',
+  'CREATE INDEX IF NOT EXISTS idx_runs_test   ON runs ( test_fingerprint, phase )',
+  'CREATE INDEX IF NOT EXISTS idx_runs_model  ON runs ( model_fingerprint )',
+  'CREATE INDEX IF NOT EXISTS idx_runs_name   ON runs ( model_name, run_id )',
+  'CREATE INDEX IF NOT EXISTS idx_stages_run  ON stages ( run_id )',
+]
+
+
+def configuration_hash( final_options_file=None, feature_model_file=None, algorithm=None, feat_gen=None ):
+    ''' Computes a hash (a hex string) of the parser's configuration: contents of
+        the final configuration file and of the feature model file, the algorithm,
+        and the flag of the feature generator used in preparing the corpora;
+    '''
+    hasher = hashlib.sha1()
+    for role, file_name in [ ('final_options', final_options_file), ('feature_model', feature_model_file) ]:
+        hasher.update( (role+'\n').encode('utf-8') )
+        hasher.update( (file_fingerprint( file_name ) if file_name else '<None>').encode('utf-8') )
+    hasher.update( ('algorithm\n'+str(algorithm)+'\n').encode('utf-8') )
+    hasher.update( ('feat_gen\n'+str(feat_gen)+'\n').encode('utf-8') )
+    return hasher.hexdigest()
+
+
+def summarize_stages( stages ):
+    ''' Summarizes records of the processing stages of a run: returns a dict with
+        keys 'train_time', 'parse_time' and 'peak_rss';
+        Concurrent parsing shards ('parse_shard<k>') overlap in time, so the
+        parse time is the wall time of the slowest parsing process;
+    '''
+    train_times = [ s['wall_time'] for s in stages if s['stage'] == 'learn' ]
+    parse_times = [ s['wall_time'] for s in stages if str(s['stage']).startswith('parse') ]
+    peak_rss    = [ s['peak_rss'] for s in stages if s.get('command') and s.get('peak_rss') is not None ]
+    return { 'train_time': sum(train_times) if train_times else None, \
+             'parse_time': max(parse_times) if parse_times else None, \
+             'peak_rss':   max(peak_rss) if peak_rss else None }
+
+
+class RunHistory(object):
+    ''' SQLite database of the runs; '''
+
+    def __init__( self, db_file=DEFAULT_HISTORY_DB ):
+        self.db_file = db_file
+        self.connection = sqlite3.connect( db_file )
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            for statement in _SCHEMA:
+                self.connection.execute( statement )
+            self._add_missing_columns()
+
+    def _add_missing_columns( self ):
+        # Databases created by earlier versions may lack some of the columns
+        for table, columns in [ ('runs', RUN_COLUMNS), ('stages', STAGE_COLUMNS) ]:
+            existing = set( [row['name'] for row in self.connection.execute( 'PRAGMA table_info('+table+')' )] )
+            for name, sql_type in columns:
+                if name not in existing:
+                    self.connection.execute( 'ALTER TABLE '+table+' ADD COLUMN '+name+' '+sql_type )
+
+    def close( self ):
+        self.connection.close()
+
+    def add_run( self, info, stages, results=None ):
+        ''' Adds a run into the history; *info* is a dict of information about
+            the run (e.g. RunRecord.info), *stages* is a list of stage records,
+            and *results* are the evaluation results (from conll_evaluation);
+            Returns the run_id of the new run;
+        '''
+        row = {}
+        extra_info = {}
+        for key, value in info.items():
+            if key in dict(RUN_COLUMNS):
+                row[key] = value
+            else:
+                extra_info[key] = value
+        row.update( summarize_stages( stages ) )
+        if results:
+            for key in ['tokens', 'sentences'] + METRICS:
+                row[key] = results[key]
+        if row.get('tokens') and row.get('parse_time'):
+            row['parse_throughput'] = row['tokens'] / row['parse_time']
+        columns = [ name for (name, sql_type) in RUN_COLUMNS ]
+        with self.connection:
+            cursor = self.connection.execute( 'INSERT INTO runs ('+', '.join(columns)+', info) '+\
+                                              'VALUES ('+', '.join(['?']*(len(columns)+1))+')', \
+                                              [row.get(c) for c in columns] + [json.dumps(extra_info, sort_keys=True)] )
+            run_id = cursor.lastrowid
+            stage_columns = [ name for (name, sql_type) in STAGE_COLUMNS ]
+            for stage in stages:
+                stage_row = dict( stage )
+                if stage.get('gc'):
+                    stage_row['gc_pause_time']  = stage['gc']['pause_time']
+                    stage_row['gc_collections'] = stage['gc']['collections']
+                    stage_row['gc_live_heap_mb'] = stage['gc']['max_heap_after_gc_mb']
+                self.connection.execute( 'INSERT INTO stages (run_id, '+', '.join(stage_columns)+') '+\
+                                         'VALUES ('+', '.join(['?']*(len(stage_columns)+1))+')', \
+                                         [run_id] + [stage_row.get(c) for c in stage_columns] )
+        return run_id
+
+    def get_runs( self, run_ids=None, model_name=None, limit=None ):
+        ''' Returns runs (as dicts) with the given run_ids, or the latest runs
+            (optionally, of the given model); '''
+        query  = 'SELECT * FROM runs'
+        params = []
+        if run_ids:
+            query += ' WHERE run_id IN ('+', '.join(['?']*len(run_ids))+')'
+            params.extend( run_ids )
+        elif model_name:
+            query += ' WHERE model_name = ?'
+            params.append( model_name )
+        query += ' ORDER BY run_id DESC'
+        if limit:
+            query += ' LIMIT ?'
+            params.append( limit )
+        return [ dict(row) for row in self.connection.execute( query, params ) ]
+
+    def get_stages( self, run_id ):
+        return [ dict(row) for row in \
+                 self.connection.execute( 'SELECT * FROM stages WHERE run_id = ? ORDER BY rowid', (run_id,) ) ]
+
+    def find_training_run( self, model_fingerprint ):
+        ''' Returns the latest run that trained the model with the given
+            fingerprint, or None if there is no such run; '''
+        row = self.connection.execute( 'SELECT * FROM runs WHERE model_fingerprint = ? AND '+\
+                                       'train_fingerprint IS NOT NULL ORDER BY run_id DESC LIMIT 1', \
+                                       (model_fingerprint,) ).fetchone()
+        return dict(row) if row else None
+
+    def get_training_memory_usage( self ):
+        ''' Returns memory usage of the successful training runs: a list of dicts
+            with keys 'train_tokens', 'feature_count', 'peak_rss' (of the JVM, in
+            bytes) and 'gc_live_heap_mb' (None if the GC log was not recorded);
+        '''
+        query = 'SELECT runs.train_tokens, runs.feature_count, stages.peak_rss, stages.gc_live_heap_mb '+\
+                'FROM runs JOIN stages ON stages.run_id = runs.run_id '+\
+                'WHERE stages.stage = \'learn\' AND stages.return_code = 0 AND runs.error IS NULL '+\
+                'AND runs.train_tokens IS NOT NULL AND runs.feature_count IS NOT NULL '+\
+                'AND (stages.peak_rss IS NOT NULL OR stages.gc_live_heap_mb IS NOT NULL)'
+        return [ dict(row) for row in self.connection.execute( query ) ]
+
+    def best_configurations( self, metric='LAS', test_fingerprint=None, phase='test', limit=10 ):
+        ''' Returns the best configurations by the given metric: for each
+            configuration (and test corpus), the run with the highest score;
+            Runs without a configuration hash are grouped by the model
+            fingerprint (see find_regressions()); Results are sorted by the
+            score (descending);
+        '''
+        if metric not in METRICS + ['parse_throughput']:
+            raise Exception('(!) Unknown metric: '+str(metric))
+        where  = 'WHERE phase = ? AND '+metric+' IS NOT NULL'
+        params = [ phase ]
+        if test_fingerprint:
+            where += ' AND test_fingerprint = ?'
+            params.append( test_fingerprint )
+        # SQLite returns the other columns from the row having the max() value
+        query = 'SELECT *, MAX('+metric+') AS best_score, COUNT(*) AS run_count FROM runs '+where+\
+                ' GROUP BY '+_CONFIG_GROUP+', test_fingerprint ORDER BY best_score DESC LIMIT ?'
+        params.append( limit )
+        return [ dict(row) for row in self.connection.execute( query, params ) ]
+
+    def find_regressions( self, metric='LAS', metric_tolerance=0.005, throughput_tolerance=0.1 ):
+        ''' Finds regressions: compares the latest run of each configuration (on
+            each test corpus) against the previous runs of the same configuration
+            (runs without a configuration hash, e.g. evaluations of models whose
+            training was not recorded, are grouped by the model fingerprint);
+            A regression is reported if the score of the latest run is lower than
+            the best previous score by more than *metric_tolerance*, or if the
+            parsing throughput (tokens/s) is lower than the median previous
+            throughput by more than the fraction *throughput_tolerance*;
+            Returns a list of dicts with keys 'run', 'kind', 'baseline', 'value';
+        '''
+        regressions = []
+        groups = self.connection.execute( 'SELECT '+_CONFIG_GROUP+' AS group_key, test_fingerprint, phase, '+\
+                                          'MAX(run_id) AS latest FROM runs WHERE error IS NULL '+\
+                                          'GROUP BY group_key, test_fingerprint, phase HAVING COUNT(*) > 1' ).fetchall()
+        for group in groups:
+            latest = dict( self.connection.execute( 'SELECT * FROM runs WHERE run_id = ?', \
+                                                    (group['latest'],) ).fetchone() )
+            group_condition = ( _CONFIG_GROUP+' IS ? AND test_fingerprint IS ? AND phase IS ? '+\
+                                'AND run_id < ? AND error IS NULL', \
+                                (group['group_key'], group['test_fingerprint'], group['phase'], group['latest']) )
+            previous = self.connection.execute( 'SELECT MAX('+metric+') AS best_score FROM runs '+\
+                                                'WHERE '+group_condition[0], group_condition[1] ).fetchone()
+            if previous['best_score'] is not None and latest[metric] is not None and \
+               previous['best_score'] - latest[metric] > metric_tolerance:
+                regressions.append( { 'run': latest, 'kind': metric, \
+                                      'baseline': previous['best_score'], 'value': latest[metric] } )
+            throughputs = [ row[0] for row in self.connection.execute( 'SELECT parse_throughput FROM runs '+\
+                            'WHERE '+group_condition[0]+' AND parse_throughput IS NOT NULL', group_condition[1] ) ]
+            if throughputs and latest['parse_throughput'] is not None:
+                median = statistics.median( throughputs )
+                if latest['parse_throughput'] < median * (1.0 - throughput_tolerance):
+                    regressions.append( { 'run': latest, 'kind': 'parse_throughput', \
+                                          'baseline': median, 'value': latest['parse_throughput'] } )
+        return regressions
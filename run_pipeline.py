@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+#
+#     Runs the whole experiment pipeline (aligning the UD splits with EDT,
+#    validating, optimizing MaltParser's configuration, training, and
+#    evaluating MaltParser and VISLCG3) as declared in pipeline.json;
+#
+#     Stages with unchanged inputs are skipped, independent stages are run
+#    concurrently, and after a failure, the pipeline resumes from the failed
+#    stages (see pipeline_runner.py for details);
+#
+from __future__ import unicode_literals, print_function
+
+import sys, os, os.path
+import argparse
+
+from timeit import default_timer as timer
+
+from pipeline_runner import DEFAULT_PIPELINE, DEFAULT_STATE_FILE, DEFAULT_LOG_DIR
+from pipeline_runner import STATUS_DONE, STATUS_SKIPPED
+from pipeline_runner import PipelineState, load_pipeline, run_pipeline, format_plan
+from conll_utils import format_time
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='''
+      Runs the stages of a declarative pipeline (by default: pipeline.json, which aligns the UD_Estonian splits with
+      EDT, validates the dev corpus, runs the phases of MaltOptimizer, trains MaltParser, and evaluates MaltParser and
+      VISLCG3). A stage is skipped if its command and the contents of its input files are unchanged since its last
+      successful run (content hashes are kept in the state file). Independent stages are run concurrently (see
+      --jobs), and the output of each stage is logged into <log_dir>/<stage>.log. If a stage fails, the stages
+      depending on it are not run; re-running the pipeline resumes from the failed stages.
+      Positional arguments select target stages: only these and the stages they depend on are run.
+    '''\
+    )
+    arg_parser.add_argument("targets", nargs='*', help="names of the target stages (default: all stages);", metavar='<stage>')
+    arg_parser.add_argument("-p", "--pipeline", default=DEFAULT_PIPELINE, \
+                                                help="the pipeline JSON file (default: '"+DEFAULT_PIPELINE+"');", \
+                                                metavar='<pipeline_file>')
+    arg_parser.add_argument("-D", "--define", action='append', default=[], \
+                                              help="overrides the value of a variable of the pipeline, e.g. "+\
+                                                   "-D feat_gen=f02_a (can be used multiple times);", \
+                                              metavar='<name=value>')
+    arg_parser.add_argument("-j", "--jobs", default=1, type=int, \
+                                            help="maximum number of stages run concurrently (default: 1);", \
+                                            metavar='<jobs>')
+    arg_parser.add_argument("-s", "--state", default=DEFAULT_STATE_FILE, \
+                                             help="the state file of the pipeline (default: '"+DEFAULT_STATE_FILE+"');", \
+                                             metavar='<state_file>')
+    arg_parser.add_argument("-l", "--log_dir", default=DEFAULT_LOG_DIR, \
+                                               help="directory of the logs of the stages (default: '"+DEFAULT_LOG_DIR+"');", \
+                                               metavar='<log_dir>')
+    arg_parser.add_argument("-f", "--force", action='append', default=[], \
+                                             help="re-runs the given stage even if it is up to date (can be used "+\
+                                                  "multiple times);", \
+                                             metavar='<stage>')
+    arg_parser.add_argument('-k', '--keep_going', action='store_true', \
+                                                  help="after a failure, continue running the stages that do not depend "+\
+                                                       "on the failed ones;")
+    arg_parser.add_argument('-n', '--dry_run', action='store_true', \
+                                               help="only show which stages would be run;")
+    args = arg_parser.parse_args()
+    if not os.path.isfile(args.pipeline):
+        raise Exception('Pipeline file not found: '+args.pipeline)
+    if args.jobs < 1:
+        raise Exception('(!) Invalid number of jobs: '+str(args.jobs))
+    variables = {}
+    for definition in args.define:
+        if '=' not in definition:
+            raise Exception('(!) Invalid variable definition (expected <name=value>): '+definition)
+        name, value = definition.split('=', 1)
+        variables[name.strip()] = value
+
+    stages = load_pipeline( args.pipeline, variables=variables )
+    state  = PipelineState( args.state )
+    if args.dry_run:
+        print('\n'.join( format_plan( stages, state, targets=args.targets, force=args.force ) ))
+        sys.exit(0)
+    start_time = timer()
+    statuses = run_pipeline( stages, state, jobs=args.jobs, log_dir=args.log_dir, targets=args.targets, \
+                             force=args.force, keep_going=args.keep_going )
+    print()
+    for stage in stages:
+        if stage['name'] in statuses:
+            print(' '+stage['name'].ljust(20)+statuses[stage['name']])
+    print(' Total processing time: '+format_time( timer() - start_time ))
+    if any( [status not in [STATUS_DONE, STATUS_SKIPPED] for status in statuses.values()] ):
+        sys.exit(1)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+#
+#     Statistical significance tests for comparing two parsers' outputs on
+#    the same gold standard corpus: the paired bootstrap test and the
+#    approximate randomization test;
+#
+#     Both tests resample at the sentence level: each sentence is represented
+#    by its token count and by the numbers of tokens the two systems got right
+#    (for each metric), so a resample of the whole test set is just a weighted
+#    sum over these per-sentence arrays. Resamples are drawn in batches, and
+#    each batch is processed (for all metrics at once) with a single matrix
+#    product.
+#
+from __future__ import unicode_literals, print_function
+
+import numpy as np
+
+from conll_evaluation import read_gold_and_system_columns, sentence_counts, METRICS
+
+DEFAULT_RESAMPLES = 10000
+
+# Number of resamples processed in one vectorized batch (limits the memory
+# used by the batch to roughly batch_size * number_of_sentences values)
+BATCH_SIZE = 500
+
+
+def read_paired_sentence_counts( gold_file, system_file_a, system_file_b ):
+    ''' Reads per-sentence counts (see sentence_counts()) of two systems'
+        outputs evaluated against the same gold standard file; Returns a pair
+        of dicts (counts_a, counts_b);
+    '''
+    counts_a = sentence_counts( read_gold_and_system_columns( gold_file, system_file_a ) )
+    counts_b = sentence_counts( read_gold_and_system_columns( gold_file, system_file_b ) )
+    if len(counts_a['tokens']) != len(counts_b['tokens']):
+        raise Exception('(!) Numbers of sentences of the system outputs do not match.')
+    return counts_a, counts_b
+
+
+def _random_generator( seed ):
+    # numpy.random.Generator (NumPy >= 1.17) generates integers faster than
+    # the legacy RandomState
+    if hasattr(np.random, 'default_rng'):
+        return np.random.default_rng( seed )
+    return np.random.RandomState( seed )
+
+
+def _random_integers( rng, high, size ):
+    if hasattr(rng, 'integers'):
+        return rng.integers( 0, high, size=size, dtype=np.int32 )
+    return rng.randint( 0, high, size=size )
+
+
+def _batches( n_resamples, batch_size=BATCH_SIZE ):
+    done = 0
+    while done < n_resamples:
+        size = min(batch_size, n_resamples - done)
+        yield size
+        done += size
+
+
+def _differences( counts_a, counts_b, metrics ):
+    ''' Returns a matrix (sentences x metrics) of differences of the counts of
+        correct tokens of the systems A and B, and the array of token counts; '''
+    diffs = np.column_stack( [counts_a[metric] - counts_b[metric] for metric in metrics] )
+    return diffs, np.asarray( counts_a['tokens'], dtype=np.float64 )
+
+
+def paired_bootstrap_test( counts_a, counts_b, metrics=METRICS, n_resamples=DEFAULT_RESAMPLES, seed=None ):
+    ''' Paired bootstrap test (Berg-Kirkpatrick et al., 2012) of the difference
+        delta = score(A) - score(B) of two systems, where score is the ratio of
+        correct tokens; *counts_a* and *counts_b* are per-sentence counts of the
+        systems (see conll_evaluation.sentence_counts());
+        Sentences are resampled with replacement (the same resamples are used
+        for all the metrics); the p-value is the proportion of resamples where
+        the difference exceeds twice the observed difference (i.e. the resampled
+        difference deviates from the observed difference at least as much as
+        the observed difference deviates from 0);
+        Returns a dict mapping each metric to a dict with keys 'delta',
+        'p_value', 'ci_low', 'ci_high' (the 95% confidence interval of the
+        difference) and 'resamples';
+    '''
+    rng = _random_generator( seed )
+    diffs, tokens = _differences( counts_a, counts_b, metrics )
+    n_sentences = len(tokens)
+    delta  = diffs.sum(axis=0) / tokens.sum()
+    # Sums of the differences and of the token counts in each resample
+    values = np.column_stack( [diffs, tokens] )
+    deltas = np.empty( (n_resamples, len(metrics)), dtype=np.float64 )
+    pos = 0
+    for size in _batches( n_resamples ):
+        sample = _random_integers( rng, n_sentences, (size, n_sentences) )
+        # Counts of each sentence in each resample: one bincount over the batch
+        offsets = (np.arange(size, dtype=np.int64) * n_sentences)[:, None]
+        weights = np.bincount( (sample + offsets).ravel(), minlength=size*n_sentences )
+        sums = weights.reshape( (size, n_sentences) ).astype(np.float64).dot( values )
+        deltas[pos:pos+size] = sums[:, :-1] / sums[:, -1:]
+        pos += size
+    results = {}
+    for m, metric in enumerate( metrics ):
+        if delta[m] == 0:
+            # no observed difference: nothing to test
+            exceeding = n_resamples
+        elif delta[m] > 0:
+            exceeding = np.count_nonzero( deltas[:, m] > 2 * delta[m] )
+        else:
+            exceeding = np.count_nonzero( deltas[:, m] < 2 * delta[m] )
+        ci_low, ci_high = np.percentile( deltas[:, m], [2.5, 97.5] )
+        results[metric] = { 'delta': float(delta[m]), 'p_value': float(exceeding) / n_resamples, \
+                            'ci_low': float(ci_low), 'ci_high': float(ci_high), 'resamples': n_resamples }
+    return results
+
+
+def approximate_randomization_test( counts_a, counts_b, metrics=METRICS, n_resamples=DEFAULT_RESAMPLES, seed=None ):
+    ''' Approximate randomization test (Noreen, 1989) of the difference
+        delta = score(A) - score(B) of two systems; *counts_a* and *counts_b*
+        are per-sentence counts of the systems (see sentence_counts());
+        In each resample, outputs of the two systems are swapped in a random
+        half of the sentences (which flips the sign of the sentence's
+        difference); the (two-sided) p-value is the smoothed proportion of
+        resamples where the absolute difference is at least the observed one;
+        Returns a dict mapping each metric to a dict with keys 'delta',
+        'p_value' and 'resamples';
+    '''
+    rng = _random_generator( seed )
+    diffs, tokens = _differences( counts_a, counts_b, metrics )
+    n_sentences = len(tokens)
+    total = tokens.sum()
+    delta = diffs.sum(axis=0) / total
+    at_least_as_extreme = np.zeros( len(metrics), dtype=np.int64 )
+    for size in _batches( n_resamples ):
+        signs = _random_integers( rng, 2, (size, n_sentences) ).astype(np.float64) * 2 - 1
+        shuffled = signs.dot( diffs ) / total
+        # tolerance against rounding errors in the comparison of equal values
+        at_least_as_extreme += np.count_nonzero( np.abs(shuffled) >= np.abs(delta) - 1e-12, axis=0 )
+    results = {}
+    for m, metric in enumerate( metrics ):
+        results[metric] = { 'delta': float(delta[m]), \
+                            'p_value': float(at_least_as_extreme[m] + 1) / (n_resamples + 1), \
+                            'resamples': n_resamples }
+    return results
+
+
+def compare_system_outputs( gold_file, system_file_a, system_file_b, metrics=METRICS, \
+                            n_resamples=DEFAULT_RESAMPLES, seed=None ):
+    ''' Compares two systems' outputs against the same gold standard file with
+        both tests; Returns a dict mapping each metric to a dict with keys
+        'A', 'B' (scores of the systems), 'bootstrap' and 'randomization'
+        (results of the tests);
+    '''
+    counts_a, counts_b = read_paired_sentence_counts( gold_file, system_file_a, system_file_b )
+    total = counts_a['tokens'].sum()
+    bootstrap     = paired_bootstrap_test( counts_a, counts_b, metrics=metrics, \
+                                           n_resamples=n_resamples, seed=seed )
+    randomization = approximate_randomization_test( counts_a, counts_b, metrics=metrics, \
+                                                    n_resamples=n_resamples, seed=seed )
+    results = {}
+    for metric in metrics:
+        results[metric] = { 'A': float( counts_a[metric].sum() / total ), \
+                            'B': float( counts_b[metric].sum() / total ), \
+                            'bootstrap': bootstrap[metric], 'randomization': randomization[metric] }
+    return results
@@ -4,120 +4,198 @@
 #
 from __future__ import unicode_literals, print_function
 
-import sys, os, re, os.path, codecs
+import sys, os, re, os.path, codecs, json
 import argparse
 
-from estnltk.names import *
-from estnltk.syntax.parsers import VISLCG3Parser
-from estnltk.syntax.utils import read_text_from_conll_file
-from estnltk.syntax.maltparser_support import __sort_analyses
-from estnltk.syntax.maltparser_support import CONLLFeatGenerator, convert_text_w_syntax_to_CONLL
-
-from estnltk.syntax.vislcg3_syntax import SYNTAX_PIPELINE_1_4, SYNTAX_PIPELINE_ESTCG
-
-def fetchResults( outputFile ):
-    resultlines = []
-    f = open(outputFile, 'r')
-    for line in f:
-        line = line.strip()
-        if re.match('accuracy.+Token$', line):
-            resultlines.append(line)
-        if re.match('.+Row (mean|count)$', line):
-            resultlines.append(line)
-    f.close()
-    return resultlines
-
-
-# =============================================================================
-#    Fetch command line arguments
-# =============================================================================
-vislcg3_cmd       = 'vislcg3'
-test_corpus       = 'UD_Estonian-master\\et-ud-test.cg3-conll'
-test_empty_corpus = None
-force_disamb      = False
-replace_root      = True
-pipeline          = SYNTAX_PIPELINE_1_4
-#pipeline          = SYNTAX_PIPELINE_ESTCG
-
-arg_parser = argparse.ArgumentParser(description='''
-  Evaluates EstNLTK's VISLCG3 based syntactic parser on the test data set, and reports the accuracy.
-  Assumes that VISLCG3 is installed into the system and accessible by EstNTLK.
-  Note that if no configuration is given, the script attempts to use the default configuration. The default configuration can be overridden by command line arguments.
-''',\
-epilog='''
-  The script needs to be executed in a directory that contains MaltEval.jar, and it should be allowed to write files into that directory. 
-  In the evaluation part, the script reports accuracy in terms of three metrics: LA, UAS and LAS.
-'''
-)
-arg_parser.add_argument("-g", "--test",  default=test_corpus, \
-                                         help="evaluation corpus CONLL file (default: '"+test_corpus+"');", \
-                                         metavar='<test_corpus>')
-arg_parser.add_argument("-te", "--test_empty",  default=test_empty_corpus, \
-                                         help="evaluation corpus (CONLL file) without syntactic annotations (default: '"+str(test_empty_corpus)+"');", \
-                                         metavar='<test_empty_corpus>')
-arg_parser.add_argument("-v", "--vislcg",  default=vislcg3_cmd, \
-                                           help="name of the vislcg3 executable with full path (default: '"+vislcg3_cmd+"');", \
-                                           metavar='<vislcg3_cmd>')
-arg_parser.add_argument("-d", "--disamb",  dest='force_disamb', action='store_true', \
-                                           help="whether statistical morphological disambiguation should be performed (default: "+str(force_disamb)+");" )
-arg_parser.add_argument('--no-replace-root', help="do not replace syntactic label of the root node with ROOT; (by default, the replacement will be made)", dest='replace_root', action='store_false')
-arg_parser.set_defaults(force_disamb=force_disamb, replace_root=replace_root)
-args = arg_parser.parse_args()
-test_corpus = args.test
-if not args.test and not os.path.isfile(args.test):
-   raise Exception('Test corpus not found: '+args.test)
-test_empty_corpus = args.test_empty
-if args.test_empty and not os.path.isfile(args.test_empty):
-    raise Exception('Test corpus not found: '+args.test_empty)
-vislcg3_cmd  = args.vislcg
-force_disamb = args.force_disamb
-replace_root = args.replace_root
-
-test_out_corpus = test_corpus+'.vislcg3-parsed'
-in_corpus = test_empty_corpus if test_empty_corpus else test_corpus
-print(' Contents from CONLL output: ', in_corpus, end=' ')
-text = read_text_from_conll_file( in_corpus, keep_old=False )
-allTokens = len(text[WORDS])
-sentStart = len(text.sentence_texts)
-print('    ( words: ',allTokens,' sentences: ',sentStart, ')',end='\n')
-if force_disamb:
-    print(' Using EstNLTK disambiguation ...',end='\n')
-    text = text.tag_analysis()
-if not replace_root:
-    print(' Not using ROOT labels.')
-
-print()
-del text[LAYER_CONLL]
-
-print(' Parsing text with VISLCG3 ... ')
-parser = VISLCG3Parser(vislcg_cmd=vislcg3_cmd, pipeline=pipeline)
-parser.parse_text( text )
-
-print(' Converting parsing results to CONLL ... ')
-# Convert given text into CONLL string
-try:
-    conll_str = convert_text_w_syntax_to_CONLL( text, CONLLFeatGenerator(), layer=LAYER_VISLCG3, replace_root=replace_root )
-except TypeError:
-    conll_str = convert_text_w_syntax_to_CONLL( text, CONLLFeatGenerator(), layer=LAYER_VISLCG3 )
-
-# Write results into the file
-print('  --> ',test_out_corpus)
-print()
-o_f = codecs.open( test_out_corpus, mode='w', encoding='utf-8' )
-o_f.write(conll_str)
-o_f.write('\n')
-o_f.close()
-
-eval_out_file = 'temp.eval.output.txt'
-java_loc      = 'java'
-
-command = java_loc + ' -jar MaltEval.jar -s '+test_out_corpus+' -g '+test_corpus+' --Metric LAS;UAS;LA > '+eval_out_file
-print ("  Executing:  "+command)
-os.system(command)
-resultLines = fetchResults( eval_out_file )
-print( '\n'.join( resultLines ) )
-
-
-
-
-
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from conll_evaluation import evaluate_conll_files, format_results
+from conll_utils import iter_conll_sentence_batches
+from compressed_io import open_corpus, plain_input_file, add_file_suffix
+
+
+def parse_text_with_vislcg3( text, config ):
+    ''' Parses the given Text (read from a CONLL file) with VISLCG3Parser, and
+        returns the parsing results as a CONLL string; '''
+    from estnltk.names import LAYER_CONLL, LAYER_VISLCG3
+    from estnltk.syntax.parsers import VISLCG3Parser
+    from estnltk.syntax.maltparser_support import CONLLFeatGenerator, convert_text_w_syntax_to_CONLL
+    if config['force_disamb']:
+        text = text.tag_analysis()
+    if LAYER_CONLL in text:
+        del text[LAYER_CONLL]
+    parser = VISLCG3Parser(vislcg_cmd=config['vislcg3_cmd'], pipeline=config['pipeline'])
+    parser.parse_text( text )
+    # Convert given text into CONLL string
+    try:
+        conll_str = convert_text_w_syntax_to_CONLL( text, CONLLFeatGenerator(), layer=LAYER_VISLCG3, \
+                                                    replace_root=config['replace_root'] )
+    except TypeError:
+        conll_str = convert_text_w_syntax_to_CONLL( text, CONLLFeatGenerator(), layer=LAYER_VISLCG3 )
+    return conll_str
+
+
+def parse_sentence_batch( sentences, config ):
+    ''' Parses a batch of sentences (lists of CONLL lines) with VISLCG3Parser;
+        Each batch is parsed in its own vislcg3 pipeline, so that batches can
+        be parsed in parallel;
+        Returns a triple (conll_str, word_count, sentence_count);
+    '''
+    from estnltk.names import WORDS
+    from conll_text_reader import conll_sentences_to_text
+    # The CONLL layer would be discarded before parsing, so it is not built
+    text = conll_sentences_to_text( sentences, conll_layer=False )
+    word_count = len(text[WORDS])
+    sentence_count = len(text.sentence_texts)
+    return parse_text_with_vislcg3( text, config ), word_count, sentence_count
+
+
+def write_conll_str( o_f, conll_str ):
+    # Each chunk ends with exactly one empty line (sentence boundary)
+    o_f.write( conll_str.rstrip('\n') )
+    o_f.write( '\n\n' )
+
+
+if __name__ == '__main__':
+    # =============================================================================
+    #    Fetch command line arguments
+    # =============================================================================
+    vislcg3_cmd       = 'vislcg3'
+    test_corpus       = 'UD_Estonian-master\\et-ud-test.cg3-conll'
+    test_empty_corpus = None
+    force_disamb      = False
+    replace_root      = True
+    pipeline          = 'SYNTAX_PIPELINE_1_4'
+    #pipeline          = 'SYNTAX_PIPELINE_ESTCG'
+    batch_size        = None
+    default_batch_size = 500
+    n_jobs            = 1
+
+    arg_parser = argparse.ArgumentParser(description='''
+      Evaluates EstNLTK's VISLCG3 based syntactic parser on the test data set, and reports the accuracy.
+      Assumes that VISLCG3 is installed into the system and accessible by EstNTLK.
+      Note that if no configuration is given, the script attempts to use the default configuration. The default configuration can be overridden by command line arguments.
+    ''',\
+    epilog='''
+      The script should be allowed to write files into the directory of the test corpus. 
+      In the evaluation part, the script reports accuracy in terms of three metrics: LA, UAS and LAS.
+      By default, the whole corpus is parsed at once (in a single vislcg3 pipeline). With the argument --batch_size, 
+      the corpus is streamed in batches of sentences, and with the argument --jobs, the batches are parsed in
+      parallel (in separate processes, each running its own vislcg3 pipeline); the results are written incrementally,
+      in the order of the corpus, so large corpora (e.g. the whole EDT diff set) can be evaluated without loading them
+      into memory at once.
+    '''
+    )
+    arg_parser.add_argument("-g", "--test",  default=test_corpus, \
+                                             help="evaluation corpus CONLL file (default: '"+test_corpus+"');", \
+                                             metavar='<test_corpus>')
+    arg_parser.add_argument("-te", "--test_empty",  default=test_empty_corpus, \
+                                             help="evaluation corpus (CONLL file) without syntactic annotations (default: '"+str(test_empty_corpus)+"');", \
+                                             metavar='<test_empty_corpus>')
+    arg_parser.add_argument("-v", "--vislcg",  default=vislcg3_cmd, \
+                                               help="name of the vislcg3 executable with full path (default: '"+vislcg3_cmd+"');", \
+                                               metavar='<vislcg3_cmd>')
+    arg_parser.add_argument("-d", "--disamb",  dest='force_disamb', action='store_true', \
+                                               help="whether statistical morphological disambiguation should be performed (default: "+str(force_disamb)+");" )
+    arg_parser.add_argument("-b", "--batch_size", default=batch_size, type=int, \
+                                                  help="number of sentences parsed in one batch (default: None -- the whole corpus "+\
+                                                       "at once; "+str(default_batch_size)+", if --jobs is greater than 1);", \
+                                                  metavar='<sentences>')
+    arg_parser.add_argument("-j", "--jobs", default=n_jobs, type=int, \
+                                            help="number of batches parsed in parallel (default: "+str(n_jobs)+");", \
+                                            metavar='<jobs>')
+    arg_parser.add_argument('--no-replace-root', help="do not replace syntactic label of the root node with ROOT; (by default, the replacement will be made)", dest='replace_root', action='store_false')
+    arg_parser.set_defaults(force_disamb=force_disamb, replace_root=replace_root)
+    args = arg_parser.parse_args()
+    test_corpus = args.test
+    if not args.test and not os.path.isfile(args.test):
+       raise Exception('Test corpus not found: '+args.test)
+    test_empty_corpus = args.test_empty
+    if args.test_empty and not os.path.isfile(args.test_empty):
+        raise Exception('Test corpus not found: '+args.test_empty)
+    if args.jobs < 1:
+        raise Exception('Invalid number of jobs: '+str(args.jobs))
+    batch_size = args.batch_size
+    if batch_size is None and args.jobs > 1:
+        batch_size = default_batch_size
+    if batch_size is not None and batch_size < 1:
+        raise Exception('Invalid batch size: '+str(batch_size))
+    # EstNLTK is imported only after the arguments have been parsed, so that
+    # --help and argument errors are reported at once
+    from estnltk.names import WORDS
+    from estnltk.syntax.utils import read_text_from_conll_file
+    from estnltk.syntax import vislcg3_syntax
+    config = { 'vislcg3_cmd': args.vislcg, 'pipeline': getattr( vislcg3_syntax, pipeline ), 'force_disamb': args.force_disamb, \
+               'replace_root': args.replace_root }
+
+    test_out_corpus = add_file_suffix( test_corpus, '.vislcg3-parsed' )
+    in_corpus = test_empty_corpus if test_empty_corpus else test_corpus
+    if config['force_disamb']:
+        print(' Using EstNLTK disambiguation ...',end='\n')
+    if not config['replace_root']:
+        print(' Not using ROOT labels.')
+
+    if batch_size is None:
+        # =============================================================================
+        #    Parse the whole corpus at once
+        # =============================================================================
+        print(' Contents from CONLL output: ', in_corpus, end=' ')
+        with plain_input_file( in_corpus ) as plain_in_corpus:
+            text = read_text_from_conll_file( plain_in_corpus, keep_old=False )
+        allTokens = len(text[WORDS])
+        sentStart = len(text.sentence_texts)
+        print('    ( words: ',allTokens,' sentences: ',sentStart, ')',end='\n')
+        print()
+        print(' Parsing text with VISLCG3 and converting parsing results to CONLL ... ')
+        conll_str = parse_text_with_vislcg3( text, config )
+
+        # Write results into the file
+        print('  --> ',test_out_corpus)
+        print()
+        o_f = open_corpus( test_out_corpus, mode='w' )
+        o_f.write(conll_str)
+        o_f.write('\n')
+        o_f.close()
+    else:
+        # =============================================================================
+        #    Parse the corpus in batches (in parallel)
+        # =============================================================================
+        print(' Parsing '+in_corpus+' with VISLCG3 in batches of '+str(batch_size)+' sentences ('+\
+              str(args.jobs)+' job(s)) ...')
+        allTokens = 0
+        sentStart = 0
+        o_f = open_corpus( test_out_corpus, mode='w' )
+        def write_batch( result ):
+            global allTokens, sentStart
+            conll_str, word_count, sentence_count = result
+            write_conll_str( o_f, conll_str )
+            allTokens += word_count
+            sentStart += sentence_count
+        if args.jobs == 1:
+            for batch in iter_conll_sentence_batches( in_corpus, batch_size ):
+                write_batch( parse_sentence_batch( batch, config ) )
+        else:
+            executor = ProcessPoolExecutor( max_workers=args.jobs )
+            # Keep a bounded number of batches in flight, so that the corpus
+            # is not loaded into memory at once
+            pending = deque()
+            for batch in iter_conll_sentence_batches( in_corpus, batch_size ):
+                pending.append( executor.submit( parse_sentence_batch, batch, config ) )
+                if len(pending) >= 2 * args.jobs:
+                    write_batch( pending.popleft().result() )
+            while pending:
+                write_batch( pending.popleft().result() )
+            executor.shutdown( wait=True )
+        o_f.close()
+        print('    ( words: ',allTokens,' sentences: ',sentStart, ')',end='\n')
+        print('  --> ',test_out_corpus)
+        print()
+
+    eval_out_file = 'temp.eval.output.json'
+
+    results = evaluate_conll_files( test_corpus, test_out_corpus )
+    o_f = codecs.open( eval_out_file, mode='w', encoding='utf-8' )
+    json.dump( results, o_f, indent=1, sort_keys=True )
+    o_f.close()
+    print( '\n'.join( format_results( results ) ) )
@@ -4,19 +4,19 @@
 #
 
 import sys, os, re, os.path
+import codecs, json
 import argparse
 
-def fetchResults( outputFile ):
-    resultlines = []
-    f = open(outputFile, 'r')
-    for line in f:
-        line = line.strip()
-        if re.match('accuracy.+Token$', line):
-            resultlines.append(line)
-        if re.match('.+Row (mean|count)$', line):
-            resultlines.append(line)
-    f.close()
-    return resultlines
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer as timer
+
+from conll_evaluation import evaluate_conll_files, format_results
+from maltparser_utils import parse_corpus
+from process_runner import RunRecord, ProcessFailedError, format_stage_records, terminate_on_interrupt
+from run_history import RunHistory, DEFAULT_HISTORY_DB
+from model_store import file_fingerprint
+from compressed_io import add_file_suffix
+from resource_planner import plan_parsing, format_plan
 
 # =============================================================================
 #    Fetch command line arguments
@@ -27,8 +27,11 @@ test_corpus       = os.path.join('UD_Estonian-master', 'et-ud-test.cg3-conll')
 test_empty_corpus = None
 model_name        = 'estnltkECG'
 java_loc          = 'java'
-heap_size         = 'Xmx5048M'
+heap_size         = 'auto'
 eval_on_train     = False
+parse_shards      = 1
+parse_timeout     = None
+history_db        = DEFAULT_HISTORY_DB
 
 final_options_file = None
 feature_model_file = None
@@ -38,7 +41,7 @@ arg_parser = argparse.ArgumentParser(description='''
   Note that if no configuration is given, the script attempts to use the default configuration. The default configuration can be overridden by command line arguments.
 ''',\
 epilog='''
-  The script needs to be executed in a directory that contains MaltEval.jar, the specified <maltparser_jar>, and it should be allowed to write files into that directory. 
+  The script needs to be executed in a directory that contains the specified <maltparser_jar>, and it should be allowed to write files into that directory. 
   In the evaluation part, the script reports accuracy in terms of three metrics: LA, UAS and LAS.
 '''
 )
@@ -49,7 +52,10 @@ arg_parser.add_argument("-n", "--name",  default=model_name, \
                                          help="name of the model (default: '"+model_name+"');", \
                                          metavar='<model_name>')
 arg_parser.add_argument("-j", "--heap", default=heap_size, \
-                                        help="Java heap size argument used in executing Java commands (default: '"+heap_size+"');", \
+                                        help="Java heap size argument used in executing Java commands, e.g. 'Xmx5048M'; if 'auto', "+\
+                                             "the heap size is planned from the size of the model file, and the number of "+\
+                                             "shards is limited to the parsing jobs fitting into the memory "+\
+                                             "(default: '"+heap_size+"');", \
                                         metavar='<heap_size>')
 arg_parser.add_argument("-g", "--test",  default=test_corpus, \
                                          help="evaluation corpus CONLL file (default: '"+test_corpus+"');", \
@@ -62,6 +68,23 @@ arg_parser.add_argument('-et', '--eval_on_train', action='store_true',\
 arg_parser.add_argument("-i", "--train", default=train_corpus, \
                                          help="training corpus CONLL file (default: '"+train_corpus+"');", \
                                          metavar='<train_corpus>')
+arg_parser.add_argument("-p", "--shards", default=parse_shards, type=int, \
+                                           help="number of shards the parsed corpus is split into; the shards are parsed "+\
+                                                "by concurrent MaltParser processes (default: "+str(parse_shards)+");", \
+                                           metavar='<shards>')
+arg_parser.add_argument('-gc', '--gc_log', action='store_true', \
+                                          help="if set, then GC logs of the JVMs are written (into <model_name>.<phase>.gc.log), "+\
+                                               "and summarized in the run record;")
+arg_parser.add_argument("-tp", "--parse_timeout", default=parse_timeout, type=float, \
+                                                 help="timeout of the parsing (in seconds); the Java processes are terminated "+\
+                                                      "if the timeout is exceeded (default: "+str(parse_timeout)+");", \
+                                                 metavar='<seconds>')
+arg_parser.add_argument("-hd", "--history", default=history_db, \
+                                           help="SQLite database of the run history, where the results of the evaluations are "+\
+                                                "recorded (default: '"+history_db+"');", \
+                                           metavar='<history_db>')
+arg_parser.add_argument('--no-history', help="do not record the evaluations in the run history;", dest='use_history', action='store_false')
+arg_parser.set_defaults( use_history=True )
 args = arg_parser.parse_args()
 malt_parser_jar = args.maltparser_jar
 if not args.maltparser_jar or not os.path.isfile(args.maltparser_jar):
@@ -76,51 +99,121 @@ eval_on_train = bool( args.eval_on_train )
 train_corpus  = args.train
 if eval_on_train and (not args.train or not os.path.isfile(args.train)):
    raise Exception('Train corpus not found: '+args.train)
+model_name    = args.name
+parse_shards  = args.shards
+if parse_shards < 1:
+   raise Exception('Invalid number of shards: '+str(args.shards))
+if eval_on_train and os.path.abspath(train_corpus) == os.path.abspath(test_corpus):
+   # Both phases would write their results into the same <corpus>.parsed
+   raise Exception('(!) The training corpus is the same as the test corpus: '+train_corpus+\
+                   '; evaluate without -et/--eval_on_train;')
 heap_size = args.heap
+if heap_size == 'auto' and os.path.exists(model_name+'.mco'):
+    # Parsing does not need the memory of training: the heap is planned from
+    # the size of the model, and the shards are limited to the number of the
+    # concurrent JVMs fitting into the memory (the shards of the test phase,
+    # and of the train phase)
+    n_phases   = 2 if eval_on_train else 1
+    parse_jobs = parse_shards * n_phases
+    plan = plan_parsing( model_name+'.mco', max_jobs=parse_jobs )
+    heap_size = plan['heap_size']
+    print('* Planned resources: '+format_plan( plan ))
+    if plan['jobs'] < parse_jobs:
+        parse_shards = max( 1, plan['jobs'] // n_phases )
+        print(' (!) Warning: '+str(parse_jobs)+' concurrent MaltParser processes do not fit into the available memory; '+\
+              'using '+str(parse_shards)+' shard(s) per corpus instead.')
 if not heap_size.startswith('-'):
    heap_size = '-'+heap_size
-model_name    = args.name
 
 
-model_name_opt  = '-c '+model_name
-eval_out_file_1 = 'debug.test.output.txt'
-eval_out_file_2 = 'debug.train.output.txt'
+def evaluate_on_corpus( phase, in_corpus, gold_corpus, isolated=False ):
+    ''' Parses *in_corpus* with the model, and evaluates the results against
+        *gold_corpus*; Each phase ('train' or 'test') writes its outputs into its
+        own files: the parsed corpus into <gold_corpus>.parsed (before the
+        compression suffix, if the gold corpus is compressed), the output of
+        MaltParser into <model_name>.<phase>.parse.log, and the evaluation
+        results into <model_name>.<phase>.eval.json;
+        If *isolated* is set, MaltParser runs in its own working directory (so
+        that concurrent phases do not interfere while unpacking the model);
+        Returns a pair (results, run_record), where run_record contains records
+        of the processing stages (parsing and evaluation);
+    '''
+    run_record = RunRecord( script='test_maltparser', phase=phase, model_name=model_name, \
+                            model_fingerprint=file_fingerprint( model_name+'.mco' ), \
+                            test_corpus=gold_corpus, test_fingerprint=file_fingerprint( gold_corpus ), \
+                            heap_size=heap_size, shards=parse_shards )
+    out_corpus    = add_file_suffix( gold_corpus, '.parsed' )
+    eval_out_file = model_name+'.'+phase+'.eval.json'
+    print(' Parsing '+phase+' corpus:')
+    parse_corpus( java_loc, malt_parser_jar, model_name, in_corpus, out_corpus, heap_size=heap_size, shards=parse_shards, \
+                  run_record=run_record, gc_log=model_name+'.'+phase+'.gc.log' if args.gc_log else None, \
+                  log_file=model_name+'.'+phase+'.parse.log', timeout=args.parse_timeout, isolated=isolated )
+    with run_record.measure('evaluate'):
+        results = evaluate_conll_files( gold_corpus, out_corpus )
+    results['stages'] = run_record.stages
+    o_f = codecs.open( eval_out_file, mode='w', encoding='utf-8' )
+    json.dump( results, o_f, indent=1, sort_keys=True )
+    o_f.close()
+    return results, run_record
+
 
 if os.path.exists(model_name+'.mco'):
     # =============================================================================
     #    Evaluate MaltParser
     # =============================================================================
+    #  Evaluation on the training and on the test corpus are independent of each 
+    #  other, so (if both are required) run them concurrently, each MaltParser
+    #  in its own working directory
+    phases = []
     if eval_on_train:
-        print(' Parsing training corpus:')
-        test_out_corpus = train_corpus+'.parsed'
-        in_corpus = train_corpus
-        command = java_loc + ' -jar '+malt_parser_jar+' '+model_name_opt+' -i '+in_corpus+' -o '+test_out_corpus+' -m parse '
-        print ("  Executing:  "+command)
-        os.system(command)
-        
-        command = java_loc + ' -jar MaltEval.jar -s '+test_out_corpus+' -g '+train_corpus+' --Metric LAS;UAS;LA > '+eval_out_file_2
-        print ("  Executing:  "+command)
-        os.system(command)
-    
-    print(' Parsing test corpus:')
-    test_out_corpus = test_corpus+'.parsed'
+        phases.append( ('train', train_corpus, train_corpus) )
     in_corpus = test_empty_corpus if test_empty_corpus else test_corpus
-    command = java_loc + ' -jar '+malt_parser_jar+' '+model_name_opt+' -i '+in_corpus+' -o '+test_out_corpus+' -m parse '
-    print ("  Executing:  "+command)
-    os.system(command)
-    
-    command = java_loc + ' -jar MaltEval.jar -s '+test_out_corpus+' -g '+test_corpus+' --Metric LAS;UAS;LA > '+eval_out_file_1
-    print ("  Executing:  "+command)
-    os.system(command)
+    phases.append( ('test', in_corpus, test_corpus) )
+    start_time = timer()
+    executor = ThreadPoolExecutor( max_workers=len(phases) )
+    futures  = [ executor.submit( evaluate_on_corpus, *phase, isolated=len(phases) > 1 ) for phase in phases ]
+    with terminate_on_interrupt():
+        executor.shutdown( wait=True )
+    total_time = timer() - start_time
+    errors = [ future.exception() for future in futures if future.exception() ]
+    for error in errors:
+        if not isinstance(error, ProcessFailedError):
+            raise error
+        print( error )
+    if errors:
+        sys.exit(1)
     
     print()
-    if eval_on_train:
-        resultLines = fetchResults( eval_out_file_2 )
-        print('  *** Evaluation on training corpus: ')
-        print( '\n'.join( resultLines ) )    
-    resultLines = fetchResults( eval_out_file_1 )
-    print('  *** Evaluation on test corpus: ')
-    print( '\n'.join( resultLines ) )
+    run_record_file = model_name+'.run.json'
+    run_summary = RunRecord( script='test_maltparser', model_name=model_name, maltparser_jar=malt_parser_jar, \
+                             shards=parse_shards, total_time=total_time )
+    for (phase, in_corpus, gold_corpus), future in zip(phases, futures):
+        results, run_record = future.result()
+        if phase == 'train':
+            print('  *** Evaluation on training corpus: ')
+        else:
+            print('  *** Evaluation on test corpus: ')
+        print( '\n'.join( format_results( results ) ) )
+        print( '\n'.join( format_stage_records( run_record.stages ) ) )
+        run_summary.info[phase] = run_record.as_dict()
+        for metric in ['LAS', 'UAS', 'LA']:
+            run_summary.info[phase][metric] = results[metric]
+    print('  Total time: {:.1f}s'.format( total_time ))
+    run_summary.save( run_record_file )
+    print('  --> ',run_record_file)
+    if args.use_history:
+        # Record each evaluation as a separate run; the configuration of the
+        # model is taken from the run that trained the model (if recorded)
+        history = RunHistory( args.history )
+        for (phase, in_corpus, gold_corpus), future in zip(phases, futures):
+            results, run_record = future.result()
+            training_run = history.find_training_run( run_record.info['model_fingerprint'] )
+            if training_run:
+                for key in ['config_hash', 'feat_gen', 'final_options', 'feature_model', 'algorithm', \
+                            'train_corpus', 'train_fingerprint']:
+                    run_record.info[key] = training_run[key]
+            run_id = history.add_run( run_record.info, run_record.stages, results=results )
+            print('  --> ',args.history+' (run_id: '+str(run_id)+')')
+        history.close()
 else:
     print(' (!) Unable to find the model file: '+model_name+'.mco')
-
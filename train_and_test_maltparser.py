@@ -4,19 +4,18 @@
 #
 
 import sys, os, re, os.path
+import codecs, json
 import argparse
 
-def fetchResults( outputFile ):
-    resultlines = []
-    f = open(outputFile, 'r')
-    for line in f:
-        line = line.strip()
-        if re.match('accuracy.+Token$', line):
-            resultlines.append(line)
-        if re.match('.+Row (mean|count)$', line):
-            resultlines.append(line)
-    f.close()
-    return resultlines
+from conll_evaluation import evaluate_conll_files, format_results
+from model_store import ModelStore, fingerprint_training_inputs, parse_size
+from maltparser_utils import make_train_command, parse_corpus, read_feature_model_from_opt_file
+from process_runner import RunRecord, ProcessFailedError, java_gc_log_options, format_stage_records
+from run_history import RunHistory, DEFAULT_HISTORY_DB, configuration_hash
+from model_store import file_fingerprint
+from conll_utils import count_conll_sentences
+from compressed_io import plain_input_file, add_file_suffix
+from resource_planner import plan_training, count_features, format_plan
 
 # =============================================================================
 #    Fetch command line arguments
@@ -27,19 +26,26 @@ test_corpus       = os.path.join('UD_Estonian-master', 'et-ud-test.cg3-conll')
 test_empty_corpus = None
 model_name        = 'estnltkECG'
 java_loc          = 'java'
-heap_size         = 'Xmx5048M'
+heap_size         = 'auto'
 configuration     = None
 algorithm         = None
 
 final_options_file = None
 feature_model_file = None
 
+model_store_dir    = 'malt_model_store'
+model_store_size   = '20G'
+learn_timeout      = None
+parse_timeout      = None
+feat_gen           = None
+history_db         = DEFAULT_HISTORY_DB
+
 arg_parser = argparse.ArgumentParser(description='''
   Trains a MaltParser model on the training data set with the given configuration, evaluates it on the test data set, and reports the accuracy.
   Note that if no configuration is given, the script attempts to build the model using the default configuration. The default configuration can be overridden by command line arguments.
 ''',\
 epilog='''
-  The script needs to be executed in a directory that contains MaltEval.jar, the specified <maltparser_jar>, and it should be allowed to write files into that directory. 
+  The script needs to be executed in a directory that contains the specified <maltparser_jar>, and it should be allowed to write files into that directory. 
   In the evaluation part, the script reports accuracy in terms of three metrics: LA, UAS and LAS.
 '''
 )
@@ -50,7 +56,9 @@ arg_parser.add_argument("-n", "--name",  default=model_name, \
                                          help="name of the model (default: '"+model_name+"');", \
                                          metavar='<model_name>')
 arg_parser.add_argument("-j", "--heap", default=heap_size, \
-                                        help="Java heap size argument used in executing Java commands (default: '"+heap_size+"');", \
+                                        help="Java heap size argument used in executing Java commands, e.g. 'Xmx5048M'; if 'auto', "+\
+                                             "the heap size is planned from the size of the training corpus and the feature "+\
+                                             "model, calibrated against the run history (default: '"+heap_size+"');", \
                                         metavar='<heap_size>')
 arg_parser.add_argument("-i", "--train", default=train_corpus, \
                                          help="training corpus CONLL file (default: '"+train_corpus+"');", \
@@ -67,6 +75,40 @@ arg_parser.add_argument("-F", "--final_options", default=final_options_file, \
 arg_parser.add_argument("-f", "--feature_model", default=feature_model_file, \
                                                  help="feature model XML file with path (default: "+str(feature_model_file)+");", \
                                                  metavar='<feature_model_file>')
+arg_parser.add_argument("-o", "--opt_file", default=None, \
+                                            help="options file of MaltOptimizer (e.g. phase3_optFile.txt), from which the "+\
+                                                 "feature model file is read, if -f is not given (default: None);", \
+                                            metavar='<optFile>')
+arg_parser.add_argument("-s", "--model_store", default=model_store_dir, \
+                                              help="directory of the model store, where trained models are cached and reused if the "+\
+                                                   "training inputs are unchanged (default: '"+model_store_dir+"');", \
+                                              metavar='<model_store_dir>')
+arg_parser.add_argument("-ss", "--store_size", default=model_store_size, \
+                                               help="maximum size of the model store; least recently used models are evicted "+\
+                                                    "if the size is exceeded (default: '"+model_store_size+"');", \
+                                               metavar='<store_size>')
+arg_parser.add_argument('-gc', '--gc_log', action='store_true', \
+                                          help="if set, then GC logs of the JVMs are written (into <model_name>.<stage>.gc.log), "+\
+                                               "and summarized in the run record;")
+arg_parser.add_argument("-tl", "--learn_timeout", default=learn_timeout, type=float, \
+                                                 help="timeout of the training (in seconds); the Java process is terminated "+\
+                                                      "if the timeout is exceeded (default: "+str(learn_timeout)+");", \
+                                                 metavar='<seconds>')
+arg_parser.add_argument("-tp", "--parse_timeout", default=parse_timeout, type=float, \
+                                                 help="timeout of the parsing (in seconds); the Java process is terminated "+\
+                                                      "if the timeout is exceeded (default: "+str(parse_timeout)+");", \
+                                                 metavar='<seconds>')
+arg_parser.add_argument("-fg", "--feat_gen", default=feat_gen, \
+                                            help="flag of the feature generator that was used in preparing the corpora "+\
+                                                 "(e.g. f02_a); recorded in the run history (default: "+str(feat_gen)+");", \
+                                            metavar='<feat_gen>')
+arg_parser.add_argument("-hd", "--history", default=history_db, \
+                                           help="SQLite database of the run history, where the results of the run are "+\
+                                                "recorded (default: '"+history_db+"');", \
+                                           metavar='<history_db>')
+arg_parser.add_argument('--no-history', help="do not record the run in the run history;", dest='use_history', action='store_false')
+arg_parser.add_argument('--no-model-store', help="do not use the model store: always retrain the model;", dest='use_model_store', action='store_false')
+arg_parser.set_defaults( use_model_store=True, use_history=True )
 args = arg_parser.parse_args()
 malt_parser_jar = args.maltparser_jar
 if not args.maltparser_jar or not os.path.isfile(args.maltparser_jar):
@@ -81,19 +123,59 @@ test_empty_corpus = args.test_empty
 if args.test_empty and not os.path.isfile(args.test_empty):
     raise Exception('Test corpus not found: '+args.test_empty)
 feature_model_file = args.feature_model
-if args.feature_model and not os.path.isfile(args.feature_model):
-    raise Exception('Feature model file not found: '+args.feature_model)
+if args.opt_file and not args.feature_model:
+    if not os.path.isfile(args.opt_file):
+        raise Exception('Options file not found: '+args.opt_file)
+    feature_model_file = read_feature_model_from_opt_file( args.opt_file )
+    if not feature_model_file:
+        raise Exception('(!) No feature model in the options file: '+args.opt_file)
+if feature_model_file and not os.path.isfile(feature_model_file):
+    raise Exception('Feature model file not found: '+feature_model_file)
 final_options_file = args.final_options
 if args.final_options and (not os.path.isfile(args.final_options) or \
                            not 'finalOptionsFile.xml' in args.final_options):
     raise Exception('Invalid final_options file: '+args.final_options)
+train_sentences, train_tokens = count_conll_sentences( train_corpus )
 heap_size = args.heap
+if heap_size == 'auto':
+    history = RunHistory( args.history ) if args.use_history and os.path.isfile(args.history) else None
+    plan = plan_training( train_tokens, feature_model_file=feature_model_file, max_jobs=1, history=history )
+    if history:
+        history.close()
+    heap_size = plan['heap_size']
+    print('* Planned resources: '+format_plan( plan ))
 if not heap_size.startswith('-'):
    heap_size = '-'+heap_size
 model_name = args.name
+model_store = None
+if args.use_model_store:
+    model_store = ModelStore( args.model_store, max_size=parse_size(args.store_size) )
+
+eval_out_file   = 'temp.eval.output.json'
+run_record_file = model_name+'.run.json'
+run_record = RunRecord( script='train_and_test_maltparser', model_name=model_name, train_corpus=train_corpus, \
+                        test_corpus=test_corpus, heap_size=heap_size, maltparser_jar=malt_parser_jar, \
+                        final_options=final_options_file, feature_model=feature_model_file, \
+                        algorithm=algorithm, feat_gen=args.feat_gen, phase='test', \
+                        config_hash=configuration_hash( final_options_file, feature_model_file, \
+                                                        algorithm=algorithm, feat_gen=args.feat_gen ), \
+                        train_fingerprint=file_fingerprint( train_corpus ), \
+                        train_tokens=train_tokens, feature_count=count_features( feature_model_file ), \
+                        test_fingerprint=file_fingerprint( test_corpus ) )
+
 
-model_name_opt  = '-c '+model_name
-eval_out_file   = 'temp.eval.output.txt'
+def save_run( results=None ):
+    ''' Saves the run record into <model_name>.run.json, and (unless disabled)
+        records the run in the run history; '''
+    run_record.save( run_record_file )
+    print()
+    print( '\n'.join( format_stage_records( run_record.stages ) ) )
+    print('  --> ',run_record_file)
+    if args.use_history:
+        history = RunHistory( args.history )
+        run_id  = history.add_run( run_record.info, run_record.stages, results=results )
+        history.close()
+        print('  --> ',args.history+' (run_id: '+str(run_id)+')')
 
 # =============================================================================
 #    Perform cleanup
@@ -105,41 +187,91 @@ if os.path.exists(eval_out_file):
     os.unlink(eval_out_file)
     
 # =============================================================================
-#    Train MaltParser
+#    Reuse the model from the store (if it has been trained before)
+# =============================================================================
+model_key   = None
+model_found = False
+if model_store:
+    model_key = fingerprint_training_inputs( train_corpus, malt_parser_jar, model_name, \
+                                             final_options_file=final_options_file, \
+                                             feature_model_file=feature_model_file, \
+                                             algorithm=algorithm )
+    model_found = model_store.fetch( model_key, model_name+'.mco' )
+    if model_found:
+        print('* Training inputs unchanged, reusing the model from the store: '+model_key)
+
+# =============================================================================
+#    Build the training command
 # =============================================================================
-command = None
+learn_gc_log = model_name+'.learn.gc.log' if args.gc_log else None
+jvm_options  = java_gc_log_options( learn_gc_log ) if learn_gc_log else None
 
 if not feature_model_file and not final_options_file:
     print ('** No configuration file given. Using the default configuration with command line args. ')
-    command = java_loc + ' '+heap_size+' -jar '+malt_parser_jar+' '+model_name_opt+' -i '+train_corpus+' -m learn '
-    if algorithm:
-        command += ' -a '+algorithm
 elif feature_model_file and final_options_file:
     print ('** Using optimization configuration from: '+final_options_file+' and '+feature_model_file+' ')
-    command = java_loc + ' '+heap_size+' -jar '+malt_parser_jar+' '+model_name_opt+' -i '+train_corpus+' -m learn -f '+final_options_file+' -F '+feature_model_file
-    if algorithm:
-        command += ' -a '+algorithm
+else:
+    raise Exception('(!) Both final_options file and feature_model file should be given.')
+
+def get_train_command( train_file ):
+    ''' Returns the MaltParser's training command (*train_file* is the plain
+        training corpus: MaltParser cannot read compressed corpora); '''
+    return make_train_command( java_loc, malt_parser_jar, model_name, train_file, heap_size=heap_size, \
+                               final_options_file=final_options_file, \
+                               feature_model_file=feature_model_file, algorithm=algorithm, \
+                               jvm_options=jvm_options )
+
+# =============================================================================
+#    Train MaltParser (if required) and parse the test corpus
+# =============================================================================
+try:
+    if not model_found:
+        with plain_input_file( train_corpus ) as plain_train_corpus:
+            command = get_train_command( plain_train_corpus )
+            print ("  Executing:  "+' '.join(command))
+            run_record.run( command, stage='learn', gc_log=learn_gc_log, log_file=model_name+'.learn.log', \
+                            timeout=args.learn_timeout )
+        if model_store and os.path.exists(model_name+'.mco'):
+            model_store.store( model_key, model_name+'.mco' )
+            print('* Model saved into the store: '+model_key)
+    if os.path.exists(model_name+'.mco'):
+        print(' Parsing test corpus:')
+        test_out_corpus = add_file_suffix( test_corpus, '.parsed' )
+        in_corpus = test_empty_corpus if test_empty_corpus else test_corpus
+        parse_corpus( java_loc, malt_parser_jar, model_name, in_corpus, test_out_corpus, heap_size=heap_size, \
+                      run_record=run_record, gc_log=model_name+'.parse.gc.log' if args.gc_log else None, \
+                      log_file=model_name+'.parse.log', timeout=args.parse_timeout )
+except ProcessFailedError as error:
+    # Save the records of the stages completed so far, and exit with an error
+    run_record.info['error'] = str(error)
+    run_record.info['model_from_store'] = model_found
+    save_run()
+    print( error )
+    sys.exit(1)
 
-print ("  Executing:  "+command)
-os.system(command)
 if os.path.exists(model_name+'.mco'):
     # =============================================================================
     #    Evaluate MaltParser
     # =============================================================================
-    print(' Parsing test corpus:')
-    test_out_corpus = test_corpus+'.parsed'
-    in_corpus = test_empty_corpus if test_empty_corpus else test_corpus
-    command = java_loc + ' -jar '+malt_parser_jar+' '+model_name_opt+' -i '+in_corpus+' -o '+test_out_corpus+' -m parse '
-    print ("  Executing:  "+command)
-    os.system(command)
-    
-    command = java_loc + ' -jar MaltEval.jar -s '+test_out_corpus+' -g '+test_corpus+' --Metric LAS;UAS;LA > '+eval_out_file
-    print ("  Executing:  "+command)
-    os.system(command)
-    resultLines = fetchResults( eval_out_file )
-    print( '\n'.join( resultLines ) )
+    run_record.info['model_fingerprint'] = file_fingerprint( model_name+'.mco' )
+    print(' Evaluating parsed corpus:')
+    with run_record.measure('evaluate'):
+        results = evaluate_conll_files( test_corpus, test_out_corpus )
+    o_f = codecs.open( eval_out_file, mode='w', encoding='utf-8' )
+    json.dump( results, o_f, indent=1, sort_keys=True )
+    o_f.close()
+    print( '\n'.join( format_results( results ) ) )
+    run_record.info['LAS'] = results['LAS']
+    run_record.info['UAS'] = results['UAS']
+    run_record.info['LA']  = results['LA']
 else:
+    results = None
     print(' (!) Unable to find the model file: '+model_name+'.mco')
+    run_record.info['error'] = 'Unable to find the model file: '+model_name+'.mco'
+run_record.info['model_from_store'] = model_found
+save_run( results )
+if 'error' in run_record.info:
+    sys.exit(1)
 
 
 
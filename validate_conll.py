@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#
+#    Validates CONLL format corpus files before they are passed to MaltOptimizer
+#    or MaltParser;
+#    (a native replacement for the MaltOptimizer's validateFormat.py, which
+#     requires Python 2)
+#
+from __future__ import unicode_literals, print_function
+
+import sys, os, os.path
+import argparse
+
+from timeit import default_timer as timer
+
+from conll_validator import validate_conll_file, format_errors, write_validated_marker, is_validated, NOTICES
+
+arg_parser = argparse.ArgumentParser(description='''
+  Validates CONLL format corpus files: checks the number of columns, the sequencing of token IDs, ranges of HEAD
+  values, cycles in the dependency trees, and empty fields (including empty FEATS). Errors are reported by line numbers
+  and byte offsets; the "??" LEMMA-s of the feature generators (words without a root) are reported as notices.
+''',\
+epilog='''
+  Empty fields and comment lines are fixable errors: with the argument --output, a cleaned copy of the corpus (with
+  these replaced with "_", or removed) is written; the "??" lemmas are left unchanged. Errors in the number of columns, in token IDs and in
+  HEADs (including cycles) must be fixed manually (or in adhoc_fixes.py).
+  With the flag --marker, a marker file (<corpus>.validated) recording the fingerprint of the valid corpus (or of the
+  cleaned corpus, if --output is given) is written; corpora with an up-to-date marker are not validated again.
+  The script exits with code 1 if any of the corpora contains errors that cannot be fixed.
+'''
+)
+arg_parser.add_argument("corpus", nargs='+', help="CONLL file(s) to be validated;", metavar='<corpus>')
+arg_parser.add_argument("-o", "--output", default=None, \
+                                          help="name of the cleaned CONLL file (only with a single corpus; default: None);", \
+                                          metavar='<cleaned_corpus>')
+arg_parser.add_argument("-m", "--marker", action='store_true', \
+                                          help="whether the validated marker file should be written;")
+arg_parser.add_argument("-n", "--max_errors", default=20, type=int, \
+                                              help="maximum number of errors listed per corpus (default: 20);", \
+                                              metavar='<max_errors>')
+args = arg_parser.parse_args()
+for corpus_file in args.corpus:
+    if not os.path.isfile(corpus_file):
+        raise Exception('Corpus not found: '+corpus_file)
+if args.output and len(args.corpus) > 1:
+    raise Exception('(!) The argument --output can only be used with a single corpus.')
+
+exit_code = 0
+for corpus_file in args.corpus:
+    if args.marker and not args.output and is_validated( corpus_file ):
+        print(' '+corpus_file+': already validated.')
+        continue
+    start_time = timer()
+    results = validate_conll_file( corpus_file, cleaned_file=args.output )
+    problems = [ error for error in results['errors'] if error['kind'] not in NOTICES ]
+    status = 'OK' if not problems else ('fixable errors' if results['valid'] else 'ERRORS')
+    print(' '+corpus_file+': '+str(results['sentences'])+' sentences, '+str(results['tokens'])+' tokens; '+\
+          status+'  ({:.2f}s)'.format( timer() - start_time ))
+    if results['errors']:
+        print( '\n'.join( format_errors( results, max_errors=args.max_errors ) ) )
+    if args.output:
+        print('  --> ',args.output)
+    if not results['valid']:
+        exit_code = 1
+    elif args.marker:
+        if args.output:
+            # The cleaned corpus has no errors
+            print('  --> ',write_validated_marker( args.output, validate_conll_file( args.output ) ))
+        elif not problems:
+            print('  --> ',write_validated_marker( corpus_file, results ))
+sys.exit( exit_code )